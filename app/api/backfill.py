@@ -0,0 +1,51 @@
+from datetime import datetime
+from typing import Optional
+
+from fastapi import APIRouter, HTTPException
+
+from app.models.schemas import TriggerReportResponse
+from app.services import report_service
+from app.services.calculator import parse_windows
+from app.services.job_queue import REPORT_JOB_POLL_SECONDS, QueueFullError
+
+router = APIRouter()
+
+
+@router.post("/backfill", response_model=TriggerReportResponse)
+def trigger_backfill(
+    start: datetime, end: Optional[datetime] = None, step: str = "1h", windows: Optional[str] = None, priority: int = 0
+) -> TriggerReportResponse:
+    try:
+        report_id = report_service.trigger_backfill(
+            start, end, step, parse_windows(windows) if windows else None, priority
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except QueueFullError as e:
+        raise HTTPException(status_code=429, detail=str(e), headers={"Retry-After": str(max(1, int(REPORT_JOB_POLL_SECONDS)))})
+    return TriggerReportResponse(report_id=report_id)
+
+
+@router.get("/backfill/{report_id}")
+async def get_backfill(report_id: str):
+    info = await report_service.get_report_info_async(report_id)
+    if info is None or info.backfill is None:
+        raise HTTPException(status_code=404, detail="backfill not found")
+
+    if info.status in ("queued", "running"):
+        return {"status": "Running", **info.backfill}
+
+    if info.status == "failed":
+        raise HTTPException(status_code=500, detail=info.error_message or "Backfill failed")
+
+    path = info.output_csv_path
+    if path is None or not path.exists():
+        raise HTTPException(status_code=410, detail="Backfill dataset was deleted, trigger a new one")
+    return {
+        "status": "Complete",
+        **info.backfill,
+        "windows": info.windows,
+        "path": str(path.resolve()),
+        "partitions": sorted(partition.name for partition in path.iterdir()),
+        "stage_timings": info.stage_timings,
+    }
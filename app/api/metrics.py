@@ -0,0 +1,115 @@
+from datetime import datetime, timezone
+
+from fastapi import APIRouter
+from fastapi.responses import PlainTextResponse
+
+from app.database.config import database_pools
+from app.services.job_queue import job_counts
+from app.services.metrics import (
+    gauge, observation_flush_errors, observation_flush_rows, observation_flush_seconds, observation_wait_seconds,
+    observations_received, report_cache_hits, report_duration_seconds, report_stage_seconds,
+)
+from app.services.observation_service import observation_buffer
+from app.services.polling_service import polling_service
+from app.services.report_service import worker_pool
+from app.services.snapshot import dataset_snapshot
+
+router = APIRouter()
+
+# Prometheus text exposition format
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+@router.get("/metrics")
+def metrics():
+    return PlainTextResponse(render_metrics(), media_type=CONTENT_TYPE)
+
+
+def render_metrics() -> str:
+    """
+    Every metric of this process in Prometheus text format. Histograms and
+    counters cover reports generated here; queue gauges are read from the
+    shared jobs table, so they describe all processes.
+    """
+    lines = []
+    lines += report_stage_seconds.render()
+    lines += report_duration_seconds.render()
+    lines += report_cache_hits.render()
+    lines += observations_received.render()
+    lines += observation_flush_seconds.render()
+    lines += observation_wait_seconds.render()
+    lines += observation_flush_rows.render()
+    lines += observation_flush_errors.render()
+    lines += gauge(
+        "store_monitoring_observations_buffered", "Posted observations waiting to be written to store_status.",
+        [({}, observation_buffer.buffered)],
+    )
+
+    lines += gauge(
+        "store_monitoring_report_workers_in_flight", "Reports being computed by this process's workers.",
+        [({}, worker_pool.in_flight)],
+    )
+
+    try:
+        counts = job_counts()
+        database_up = 1
+    except Exception as e:
+        print(f"Metrics: could not read the job queue: {e}")
+        counts = None
+        database_up = 0
+    lines += gauge("store_monitoring_database_up", "Whether the last metrics query reached the database.", [({}, database_up)])
+    if counts is not None:
+        lines += gauge(
+            "store_monitoring_report_queue_depth", "Distinct reports waiting in the queue (the quantity REPORT_QUEUE_MAX_DEPTH limits).",
+            [({}, counts["queued"][1])],
+        )
+        lines += gauge(
+            "store_monitoring_reports_in_flight", "Distinct reports being computed by any process.",
+            [({}, counts["running"][1])],
+        )
+        lines += gauge(
+            "store_monitoring_report_jobs", "Queued and running report jobs, including ones sharing a computation.",
+            [({"status": status}, jobs) for status, (jobs, _) in sorted(counts.items())],
+        )
+
+    pools = [
+        (name, pool) for name, pool in database_pools().items()
+        if all(hasattr(pool, attribute) for attribute in ("size", "checkedout", "overflow"))
+    ]
+    if pools:
+        lines += gauge(
+            "store_monitoring_db_pool_size", "Persistent connections the pool keeps.",
+            [({"pool": name}, pool.size()) for name, pool in pools],
+        )
+        lines += gauge(
+            "store_monitoring_db_pool_checked_out", "Connections currently in use.",
+            [({"pool": name}, pool.checkedout()) for name, pool in pools],
+        )
+        lines += gauge(
+            "store_monitoring_db_pool_overflow", "Connections open beyond the pool size.",
+            [({"pool": name}, max(pool.overflow(), 0)) for name, pool in pools],
+        )
+
+    view = dataset_snapshot.view
+    if view is not None:
+        lines += gauge(
+            "store_monitoring_snapshot_observations", "Observations held by the in-process dataset snapshot.",
+            [({}, len(view))],
+        )
+        lines += gauge(
+            "store_monitoring_snapshot_bytes", "Memory the dataset snapshot's observations and store ids take.",
+            [({}, view.nbytes)],
+        )
+
+    lines += gauge("store_monitoring_poller_running", "Whether the new-data poller is running.", [({}, int(polling_service.is_running))])
+    last_check = polling_service.last_check_time
+    if last_check is not None:
+        lines += gauge(
+            "store_monitoring_poller_last_check_timestamp_seconds", "Unix time of the poller's last check.",
+            [({}, last_check.timestamp())],
+        )
+        lines += gauge(
+            "store_monitoring_poller_lag_seconds", "Seconds since the poller last checked for new data.",
+            [({}, (datetime.now(timezone.utc) - last_check).total_seconds())],
+        )
+    return "\n".join(lines) + "\n"
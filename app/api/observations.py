@@ -0,0 +1,28 @@
+import asyncio
+
+from fastapi import APIRouter, HTTPException, Request
+
+from app.models.schemas import ObservationBatchResponse
+from app.services import observation_service
+from app.services.observation_service import BufferFullError
+
+router = APIRouter()
+
+
+@router.post("/observations", status_code=202, response_model=ObservationBatchResponse)
+async def post_observations(request: Request) -> ObservationBatchResponse:
+    """
+    Accept a batch of (store_id, timestamp_utc, status) observations as JSON
+    or CSV. Valid rows are buffered and written to store_status within
+    OBSERVATION_FLUSH_SECONDS; invalid rows are reported and dropped.
+    """
+    body = await request.body()
+    try:
+        # Parsing and validation are pandas work: keep them off the event loop
+        return await asyncio.to_thread(
+            observation_service.submit_observations, body, request.headers.get("content-type", "application/json")
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except BufferFullError as e:
+        raise HTTPException(status_code=429, detail=str(e), headers={"Retry-After": str(max(1, round(e.retry_after)))})
@@ -1,3 +1,5 @@
+from datetime import datetime, timezone
+
 from fastapi import APIRouter, BackgroundTasks, HTTPException
 from fastapi.responses import JSONResponse
 
@@ -15,6 +17,16 @@ async def start_polling(background_tasks: BackgroundTasks):
     return {"message": "Hourly polling started"}
 
 
+@router.post("/notify")
+def notify_new_data():
+    """Push-style wakeup for ingestion jobs that cannot use PostgreSQL NOTIFY."""
+    if not polling_service.is_running:
+        raise HTTPException(status_code=400, detail="Polling is not running")
+
+    polling_service.notify_new_data()
+    return {"message": "Polling check scheduled"}
+
+
 @router.post("/stop_polling")
 def stop_polling():
     if not polling_service.is_running:
@@ -25,30 +37,42 @@ def stop_polling():
 
 
 @router.get("/status")
-def get_status():
-    return {
+async def get_status():
+    last_check_time = polling_service.last_check_time
+    status = {
         "is_running": polling_service.is_running,
         "last_report_id": polling_service.last_report_id,
-        "last_check_time": polling_service.last_check_time.isoformat() if polling_service.last_check_time else None
+        "last_seen_id": polling_service.last_seen_id,
+        "last_check_time": last_check_time.isoformat() if last_check_time else None,
+        "lag_seconds": (datetime.now(timezone.utc) - last_check_time).total_seconds() if last_check_time else None,
+        "last_report_stage_timings": None,
     }
+    if polling_service.last_report_id:
+        from app.services import report_service
+
+        report_info = await report_service.get_report_info_async(polling_service.last_report_id)
+        if report_info:
+            status["last_report_stage_timings"] = report_info.stage_timings
+    return status
 
 
 @router.get("/last_report")
-def get_last_report():
+async def get_last_report():
     if not polling_service.last_report_id:
         return {"message": "No reports generated yet"}
     
     from app.services import report_service
     
     try:
-        report_info = report_service.get_report_info(polling_service.last_report_id)
+        report_info = await report_service.get_report_info_async(polling_service.last_report_id)
         if not report_info:
             return {"message": "Report not found"}
         
         return {
             "report_id": polling_service.last_report_id,
             "status": report_info.status,
-            "generated_at": report_info.timestamp.isoformat() if report_info.timestamp else None
+            "generated_at": report_info.timestamp.isoformat() if report_info.timestamp else None,
+            "stage_timings": report_info.stage_timings,
         }
     except Exception as e:
         return {"error": str(e)}
@@ -1,38 +1,187 @@
-from fastapi import APIRouter, BackgroundTasks, HTTPException
-from fastapi.responses import FileResponse, JSONResponse
+import asyncio
+from email.utils import formatdate, parsedate_to_datetime
+from pathlib import Path
+from typing import Iterator, Optional
+
+from fastapi import APIRouter, HTTPException, Request, Response
+from fastapi.responses import FileResponse, JSONResponse, StreamingResponse
 
 from app.models.schemas import TriggerReportResponse
 from app.services import report_service
+from app.services.calculator import parse_windows
+from app.services.report_formats import REPORT_FORMATS, report_file
+from app.services.job_queue import REPORT_JOB_POLL_SECONDS, QueueFullError
 
 router = APIRouter()
 
 
 @router.post("/trigger_report", response_model=TriggerReportResponse)
-def trigger_report(background_tasks: BackgroundTasks) -> TriggerReportResponse:
-    report_id = report_service.trigger_report(background_tasks)
+def trigger_report(priority: int = 0, windows: Optional[str] = None) -> TriggerReportResponse:
+    try:
+        report_id = report_service.trigger_report(priority, parse_windows(windows) if windows else None)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except QueueFullError as e:
+        raise HTTPException(status_code=429, detail=str(e), headers={"Retry-After": str(max(1, int(REPORT_JOB_POLL_SECONDS)))})
     return TriggerReportResponse(report_id=report_id)
 
 
 @router.get("/get_report")
-def get_report(report_id: str):
-    info = report_service.get_report_info(report_id)
+async def get_report(request: Request, report_id: str, format: str = "csv"):
+    # Runs on the event loop: the status lookup uses the async engine, and only
+    # a first-time format conversion is handed to a thread
+    info = await report_service.get_report_info_async(report_id)
     
     if info is None:
         raise HTTPException(status_code=404, detail="report_id not found")
 
-    if info.status == "running":
+    if info.backfill is not None:
+        raise HTTPException(status_code=400, detail=f"report_id is a backfill, see GET /backfill/{report_id}")
+
+    if info.status in ("queued", "running"):
         return JSONResponse(status_code=200, content={"status": "Running"})
 
     if info.status == "failed":
         raise HTTPException(status_code=500, detail=info.error_message or "Report generation failed")
 
+    if info.status == "expired":
+        raise HTTPException(status_code=410, detail="Report expired from the cache, trigger a new one")
+
     if not info.output_csv_path:
         raise HTTPException(status_code=500, detail="Report file missing")
 
-    headers = {"X-Report-Status": "Complete"}
-    return FileResponse(
-        path=str(info.output_csv_path), 
-        media_type="text/csv", 
-        filename="report.csv", 
-        headers=headers
-    )
\ No newline at end of file
+    try:
+        path = await asyncio.to_thread(report_file, info.output_csv_path, format)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except FileNotFoundError:
+        raise HTTPException(status_code=410, detail="Report expired from the cache, trigger a new one")
+
+    headers = {"Server-Timing": _server_timing(info.stage_timings)} if info.stage_timings else {}
+    return _conditional_file_response(request, path, REPORT_FORMATS[format][0], f"report.{format}", headers)
+
+
+@router.get("/get_report_delta")
+async def get_report_delta(request: Request, since: str, min_change: Optional[float] = None):
+    # Stores that changed since the report the client already has, up to the newest complete report
+    try:
+        delta = await asyncio.to_thread(report_service.report_delta, since, min_change)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except FileNotFoundError:
+        raise HTTPException(status_code=410, detail="Report expired from the cache, download a full report")
+    if delta is None:
+        raise HTTPException(status_code=404, detail="report_id not found")
+
+    report_id, content = delta
+    headers = {"X-Report-Id": report_id, "X-Delta-Since": since}
+    if isinstance(content, str):  # a non-default min_change, computed for this request
+        headers["Content-Disposition"] = 'attachment; filename="report_delta.csv"'
+        return Response(content=content, media_type="text/csv", headers=headers)
+    return _conditional_file_response(request, content, "text/csv", "report_delta.csv", headers)
+
+
+def _server_timing(stage_timings: dict) -> str:
+    """Stage timings of the report's generation as a Server-Timing header, e.g. query;dur=812.4;desc="rows=840000"."""
+    metrics = []
+    for stage, entry in stage_timings.items():
+        metric = f"{stage};dur={entry['seconds'] * 1000:.1f}"
+        counts = " ".join(f"{key}={value}" for key, value in entry.items() if key != "seconds")
+        if counts:
+            metric += f';desc="{counts}"'
+        metrics.append(metric)
+    return ", ".join(metrics)
+
+
+def _conditional_file_response(
+    request: Request, path: Path, media_type: str, filename: str, extra_headers: Optional[dict] = None
+) -> Response:
+    """
+    Serve a report file with validators: If-None-Match/If-Modified-Since
+    answer 304, and a single byte range answers 206. Report files are
+    written once and never modified, so name and size identify the content.
+    """
+    stat = path.stat()
+    etag = f'"{path.name}-{stat.st_size:x}"'
+    headers = {
+        "X-Report-Status": "Complete",
+        "ETag": etag,
+        "Last-Modified": formatdate(stat.st_mtime, usegmt=True),
+        "Accept-Ranges": "bytes",
+        **(extra_headers or {}),
+    }
+
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        if _etag_matches(if_none_match, etag):
+            return Response(status_code=304, headers=headers)
+    elif _not_modified_since(request.headers.get("if-modified-since"), stat.st_mtime):
+        return Response(status_code=304, headers=headers)
+
+    range_header = request.headers.get("range")
+    if_range = request.headers.get("if-range")
+    if range_header and (if_range is None or if_range == etag):
+        byte_range = _parse_byte_range(range_header, stat.st_size)
+        if byte_range == "unsatisfiable":
+            return Response(status_code=416, headers={**headers, "Content-Range": f"bytes */{stat.st_size}"})
+        if byte_range is not None:
+            start, end = byte_range
+            headers.update({
+                "Content-Range": f"bytes {start}-{end}/{stat.st_size}",
+                "Content-Length": str(end - start + 1),
+                "Content-Disposition": f'attachment; filename="{filename}"',
+            })
+            return StreamingResponse(_read_range(path, start, end), status_code=206, media_type=media_type, headers=headers)
+
+    return FileResponse(path=str(path), media_type=media_type, filename=filename, headers=headers)
+
+
+def _etag_matches(if_none_match: str, etag: str) -> bool:
+    candidates = [value.strip() for value in if_none_match.split(",")]
+    return "*" in candidates or etag in candidates or f"W/{etag}" in candidates
+
+
+def _not_modified_since(if_modified_since: Optional[str], mtime: float) -> bool:
+    if not if_modified_since:
+        return False
+    try:
+        since = parsedate_to_datetime(if_modified_since)
+    except (TypeError, ValueError):
+        return False
+    return int(mtime) <= since.timestamp()
+
+
+def _parse_byte_range(range_header: str, size: int):
+    """
+    (start, end) inclusive for a single "bytes=" range, "unsatisfiable" for
+    one outside the file, None for anything else (served as a full response).
+    """
+    unit, _, spec = range_header.partition("=")
+    if unit.strip() != "bytes" or "," in spec:
+        return None
+    first, _, last = spec.strip().partition("-")
+    try:
+        if first:
+            start = int(first)
+            end = int(last) if last else size - 1
+        elif last:
+            start, end = max(size - int(last), 0), size - 1
+        else:
+            return None
+    except ValueError:
+        return None
+    if start >= size or start > end:
+        return "unsatisfiable"
+    return start, min(end, size - 1)
+
+
+def _read_range(path: Path, start: int, end: int, chunk_size: int = 64 * 1024) -> Iterator[bytes]:
+    with open(path, "rb") as f:
+        f.seek(start)
+        remaining = end - start + 1
+        while remaining > 0:
+            chunk = f.read(min(chunk_size, remaining))
+            if not chunk:
+                break
+            remaining -= len(chunk)
+            yield chunk
@@ -0,0 +1,33 @@
+import time
+from datetime import datetime
+from typing import Optional
+
+from fastapi import APIRouter, HTTPException, Query, Response
+
+from app.models.schemas import OutagesResponse, StoreUptimeResponse
+from app.services import store_uptime_service, timeline_service
+
+router = APIRouter()
+
+
+@router.get("/stores/{store_id}/uptime", response_model=StoreUptimeResponse)
+def get_store_uptime(store_id: str, response: Response) -> StoreUptimeResponse:
+    started = time.perf_counter()
+    result, current_time, cached = store_uptime_service.get_store_uptime(store_id)
+    if result is None:
+        raise HTTPException(status_code=404, detail="store_id not found")
+
+    latency_ms = round((time.perf_counter() - started) * 1000, 3)
+    response.headers["Server-Timing"] = f"uptime;dur={latency_ms};desc=\"{'hit' if cached else 'miss'}\""
+    response.headers["X-Cache"] = "HIT" if cached else "MISS"
+    return StoreUptimeResponse(**result.model_dump(), current_time=current_time, cached=cached, latency_ms=latency_ms)
+
+
+@router.get("/outages", response_model=OutagesResponse)
+def get_outages(
+    start: datetime, end: datetime, store_id: Optional[str] = None, limit: int = Query(1000, ge=1, le=100000)
+) -> OutagesResponse:
+    try:
+        return timeline_service.find_outages(start, end, store_id, limit)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
@@ -1,9 +1,16 @@
 import os
-from sqlalchemy import create_engine
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Optional
+
+from sqlalchemy import create_engine, event, inspect, text
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.engine import URL, Engine, make_url
 from sqlalchemy.orm import sessionmaker
 from dotenv import load_dotenv
 
 from app.database.models import Base
+from app.database.partitions import create_partitioned_store_status
 
 load_dotenv()
 
@@ -11,15 +18,211 @@ load_dotenv()
 DATABASE_URL = os.getenv("DATABASE_URL")
 if not DATABASE_URL:
     raise ValueError("DATABASE_URL environment variable is not set. Please check your .env file.")
-engine = create_engine(DATABASE_URL)
+# Async driver URL for the event loop; derived from DATABASE_URL (asyncpg / aiosqlite) when unset
+ASYNC_DATABASE_URL = os.getenv("ASYNC_DATABASE_URL", "")
+# Database reads on the event loop: "auto" uses the async driver on PostgreSQL
+# and worker threads on SQLite (aiosqlite runs a thread per connection anyway
+# and measured slower), "async" always uses the async driver, "threads" never
+DB_ASYNC_MODE = os.getenv("DB_ASYNC_MODE", "auto")
+
+# Connection pool of the API (sync and async engines each get one this size)
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "5"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "10"))
+# Separate pool for report workers, so long report queries never hold the API's connections
+REPORT_DB_POOL_SIZE = int(os.getenv("REPORT_DB_POOL_SIZE", "2"))
+REPORT_DB_MAX_OVERFLOW = int(os.getenv("REPORT_DB_MAX_OVERFLOW", "2"))
+# Seconds to wait for a free pooled connection, and to open a new one
+DB_POOL_TIMEOUT_SECONDS = float(os.getenv("DB_POOL_TIMEOUT_SECONDS", "10"))
+DB_CONNECT_TIMEOUT_SECONDS = int(os.getenv("DB_CONNECT_TIMEOUT_SECONDS", "10"))
+# Connections older than this are replaced (serverless endpoints drop idle ones)
+DB_POOL_RECYCLE_SECONDS = int(os.getenv("DB_POOL_RECYCLE_SECONDS", "1800"))
+# PostgreSQL statement_timeout for API connections, 0 = none; report connections never time out
+DB_STATEMENT_TIMEOUT_MS = int(os.getenv("DB_STATEMENT_TIMEOUT_MS", "0"))
+# Prepared statements cached per asyncpg connection; 0 behind a transaction-mode pooler (e.g. a Neon -pooler host)
+DB_STATEMENT_CACHE_SIZE = int(os.getenv("DB_STATEMENT_CACHE_SIZE", "100"))
+
+
+def _engine_options(url: URL, pool_size: int, max_overflow: int, statement_timeout_ms: int) -> dict:
+    """create_engine keyword arguments: pool sizing, pre-ping, recycling and driver timeouts."""
+    if url.get_backend_name() == "sqlite":
+        if url.database in (None, "", ":memory:"):
+            return {}  # one shared in-memory connection, nothing to size
+        # A local file: no connection to lose, so no pre-ping or recycling
+        return {
+            "connect_args": {"timeout": DB_CONNECT_TIMEOUT_SECONDS},  # busy timeout
+            "pool_size": pool_size, "max_overflow": max_overflow, "pool_timeout": DB_POOL_TIMEOUT_SECONDS,
+        }
+    options = {"pool_pre_ping": True, "pool_recycle": DB_POOL_RECYCLE_SECONDS}
+    if url.get_driver_name() == "asyncpg":
+        connect_args = {"timeout": DB_CONNECT_TIMEOUT_SECONDS, "statement_cache_size": DB_STATEMENT_CACHE_SIZE}
+        if statement_timeout_ms:
+            connect_args["server_settings"] = {"statement_timeout": str(statement_timeout_ms)}
+        options["connect_args"] = connect_args
+    elif url.get_backend_name() == "postgresql":
+        connect_args = {"connect_timeout": DB_CONNECT_TIMEOUT_SECONDS}
+        if statement_timeout_ms:
+            connect_args["options"] = f"-c statement_timeout={statement_timeout_ms}"
+        options["connect_args"] = connect_args
+    options.update(pool_size=pool_size, max_overflow=max_overflow, pool_timeout=DB_POOL_TIMEOUT_SECONDS)
+    return options
+
+
+_url = make_url(DATABASE_URL)
+engine = create_engine(DATABASE_URL, **_engine_options(_url, DB_POOL_SIZE, DB_MAX_OVERFLOW, DB_STATEMENT_TIMEOUT_MS))
+report_engine = create_engine(DATABASE_URL, **_engine_options(_url, REPORT_DB_POOL_SIZE, REPORT_DB_MAX_OVERFLOW, 0))
 SessionLocal = sessionmaker(bind=engine)
 
 
+def _use_wal(dbapi_connection, connection_record):
+    # In the default rollback journal a pending write blocks every new reader
+    # until a long report read finishes; with WAL readers never wait on writers
+    cursor = dbapi_connection.cursor()
+    cursor.execute("PRAGMA journal_mode=WAL")
+    cursor.close()
+
+
+if _url.get_backend_name() == "sqlite" and _url.database not in (None, "", ":memory:"):
+    event.listen(engine, "connect", _use_wal)
+    event.listen(report_engine, "connect", _use_wal)
+
+# Engine that get_db_session() and current_engine() hand out in this thread or task
+_current_engine: ContextVar[Optional[Engine]] = ContextVar("current_engine", default=None)
+
+
+def current_engine() -> Engine:
+    """The API engine, or report_engine inside use_report_pool()."""
+    return _current_engine.get() or engine
+
+
+@contextmanager
+def use_report_pool():
+    """Route this thread's database work (sessions and current_engine()) to the report pool."""
+    token = _current_engine.set(report_engine)
+    try:
+        yield
+    finally:
+        _current_engine.reset(token)
+
+
+# Indexes older databases have that another index already covers:
+# store_id is the leading column of uq_store_status_store_time and
+# timestamp_utc was indexed twice
+_REDUNDANT_INDEXES = ("ix_store_status_store_id", "ix_store_status_timestamp_utc")
+
+
 def create_tables():
-    """Create all database tables."""
+    """
+    Create all database tables, add nullable columns introduced since a table
+    was created and drop indexes made redundant since.
+    """
+    with engine.begin() as conn:
+        create_partitioned_store_status(conn)
     Base.metadata.create_all(bind=engine)
+    _add_missing_columns()
+    _drop_redundant_indexes()
+
+
+def _add_missing_columns():
+    # create_all never alters existing tables; new optional columns are simple to add in place
+    inspector = inspect(engine)
+    with engine.begin() as conn:
+        for table in Base.metadata.sorted_tables:
+            existing = {column["name"] for column in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name not in existing and column.nullable:
+                    column_type = column.type.compile(dialect=engine.dialect)
+                    conn.execute(text(f"ALTER TABLE {table.name} ADD COLUMN {column.name} {column_type}"))
+                    print(f"Added column {table.name}.{column.name}")
+
+
+def _drop_redundant_indexes():
+    with engine.begin() as conn:
+        existing = {index["name"] for index in inspect(conn).get_indexes("store_status")}
+        for name in _REDUNDANT_INDEXES:
+            if name in existing:
+                conn.execute(text(f"DROP INDEX {name}"))
+                print(f"Dropped redundant index {name}")
 
 
 def get_db_session():
     """Get a database session."""
-    return SessionLocal()
+    return SessionLocal(bind=current_engine())
+
+
+def dialect_insert(bind=engine):
+    """insert() for the connected backend, so upserts can use on_conflict_do_nothing/do_update."""
+    if bind.dialect.name == "sqlite":
+        return sqlite.insert
+    return postgresql.insert
+
+
+_async_engine = None
+_async_session_factory = None
+
+
+def async_engine_enabled() -> bool:
+    """Whether event-loop reads go through get_async_engine() rather than a worker thread (DB_ASYNC_MODE)."""
+    if DB_ASYNC_MODE not in ("auto", "async", "threads"):
+        raise ValueError(f"Unknown DB_ASYNC_MODE '{DB_ASYNC_MODE}', expected auto, async or threads")
+    if DB_ASYNC_MODE != "auto":
+        return DB_ASYNC_MODE == "async"
+    return make_url(ASYNC_DATABASE_URL or DATABASE_URL).get_backend_name() == "postgresql"
+
+
+def get_async_engine():
+    """
+    Engine for code running on the event loop: asyncpg for PostgreSQL,
+    aiosqlite for SQLite, with the API pool settings. Created on first use
+    (inside the running loop) so sync-only tools never import the async drivers.
+    """
+    global _async_engine
+    if _async_engine is None:
+        from sqlalchemy.ext.asyncio import create_async_engine
+
+        url, connect_args = _async_url(ASYNC_DATABASE_URL or DATABASE_URL)
+        options = _engine_options(url, DB_POOL_SIZE, DB_MAX_OVERFLOW, DB_STATEMENT_TIMEOUT_MS)
+        options["connect_args"] = {**options.get("connect_args", {}), **connect_args}
+        _async_engine = create_async_engine(url, **options)
+    return _async_engine
+
+
+def get_async_session():
+    """Get an async database session: `async with get_async_session() as session: ...`."""
+    global _async_session_factory
+    if _async_session_factory is None:
+        from sqlalchemy.ext.asyncio import async_sessionmaker
+
+        _async_session_factory = async_sessionmaker(get_async_engine(), expire_on_commit=False)
+    return _async_session_factory()
+
+
+def database_pools() -> dict:
+    """Connection pool of each engine in use, by name: api, report and (once created) async."""
+    pools = {"api": engine.pool, "report": report_engine.pool}
+    if _async_engine is not None:
+        pools["async"] = _async_engine.sync_engine.pool
+    return pools
+
+
+async def dispose_async_engine() -> None:
+    global _async_engine, _async_session_factory
+    if _async_engine is not None:
+        await _async_engine.dispose()
+    _async_engine = _async_session_factory = None
+
+
+def _async_url(database_url: str):
+    """The async driver URL for database_url, plus connect arguments its query string carried."""
+    url = make_url(database_url)
+    if url.get_backend_name() == "sqlite":
+        return url.set(drivername="sqlite+aiosqlite"), {}
+    if url.get_backend_name() != "postgresql" or url.get_driver_name() == "asyncpg":
+        return url, {}
+    # asyncpg takes ssl as a connect argument and has no channel_binding option
+    query = dict(url.query)
+    sslmode = query.pop("sslmode", None)
+    query.pop("channel_binding", None)
+    connect_args = {"ssl": sslmode} if sslmode and sslmode not in ("disable", "allow", "prefer") else {}
+    # SQLAlchemy's own prepared statement cache for asyncpg, sized like the driver's
+    query["prepared_statement_cache_size"] = str(DB_STATEMENT_CACHE_SIZE)
+    return url.set(drivername="postgresql+asyncpg", query=query), connect_args
@@ -1,35 +1,99 @@
-from datetime import datetime, time
+import io
+import os
+from itertools import islice
 from pathlib import Path
-from typing import List
+from typing import Callable, Dict, Iterator
 
 import pandas as pd
+from openpyxl import load_workbook
+from sqlalchemy import Column, DateTime, Integer, MetaData, String, Table, Time, delete, func, select, text, true
 from sqlalchemy.orm import Session
-from sqlalchemy.dialects.postgresql import insert
 
-from app.database.config import get_db_session
-from app.database.models import StoreStatus, MenuHours, StoreTimezone
+from app.database.config import dialect_insert, get_db_session
+from app.database.models import StoreStatus, MenuHours, StoreTimezone, StoreStatusHourly, StoreStatusRun, RollupWatermark, DataVersion, RetentionCutoff
+from app.database.partitions import ensure_partitions
+from app.database.source_cache import cached_chunks
 
 DATA_DIR = Path("files")
 DEFAULT_TIMEZONE = "America/Chicago"
+# Source rows read, cleaned and staged at a time; bounds ingestion memory
+INGEST_CHUNK_SIZE = int(os.getenv("INGEST_CHUNK_SIZE", "100000"))
+# Bump when the _clean_* rules change, so cached conversions of unchanged sources are redone
+_CLEANING_VERSION = 1
+# PostgreSQL NOTIFY channel signalled when new store_status rows are committed
+NEW_DATA_CHANNEL = "store_status_new"
+# PostgreSQL advisory lock key held by every store_status writer until it commits
+STATUS_WRITE_LOCK = 0x5354_4154  # "STAT"
 
-def ingest_all_data():
+# Cleaned columns of each source and their types (as source_cache names them)
+_STATUS_SCHEMA = {"store_id": "string", "timestamp_utc": "timestamp", "status": "string"}
+_MENU_HOURS_SCHEMA = {"store_id": "string", "day_of_week": "int", "start_time_local": "time", "end_time_local": "time"}
+_TIMEZONE_SCHEMA = {"store_id": "string", "timezone_str": "string"}
+_MENU_HOURS_COLUMNS = list(_MENU_HOURS_SCHEMA)
+
+# Session-local staging tables: chunks are bulk loaded here, then merged set-based
+_staging_metadata = MetaData()
+_status_staging = Table(
+    "store_status_staging", _staging_metadata,
+    Column("store_id", String(50)),
+    Column("timestamp_utc", DateTime(timezone=True)),
+    Column("status", String(10)),
+    prefixes=["TEMPORARY"],
+)
+_menu_hours_staging = Table(
+    "menu_hours_staging", _staging_metadata,
+    Column("store_id", String(50)),
+    Column("day_of_week", Integer),
+    Column("start_time_local", Time),
+    Column("end_time_local", Time),
+    prefixes=["TEMPORARY"],
+)
+_timezones_staging = Table(
+    "store_timezones_staging", _staging_metadata,
+    Column("store_id", String(50)),
+    Column("timezone_str", String(50)),
+    prefixes=["TEMPORARY"],
+)
+
+
+def ingest_all_data(reset: bool = False):
+    """
+    Load the source files into the database.
+
+    Every file is streamed in INGEST_CHUNK_SIZE chunks into a temporary
+    staging table (COPY on PostgreSQL, executemany elsewhere) and then merged
+    into the real table with one set-based statement, so re-running is
+    idempotent. reset=True empties the tables first, like the original
+    delete-and-reload behaviour.
+    """
 
     print("Starting data ingestion...")
-    
+
     session = get_db_session()
     try:
-        print("  Clearing existing data...")
-        session.query(StoreStatus).delete()
-        session.query(MenuHours).delete() 
-        session.query(StoreTimezone).delete()
-        
+        if reset:
+            print("  Clearing existing data...")
+            session.query(StoreStatus).delete()
+            session.query(MenuHours).delete()
+            session.query(StoreTimezone).delete()
+            # Rollups and status runs are derived from store_status and are rebuilt from scratch
+            session.query(StoreStatusHourly).delete()
+            session.query(StoreStatusRun).delete()
+            session.query(RollupWatermark).delete()
+            session.query(RetentionCutoff).delete()
+            # Ids restart on some backends: long-lived copies (the dataset snapshot) reload
+            bump_data_version(session, "store_status_reset")
+
+        _staging_metadata.create_all(session.connection())
+
         ingest_store_status(session)
         ingest_menu_hours(session)
         ingest_store_timezones(session)
-        
+
+        _staging_metadata.drop_all(session.connection())
         session.commit()
         print("Data ingestion completed!")
-        
+
     except Exception as e:
         session.rollback()
         print(f"Error during ingestion: {e}")
@@ -39,137 +103,238 @@ def ingest_all_data():
 
 
 def ingest_store_status(session: Session):
-    print("  Ingesting store status data (first 50k entries)...")
-    
-    file_path = DATA_DIR / "store_status.xlsx"
-    df = pd.read_excel(file_path, nrows=50000)  # Only read first 50k rows
-    df.columns = [c.strip() for c in df.columns]
-    
-    # Clean the data
-    df = df.dropna(subset=["store_id", "timestamp_utc", "status"]).copy()
-    df["store_id"] = df["store_id"].astype(str)
-    df["timestamp_utc"] = pd.to_datetime(df["timestamp_utc"], utc=True)
-    df["status"] = df["status"].astype(str).str.lower()
-    df = df[df["status"].isin(["active", "inactive"])]
-    
-    print(f"Processing {len(df)} records in batches...")
-    
-    # Process in batches to avoid transaction size limits
-    batch_size = 1000 
-    total_processed = 0
-    
-    for i in range(0, len(df), batch_size):
-        batch_df = df.iloc[i:i + batch_size]
-        
-        # Convert batch to list of dictionaries
-        records = []
-        for _, row in batch_df.iterrows():
-            records.append({
-                "store_id": row["store_id"],
-                "timestamp_utc": row["timestamp_utc"].to_pydatetime(),
-                "status": row["status"]
-            })
-        
-        if records:
-            stmt = insert(StoreStatus).values(records)
-            # Skip conflict handling for now to get data loaded
-            # stmt = stmt.on_conflict_do_nothing(index_elements=["store_id", "timestamp_utc"])
-            session.execute(stmt)
-            
-        total_processed += len(records)
-        print(f"    Batch {i//batch_size + 1}: processed {len(records)} records ({total_processed}/{len(df)} total)")
-        
-    print(f"    Successfully inserted {total_processed} store status records")
+    print("  Ingesting store status data...")
+
+    # A CSV export is preferred when present: it streams much faster than xlsx
+    source = DATA_DIR / "store_status.csv"
+    if not source.exists():
+        source = DATA_DIR / "store_status.xlsx"
+
+    staged = 0
+    for chunk in _source_chunks(source, _STATUS_SCHEMA, _clean_store_status):
+        _stage(session, _status_staging, chunk)
+        staged += len(chunk)
+        print(f"    Staged {staged:,} records")
+
+    inserted = _merge_staged_status(session)
+    # Ids can be reused after a reset on SQLite, so max(id) alone is not a safe watermark
+    bump_data_version(session, "store_status")
+    if inserted:
+        publish_new_data(session)
+    print(f"    Merged {staged:,} staged records into store_status ({inserted:,} new)")
+
+
+def insert_observations(session: Session, observations: pd.DataFrame) -> int:
+    """
+    Add cleaned observations (store_id, timestamp_utc, status) to
+    store_status the way file ingestion merges them: through the staging
+    table, skipping duplicates and rows before the retention cutoff, and
+    creating missing weekly partitions. Holds the store_status write lock
+    (PostgreSQL) until the caller commits. Returns the rows inserted.
+    """
+    _status_staging.create(session.connection(), checkfirst=True)
+    # A pooled connection can keep the temporary table of an earlier failed batch
+    session.execute(delete(_status_staging))
+    _stage(session, _status_staging, observations)
+    inserted = _merge_staged_status(session)
+    _status_staging.drop(session.connection())
+    return inserted
+
+
+def _merge_staged_status(session: Session) -> int:
+    # One writer at a time until commit (file ingestion and each API process's
+    # observation flusher), so store_status ids become visible in order: the
+    # rollup, status runs, snapshot and poller read "id > watermark" and
+    # would skip rows that committed behind a higher id. SQLite serializes
+    # writers by itself.
+    if session.get_bind().dialect.name == "postgresql":
+        session.execute(text("SELECT pg_advisory_xact_lock(:key)"), {"key": STATUS_WRITE_LOCK})
+
+    # Observations before the retention cutoff were already downsampled into
+    # store_status_hourly and removed; loading them again would count them twice
+    keep = true()  # SQLite needs a WHERE to parse INSERT ... SELECT ... ON CONFLICT
+    cutoff = session.get(RetentionCutoff, "store_status")
+    if cutoff is not None:
+        keep = _status_staging.c.timestamp_utc >= cutoff.cutoff_utc
+        skipped = session.execute(select(func.count()).where(~keep)).scalar_one()
+        if skipped:
+            print(f"    Skipping {skipped:,} records before the retention cutoff {cutoff.cutoff_utc:%Y-%m-%d}")
+
+    # A partitioned store_status only accepts rows inside an existing weekly partition
+    lo, hi = session.execute(
+        select(func.min(_status_staging.c.timestamp_utc), func.max(_status_staging.c.timestamp_utc)).where(keep)
+    ).one()
+    ensure_partitions(session.connection(), lo, hi)
+
+    # Duplicate observations (in the file or already loaded) are skipped by the unique constraint
+    source = (
+        select(_status_staging.c.store_id, _status_staging.c.timestamp_utc, func.max(_status_staging.c.status))
+        .where(keep)
+        .group_by(_status_staging.c.store_id, _status_staging.c.timestamp_utc)
+    )
+    stmt = (
+        dialect_insert(session.get_bind())(StoreStatus)
+        .from_select(["store_id", "timestamp_utc", "status"], source)
+        .on_conflict_do_nothing(index_elements=["store_id", "timestamp_utc"])
+    )
+    return session.execute(stmt).rowcount
 
 
 def ingest_menu_hours(session: Session):
-    print("  Ingesting menu hours data (first 50k entries)...")
-    
-    file_path = DATA_DIR / "menu_hours.csv"
-    df = pd.read_csv(file_path, nrows=50000)  # Limit to 50k rows
-    df.columns = [c.strip() for c in df.columns]
-    
-    if "dayOfWeek" in df.columns:
-        df = df.rename(columns={"dayOfWeek": "day_of_week"})
-    
-    df = df.dropna(subset=["store_id", "day_of_week", "start_time_local", "end_time_local"]).copy()
-    df["store_id"] = df["store_id"].astype(str)
-    df["day_of_week"] = df["day_of_week"].astype(int)
-    
-    records = []
-    for _, row in df.iterrows():
-        start_time = _parse_time_string(row["start_time_local"])
-        end_time = _parse_time_string(row["end_time_local"])
-        
-        if start_time and end_time:
-            records.append({
-                "store_id": row["store_id"],
-                "day_of_week": row["day_of_week"],
-                "start_time_local": start_time,
-                "end_time_local": end_time
-            })
-    
-    # Bulk insert
-    if records:
-        stmt = insert(MenuHours).values(records)
-        # Skip conflict handling for now to avoid parameter limits
-        # stmt = stmt.on_conflict_do_nothing(index_elements=["store_id", "day_of_week", "start_time_local", "end_time_local"])
-        session.execute(stmt)
-        
-    print(f"    Inserted {len(records)} menu hours records")
+    print("  Ingesting menu hours data...")
+
+    staged = 0
+    for chunk in _source_chunks(DATA_DIR / "menu_hours.csv", _MENU_HOURS_SCHEMA, _clean_menu_hours):
+        _stage(session, _menu_hours_staging, chunk)
+        staged += len(chunk)
+
+    # menu_hours has no natural key: a store in the file gets exactly the file's schedule
+    session.execute(delete(MenuHours).where(MenuHours.store_id.in_(select(_menu_hours_staging.c.store_id))))
+    session.execute(MenuHours.__table__.insert().from_select(
+        _MENU_HOURS_COLUMNS, select(*[_menu_hours_staging.c[c] for c in _MENU_HOURS_COLUMNS]).distinct()
+    ))
+    bump_data_version(session, "menu_hours")
+    print(f"    Merged {staged:,} menu hours records")
 
 
 def ingest_store_timezones(session: Session):
-    print("  Ingesting timezone data (first 10k entries)...")
-    
-    file_path = DATA_DIR / "timezones.csv"
-    df = pd.read_csv(file_path, nrows=10000)  # Limit to 10k rows
-    df.columns = [c.strip() for c in df.columns]
-    
-    if "timezone" in df.columns and "timezone_str" not in df.columns:
-        df = df.rename(columns={"timezone": "timezone_str"})
-    
-    df = df.dropna(subset=["store_id"]).copy()
-    df["store_id"] = df["store_id"].astype(str)
-    df["timezone_str"] = df["timezone_str"].fillna(DEFAULT_TIMEZONE)
-    
-    records = [
-        {
-            "store_id": row["store_id"],
-            "timezone_str": row["timezone_str"]
-        }
-        for _, row in df.iterrows()
-    ]
-    
-    if records:
-        stmt = insert(StoreTimezone).values(records)
-        # Skip conflict handling for now to avoid parameter limits  
-        # stmt = stmt.on_conflict_do_update(index_elements=["store_id"], set_=dict(timezone_str=stmt.excluded.timezone_str))
-        session.execute(stmt)
-        
-    print(f"    Inserted {len(records)} timezone records")
-
-
-def _parse_time_string(time_str: str) -> time:
-    """Parse time string in various formats to time object."""
+    print("  Ingesting timezone data...")
+
+    staged = 0
+    for chunk in _source_chunks(DATA_DIR / "timezones.csv", _TIMEZONE_SCHEMA, _clean_timezones):
+        _stage(session, _timezones_staging, chunk)
+        staged += len(chunk)
+
+    source = (
+        select(_timezones_staging.c.store_id, func.max(_timezones_staging.c.timezone_str))
+        .where(true())  # SQLite needs a WHERE to parse INSERT ... SELECT ... ON CONFLICT
+        .group_by(_timezones_staging.c.store_id)
+    )
+    stmt = dialect_insert(session.get_bind())(StoreTimezone).from_select(["store_id", "timezone_str"], source)
+    stmt = stmt.on_conflict_do_update(index_elements=["store_id"], set_={"timezone_str": stmt.excluded.timezone_str})
+    session.execute(stmt)
+    bump_data_version(session, "store_timezones")
+    print(f"    Merged {staged:,} timezone records")
+
+
+def bump_data_version(session: Session, name: str) -> None:
+    """Record that a table changed, so caches keyed on data versions are invalidated."""
+    stmt = dialect_insert(session.get_bind())(DataVersion).values(name=name, version=1)
+    stmt = stmt.on_conflict_do_update(index_elements=["name"], set_={"version": DataVersion.version + 1})
+    session.execute(stmt)
+
+
+def publish_new_data(session: Session) -> None:
+    """Wake listening pollers once this transaction commits (PostgreSQL only)."""
+    if session.get_bind().dialect.name == "postgresql":
+        session.execute(text("SELECT pg_notify(:channel, '')"), {"channel": NEW_DATA_CHANNEL})
+
+
+def _source_chunks(file_path: Path, schema: Dict[str, str], clean: Callable[[pd.DataFrame], pd.DataFrame]) -> Iterator[pd.DataFrame]:
+    """Cleaned chunks of a source file, parsed once per file content and then read from SOURCE_CACHE_DIR."""
+    columns = list(schema)
+    return cached_chunks(
+        file_path, _CLEANING_VERSION, schema, lambda: (clean(chunk)[columns] for chunk in _read_chunks(file_path)),
+        INGEST_CHUNK_SIZE,
+    )
+
+
+def _clean_store_status(chunk: pd.DataFrame) -> pd.DataFrame:
+    chunk = chunk.dropna(subset=["store_id", "timestamp_utc", "status"]).copy()
+    chunk["store_id"] = chunk["store_id"].astype(str)
+    chunk["timestamp_utc"] = pd.to_datetime(chunk["timestamp_utc"], utc=True)
+    chunk["status"] = chunk["status"].astype(str).str.lower()
+    return chunk[chunk["status"].isin(["active", "inactive"])]
+
+
+def _clean_menu_hours(chunk: pd.DataFrame) -> pd.DataFrame:
+    if "dayOfWeek" in chunk.columns:
+        chunk = chunk.rename(columns={"dayOfWeek": "day_of_week"})
+
+    chunk = chunk.dropna(subset=["store_id", "day_of_week", "start_time_local", "end_time_local"]).copy()
+    chunk["store_id"] = chunk["store_id"].astype(str)
+    chunk["day_of_week"] = chunk["day_of_week"].astype(int)
+    chunk["start_time_local"] = _parse_times(chunk["start_time_local"])
+    chunk["end_time_local"] = _parse_times(chunk["end_time_local"])
+    return chunk.dropna(subset=["start_time_local", "end_time_local"])
+
+
+def _clean_timezones(chunk: pd.DataFrame) -> pd.DataFrame:
+    if "timezone" in chunk.columns and "timezone_str" not in chunk.columns:
+        chunk = chunk.rename(columns={"timezone": "timezone_str"})
+
+    chunk = chunk.dropna(subset=["store_id"]).copy()
+    chunk["store_id"] = chunk["store_id"].astype(str)
+    chunk["timezone_str"] = chunk["timezone_str"].fillna(DEFAULT_TIMEZONE)
+    return chunk
+
+
+def _read_chunks(file_path: Path) -> Iterator[pd.DataFrame]:
+    """Stream a CSV or xlsx source file as DataFrames of at most INGEST_CHUNK_SIZE rows."""
+    if file_path.suffix == ".xlsx":
+        chunks = _read_xlsx_chunks(file_path)
+    else:
+        chunks = pd.read_csv(file_path, chunksize=INGEST_CHUNK_SIZE)
+
+    for chunk in chunks:
+        chunk.columns = [str(c).strip() for c in chunk.columns]
+        yield chunk
+
+
+def _read_xlsx_chunks(file_path: Path) -> Iterator[pd.DataFrame]:
+    # read_only mode streams rows from the sheet XML instead of building the whole workbook
+    workbook = load_workbook(file_path, read_only=True, data_only=True)
     try:
-        # Try HH:MM:SS format first
-        if len(str(time_str).split(":")) == 3:
-            return datetime.strptime(str(time_str), "%H:%M:%S").time()
-        # Try HH:MM format
-        elif len(str(time_str).split(":")) == 2:
-            return datetime.strptime(str(time_str), "%H:%M").time()
-        else:
-            return None
-    except (ValueError, AttributeError):
-        return None
+        rows = workbook.active.iter_rows(values_only=True)
+        header = next(rows, None)
+        if header is None:
+            return
+        while True:
+            block = list(islice(rows, INGEST_CHUNK_SIZE))
+            if not block:
+                break
+            yield pd.DataFrame(block, columns=list(header))
+    finally:
+        workbook.close()
+
+
+def _stage(session: Session, staging: Table, chunk: pd.DataFrame) -> None:
+    """Bulk load one cleaned chunk into a staging table."""
+    if chunk.empty:
+        return
+
+    connection = session.connection()
+    if connection.dialect.driver == "psycopg2":
+        buffer = io.StringIO()
+        chunk.to_csv(buffer, index=False, header=False)
+        buffer.seek(0)
+        cursor = connection.connection.cursor()
+        try:
+            cursor.copy_expert(f"COPY {staging.name} ({', '.join(chunk.columns)}) FROM STDIN WITH (FORMAT csv)", buffer)
+        finally:
+            cursor.close()
+    else:
+        records = chunk.to_dict("records")
+        for record in records:
+            for key, value in record.items():
+                if isinstance(value, pd.Timestamp):
+                    record[key] = value.to_pydatetime()
+        session.execute(staging.insert(), records)
+
+
+def _parse_times(values: pd.Series) -> pd.Series:
+    """Parse HH:MM:SS or HH:MM strings to time objects; anything else becomes None."""
+    text = values.astype(str).str.strip()
+    parsed = pd.to_datetime(text, format="%H:%M:%S", errors="coerce")
+    parsed = parsed.fillna(pd.to_datetime(text, format="%H:%M", errors="coerce"))
+    return parsed.dt.time.where(parsed.notna(), None)
 
 
 if __name__ == "__main__":
     from app.database.config import create_tables
-    
+
     print("Creating database tables...")
     create_tables()
-    
+
     print("Starting data ingestion...")
     ingest_all_data()
@@ -1,5 +1,5 @@
 from datetime import time
-from sqlalchemy import Column, Integer, String, DateTime, Time, CheckConstraint, Index, UniqueConstraint
+from sqlalchemy import Column, Integer, BigInteger, Boolean, String, Text, DateTime, Time, CheckConstraint, Index, UniqueConstraint
 from sqlalchemy.dialects.postgresql import UUID
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.sql import func
@@ -8,11 +8,14 @@ Base = declarative_base()
 
 
 class StoreStatus(Base):
+    # On PostgreSQL the table is range partitioned by week on timestamp_utc and
+    # created by app.database.partitions (keep its DDL in sync with this model)
     __tablename__ = "store_status"
     
     id = Column(Integer, primary_key=True, autoincrement=True)
-    store_id = Column(String(50), nullable=False, index=True) 
-    timestamp_utc = Column(DateTime(timezone=True), nullable=False, index=True)
+    # Lookups by store use the unique (store_id, timestamp_utc) index, time ranges idx_store_status_time
+    store_id = Column(String(50), nullable=False)
+    timestamp_utc = Column(DateTime(timezone=True), nullable=False)
     status = Column(String(10), nullable=False)
     created_at = Column(DateTime(timezone=True), default=func.now())
     
@@ -44,3 +47,87 @@ class StoreTimezone(Base):
     
     store_id = Column(String(50), primary_key=True)
     timezone_str = Column(String(50), nullable=False)
+
+
+class StoreStatusHourly(Base):
+    """Per-store, per-hour observation counts, maintained incrementally from store_status."""
+    __tablename__ = "store_status_hourly"
+
+    store_id = Column(String(50), primary_key=True)
+    hour_utc = Column(DateTime(timezone=True), primary_key=True)  # start of the hour
+    active_count = Column(Integer, nullable=False, default=0)
+    total_count = Column(Integer, nullable=False, default=0)
+
+    __table_args__ = (
+        Index("idx_store_status_hourly_hour", "hour_utc"),
+    )
+
+
+class StoreStatusRun(Base):
+    """
+    Consecutive observations of one store with the same status, maintained
+    incrementally from store_status. Runs never cross a UTC week boundary,
+    so one that overlaps a time range starts less than a week before it.
+    """
+    __tablename__ = "store_status_runs"
+
+    store_id = Column(String(50), primary_key=True)
+    start_utc = Column(DateTime(timezone=True), primary_key=True)  # first observation of the run
+    end_utc = Column(DateTime(timezone=True), nullable=False)  # last observation of the run
+    active = Column(Boolean, nullable=False)
+    observations = Column(Integer, nullable=False)
+
+    __table_args__ = (
+        Index("idx_store_status_runs_start", "start_utc"),
+    )
+
+
+class RollupWatermark(Base):
+    """Highest store_status.id already folded into a rollup table."""
+    __tablename__ = "rollup_watermarks"
+
+    name = Column(String(50), primary_key=True)
+    last_id = Column(BigInteger, nullable=False, default=0)
+    updated_at = Column(DateTime(timezone=True), default=func.now(), onupdate=func.now())
+
+
+class RetentionCutoff(Base):
+    """Observations of a table older than cutoff_utc were downsampled into store_status_hourly and removed."""
+    __tablename__ = "retention_cutoffs"
+
+    name = Column(String(50), primary_key=True)
+    cutoff_utc = Column(DateTime(timezone=True), nullable=False)
+    updated_at = Column(DateTime(timezone=True), default=func.now(), onupdate=func.now())
+
+
+class DataVersion(Base):
+    """Version counter per source table, bumped whenever ingestion changes that table."""
+    __tablename__ = "data_versions"
+
+    name = Column(String(50), primary_key=True)
+    version = Column(BigInteger, nullable=False, default=0)
+    updated_at = Column(DateTime(timezone=True), default=func.now(), onupdate=func.now())
+
+
+class ReportJob(Base):
+    """A requested report and its lifecycle, shared by every API and worker process."""
+    __tablename__ = "report_jobs"
+
+    report_id = Column(String(36), primary_key=True)
+    status = Column(String(10), nullable=False, default="queued")
+    priority = Column(Integer, nullable=False, default=0)  # higher runs first
+    fingerprint = Column(String(40), nullable=False)  # data watermark the report is computed for
+    windows = Column(String(255))  # requested windows, e.g. "15m,1h,30d"; NULL for the default 1h/24h/7d
+    backfill = Column(Text)  # JSON {"start", "end", "step"} for a backfill job; NULL for a report
+    output_csv_path = Column(String(255))
+    error_message = Column(Text)
+    stage_timings = Column(Text)  # JSON: seconds and row/store counts per generation stage
+    created_at = Column(DateTime(timezone=True), default=func.now())
+    started_at = Column(DateTime(timezone=True))
+    finished_at = Column(DateTime(timezone=True))
+
+    __table_args__ = (
+        CheckConstraint("status IN ('queued', 'running', 'complete', 'failed', 'expired')", name="report_job_status_check"),
+        Index("idx_report_jobs_queue", "status", "priority", "created_at"),
+        Index("idx_report_jobs_fingerprint", "fingerprint"),
+    )
@@ -0,0 +1,150 @@
+import os
+import re
+from datetime import datetime, timedelta
+from typing import List, Optional, Tuple
+
+import pandas as pd
+from sqlalchemy import inspect, text
+from sqlalchemy.engine import Connection
+
+# Create store_status range partitioned by week (PostgreSQL only). Existing
+# unpartitioned tables are converted with `python setup_database.py --partition`.
+STORE_STATUS_PARTITIONED = os.getenv("STORE_STATUS_PARTITIONED", "true").lower() in ("1", "true", "yes")
+
+PARTITION_SPAN = timedelta(weeks=1)
+# store_status_pYYYYMMDD, named after the Monday (UTC) the partition starts on
+_PARTITION_NAME = re.compile(r"store_status_p(\d{8})")
+
+
+def week_start(value) -> pd.Timestamp:
+    """Monday 00:00 UTC of the week containing value; partition and retention boundaries."""
+    ts = pd.Timestamp(value)
+    ts = ts.tz_localize("UTC") if ts.tzinfo is None else ts.tz_convert("UTC")
+    return ts.normalize() - timedelta(days=ts.weekday())
+
+
+def is_partitioned(conn: Connection) -> bool:
+    if conn.dialect.name != "postgresql":
+        return False
+    return conn.execute(text(
+        "SELECT EXISTS (SELECT 1 FROM pg_partitioned_table p JOIN pg_class c ON c.oid = p.partrelid "
+        "WHERE c.relname = 'store_status' AND pg_table_is_visible(c.oid))"
+    )).scalar_one()
+
+
+def create_partitioned_store_status(conn: Connection) -> None:
+    """Create an empty partitioned store_status, unless partitioning is off or not PostgreSQL."""
+    if conn.dialect.name != "postgresql" or not STORE_STATUS_PARTITIONED:
+        return
+    if inspect(conn).has_table("store_status"):
+        return
+    conn.execute(text("CREATE SEQUENCE IF NOT EXISTS store_status_id_seq"))
+    _create_table(conn, "store_status")
+    conn.execute(text("ALTER SEQUENCE store_status_id_seq OWNED BY store_status.id"))
+    print("Created store_status partitioned by week")
+
+
+def ensure_partitions(conn: Connection, start: datetime, end: datetime) -> int:
+    """
+    Create the weekly partitions covering [start, end] that do not exist yet,
+    before rows in that range are inserted. There is no default partition,
+    so a row outside every partition fails loudly instead of landing in a
+    catch-all that would block creating its week later. Returns the number
+    of partitions created; a no-op unless store_status is partitioned.
+    """
+    if start is None or end is None or not is_partitioned(conn):
+        return 0
+    existing = {lower for _, lower, _ in list_partitions(conn)}
+    created = 0
+    lower = week_start(start)
+    while lower <= week_start(end):
+        if lower not in existing:
+            _create_partition(conn, "store_status", lower)
+            created += 1
+        lower += PARTITION_SPAN
+    return created
+
+
+def list_partitions(conn: Connection) -> List[Tuple[str, pd.Timestamp, pd.Timestamp]]:
+    """(name, lower bound, upper bound) of every weekly store_status partition, oldest first."""
+    if not is_partitioned(conn):
+        return []
+    names = conn.execute(text(
+        "SELECT c.relname FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid "
+        "WHERE i.inhparent = 'store_status'::regclass"
+    )).scalars()
+    partitions = []
+    for name in names:
+        match = _PARTITION_NAME.fullmatch(name)
+        if match:
+            lower = pd.Timestamp(match.group(1), tz="UTC")
+            partitions.append((name, lower, lower + PARTITION_SPAN))
+    return sorted(partitions, key=lambda partition: partition[1])
+
+
+def drop_partition(conn: Connection, name: str) -> None:
+    """Detach and drop one partition: a catalog change, with no row deletes or vacuum left behind."""
+    if not _PARTITION_NAME.fullmatch(name):
+        raise ValueError(f"Not a store_status partition: {name}")
+    conn.execute(text(f"ALTER TABLE store_status DETACH PARTITION {name}"))
+    conn.execute(text(f"DROP TABLE {name}"))
+
+
+def migrate_to_partitioned(conn: Connection) -> Optional[int]:
+    """
+    Convert an existing unpartitioned store_status into the weekly
+    partitioned layout, keeping ids (and so rollup and report watermarks).
+    Runs in the caller's transaction and holds an exclusive lock on the
+    table while rows are copied. Returns the rows moved, or None if there
+    was nothing to do.
+    """
+    if conn.dialect.name != "postgresql" or is_partitioned(conn) or not inspect(conn).has_table("store_status"):
+        return None
+
+    conn.execute(text("LOCK TABLE store_status IN ACCESS EXCLUSIVE MODE"))
+    lo, hi = conn.execute(text("SELECT min(timestamp_utc), max(timestamp_utc) FROM store_status")).one()
+
+    _create_table(conn, "store_status_partitioned")
+    lower = week_start(lo) if lo is not None else None
+    while lower is not None and lower <= week_start(hi):
+        _create_partition(conn, "store_status_partitioned", lower)
+        lower += PARTITION_SPAN
+    moved = conn.execute(text(
+        "INSERT INTO store_status_partitioned (id, store_id, timestamp_utc, status, created_at) "
+        "SELECT id, store_id, timestamp_utc, status, created_at FROM store_status"
+    )).rowcount
+
+    conn.execute(text("ALTER SEQUENCE store_status_id_seq OWNED BY store_status_partitioned.id"))
+    conn.execute(text("DROP TABLE store_status"))
+    conn.execute(text("ALTER TABLE store_status_partitioned RENAME TO store_status"))
+    conn.execute(text("ALTER TABLE store_status RENAME CONSTRAINT store_status_partitioned_pkey TO store_status_pkey"))
+    conn.execute(text("ALTER TABLE store_status RENAME CONSTRAINT uq_store_status_partitioned_store_time TO uq_store_status_store_time"))
+    conn.execute(text("ALTER INDEX idx_store_status_partitioned_time RENAME TO idx_store_status_time"))
+    return moved
+
+
+def _create_table(conn: Connection, name: str) -> None:
+    # Same columns and constraints as models.StoreStatus; the primary key has
+    # to include the partition key. Ids come from the shared store_status_id_seq.
+    suffix = "" if name == "store_status" else name[len("store_status"):]
+    conn.execute(text(f"""
+        CREATE TABLE {name} (
+            id INTEGER NOT NULL DEFAULT nextval('store_status_id_seq'),
+            store_id VARCHAR(50) NOT NULL,
+            timestamp_utc TIMESTAMP WITH TIME ZONE NOT NULL,
+            status VARCHAR(10) NOT NULL,
+            created_at TIMESTAMP WITH TIME ZONE DEFAULT now(),
+            CONSTRAINT {name}_pkey PRIMARY KEY (id, timestamp_utc),
+            CONSTRAINT uq_store_status{suffix}_store_time UNIQUE (store_id, timestamp_utc),
+            CONSTRAINT status_check CHECK (status IN ('active', 'inactive'))
+        ) PARTITION BY RANGE (timestamp_utc)
+    """))
+    conn.execute(text(f"CREATE INDEX idx_store_status{suffix}_time ON {name} (timestamp_utc)"))
+
+
+def _create_partition(conn: Connection, parent: str, lower: pd.Timestamp) -> None:
+    upper = lower + PARTITION_SPAN
+    conn.execute(text(
+        f"CREATE TABLE IF NOT EXISTS store_status_p{lower:%Y%m%d} PARTITION OF {parent} "
+        f"FOR VALUES FROM ('{lower.isoformat()}') TO ('{upper.isoformat()}')"
+    ))
@@ -0,0 +1,109 @@
+import hashlib
+import os
+from pathlib import Path
+from typing import Callable, Dict, Iterator, Optional
+
+import pandas as pd
+
+# Cleaned source files are converted once to Parquet here, keyed by checksum;
+# empty to always parse the sources (needs pyarrow, otherwise skipped)
+SOURCE_CACHE_DIR = os.getenv("SOURCE_CACHE_DIR", "cache/sources")
+# Bytes hashed per read when checksumming a source file
+_CHECKSUM_BLOCK_SIZE = 1 << 20
+
+
+def cached_chunks(
+    source: Path,
+    version: int,
+    schema: Dict[str, str],
+    read: Callable[[], Iterator[pd.DataFrame]],
+    chunk_size: int
+) -> Iterator[pd.DataFrame]:
+    """
+    Cleaned chunks of a source file: read() the first time a file's
+    content is seen (while writing them to the cache), then from the cache.
+
+    The cache file is named after the source, its SHA-256 and the cleaning
+    version, so an edited source or changed cleaning rules are converted
+    again and the stale file is replaced. Cached chunks are read
+    memory-mapped, one row group of at most chunk_size rows at a time and
+    only the schema's columns, with the dtypes read() produced.
+
+    schema maps each column to "string", "int", "timestamp" (UTC) or
+    "time"; the file is written with these types rather than the ones
+    inferred from the first chunk, which a later chunk may not match.
+    """
+    pq = _parquet()
+    if pq is None:
+        yield from read()
+        return
+
+    columns = list(schema)
+    path = Path(SOURCE_CACHE_DIR) / f"{source.stem}-v{version}-{_checksum(source)[:24]}.parquet"
+    if path.exists():
+        print(f"    Reading cached {source.name} ({path.name})")
+        parquet = pq.ParquetFile(path, memory_map=True)
+        for batch in parquet.iter_batches(batch_size=chunk_size, columns=columns):
+            yield batch.to_pandas()
+        return
+
+    yield from _convert(pq, read(), path, schema)
+    # Only one conversion per source is kept
+    for stale in path.parent.glob(f"{source.stem}-v*.parquet"):
+        if stale != path:
+            stale.unlink(missing_ok=True)
+
+
+def _convert(pq, chunks: Iterator[pd.DataFrame], path: Path, schema: Dict[str, str]) -> Iterator[pd.DataFrame]:
+    # Each chunk is written as a row group as it passes through, so memory
+    # stays bounded by the chunk size; the file is renamed into place once complete
+    import pyarrow as pa
+
+    arrow_types = {
+        "string": pa.string(),
+        "int": pa.int64(),
+        "timestamp": pa.timestamp("ns", tz="UTC"),
+        "time": pa.time64("us"),
+    }
+    arrow_schema = pa.schema([(column, arrow_types[kind]) for column, kind in schema.items()])
+    columns = list(schema)
+
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_name(path.name + ".tmp")
+    writer = None
+    complete = False
+    try:
+        for chunk in chunks:
+            if len(chunk):
+                table = pa.Table.from_pandas(chunk[columns], schema=arrow_schema, preserve_index=False)
+                if writer is None:
+                    writer = pq.ParquetWriter(tmp_path, arrow_schema)
+                writer.write_table(table)
+            yield chunk
+        complete = True
+    finally:
+        if writer is not None:
+            writer.close()
+        if complete and writer is not None:
+            os.replace(tmp_path, path)
+        else:
+            tmp_path.unlink(missing_ok=True)
+
+
+def _checksum(source: Path) -> str:
+    digest = hashlib.sha256()
+    with open(source, "rb") as f:
+        for block in iter(lambda: f.read(_CHECKSUM_BLOCK_SIZE), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _parquet() -> Optional[object]:
+    if not SOURCE_CACHE_DIR:
+        return None
+    try:
+        import pyarrow.parquet as pq
+    except ImportError:
+        print("    pyarrow is not installed: reading source files without the Parquet cache")
+        return None
+    return pq
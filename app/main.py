@@ -1,10 +1,36 @@
+from contextlib import asynccontextmanager
+
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 
 from app.api.report import router as report_router
 from app.api.polling import router as polling_router
+from app.api.stores import router as stores_router
+from app.api.metrics import router as metrics_router
+from app.api.backfill import router as backfill_router
+from app.api.observations import router as observations_router
+from app.database.config import create_tables, dispose_async_engine
+from app.services.observation_service import observation_buffer
+from app.services.report_service import worker_pool
+from app.services.snapshot import DATASET_SNAPSHOT, dataset_snapshot
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Only creates missing tables, e.g. report_jobs on a database set up before it existed
+    create_tables()
+    worker_pool.start()
+    observation_buffer.start()
+    if DATASET_SNAPSHOT:
+        dataset_snapshot.warm_up()
+    yield
+    # Buffered observations are written before shutdown
+    observation_buffer.stop(timeout=30)
+    worker_pool.stop(timeout=5)
+    await dispose_async_engine()
+
 
-app = FastAPI(title="Store Monitoring Backend", version="1.0.0")
+app = FastAPI(title="Store Monitoring Backend", version="1.0.0", lifespan=lifespan)
 
 app.add_middleware(
     CORSMiddleware,
@@ -16,3 +42,7 @@ app.add_middleware(
 
 app.include_router(report_router)
 app.include_router(polling_router, prefix="/polling", tags=["polling"])
+app.include_router(stores_router, tags=["stores"])
+app.include_router(metrics_router, tags=["metrics"])
+app.include_router(backfill_router, tags=["backfill"])
+app.include_router(observations_router, tags=["observations"])
@@ -1,6 +1,9 @@
 from dataclasses import dataclass
+from datetime import datetime
 from pathlib import Path
-from typing import Literal, Optional
+from typing import Dict, Iterable, Iterator, List, Literal, Optional, Tuple
+
+import numpy as np
 from pydantic import BaseModel
 
 class TriggerReportResponse(BaseModel):
@@ -10,9 +13,14 @@ class TriggerReportResponse(BaseModel):
 @dataclass 
 class ReportInfo:
     report_id: str
-    status: Literal["running", "complete", "failed"]
+    status: Literal["queued", "running", "complete", "failed", "expired"]
     output_csv_path: Optional[Path] = None
     error_message: Optional[str] = None
+    priority: int = 0
+    timestamp: Optional[datetime] = None  # when the report finished
+    windows: Optional[str] = None  # requested windows, None for the default ones
+    backfill: Optional[dict] = None  # {"start", "end", "step"} of a backfill job, None for a report
+    stage_timings: Optional[dict] = None  # {stage: {"seconds": ..., "rows"/"stores"/"bytes": ...}}
 
 
 class MenuHourRecord(BaseModel):
@@ -30,3 +38,83 @@ class WindowResult(BaseModel):
     downtime_hours_24h: float
     uptime_hours_7d: float
     downtime_hours_7d: float
+
+
+class UptimeResults:
+    """
+    Report rows as one array per column, ordered by store_id.
+
+    This is what the calculator returns: a handful of arrays instead of a
+    validated model per store. Columns are generated from the report
+    windows - every uptime column, then every downtime column, named
+    <uptime|downtime>_<minutes|hours>_<window label> - and are readable as
+    attributes (results.uptime_minutes_1h). Iterating yields WindowResults
+    for code that still wants rows, which needs the default 1h/24h/7d
+    windows.
+    """
+    __slots__ = ("store_ids", "columns")
+
+    def __init__(self, store_ids: np.ndarray, **columns: np.ndarray):
+        self.store_ids = np.asarray(store_ids, dtype=object)
+        self.columns: Dict[str, np.ndarray] = columns
+
+    @property
+    def fields(self) -> Tuple[str, ...]:
+        return tuple(self.columns)
+
+    def __getattr__(self, name: str) -> np.ndarray:
+        if name in UptimeResults.__slots__:  # not set yet, e.g. while unpickling
+            raise AttributeError(name)
+        try:
+            return self.columns[name]
+        except KeyError:
+            raise AttributeError(f"No report column '{name}'") from None
+
+    def __len__(self) -> int:
+        return len(self.store_ids)
+
+    def __iter__(self) -> Iterator[WindowResult]:
+        columns = [values.tolist() for values in self.columns.values()]
+        for store_id, *values in zip(self.store_ids, *columns):
+            yield WindowResult(store_id=store_id, **dict(zip(self.columns, values)))
+
+    def to_window_results(self) -> List[WindowResult]:
+        return list(self)
+
+    @classmethod
+    def from_window_results(cls, results: Iterable[WindowResult]) -> "UptimeResults":
+        rows = sorted(results, key=lambda result: result.store_id)
+        fields = [f for f in WindowResult.model_fields if f.startswith("uptime_")]
+        fields += [f for f in WindowResult.model_fields if f.startswith("downtime_")]
+        return cls(
+            np.array([row.store_id for row in rows], dtype=object),
+            **{
+                field: np.array([getattr(row, field) for row in rows], dtype=np.int64 if "_minutes_" in field else np.float64)
+                for field in fields
+            },
+        )
+
+
+class StoreUptimeResponse(WindowResult):
+    current_time: datetime  # newest observation of any store, as in reports
+    cached: bool
+    latency_ms: float
+
+
+class Outage(BaseModel):
+    store_id: str
+    start_utc: datetime  # first inactive observation
+    end_utc: datetime  # last inactive observation before an active one (or the end of the UTC week)
+    observations: int
+
+
+class OutagesResponse(BaseModel):
+    outages: List[Outage]  # ordered by store_id, then start_utc
+    truncated: bool  # more outages overlap the range than the limit
+
+
+class ObservationBatchResponse(BaseModel):
+    accepted: int  # valid observations buffered for writing
+    rejected: int  # invalid observations dropped
+    errors: List[dict]  # first rejected rows: {"row": index in the batch, "error": reason}
+    buffered: int  # observations of this process waiting to be written, including these
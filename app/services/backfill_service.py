@@ -0,0 +1,111 @@
+import os
+import shutil
+from datetime import datetime
+from pathlib import Path
+from typing import Optional
+
+import pandas as pd
+
+from app.services.calculator import UPTIME_ENGINE, WINDOWS, Windows, check_key_span, compute_uptime_series, parse_windows, to_epoch_micros
+from app.services.data_loader import get_current_time_from_db, load_all_data, load_store_ids
+from app.services.metrics import count_stage, report_stage
+
+# Where backfill datasets are written, one directory per backfill
+BACKFILL_DIR = Path("backfills")
+# Most steps (time points) one backfill may ask for; a year of hourly steps is 8760
+BACKFILL_MAX_STEPS = int(os.getenv("BACKFILL_MAX_STEPS", "10000"))
+
+
+def backfill_steps(
+    start: datetime, end: Optional[datetime] = None, step: str = "1h", windows: Windows = WINDOWS
+) -> pd.DatetimeIndex:
+    """
+    Times to compute uptime at: start, start + step, ... up to end inclusive.
+
+    Naive times are UTC; end defaults to the current time of the data. step is
+    a window label such as 15m, 1h or 1d. Raises ValueError for an empty or
+    reversed range, a bad step, more than BACKFILL_MAX_STEPS steps, or a
+    range (plus the widest window) too long for the fleet's store count to
+    be counted in one sweep (calculator.check_key_span).
+    """
+    (_, step_length), = parse_windows(step)
+    start = _utc(start)
+    end = _utc(end) if end is not None else get_current_time_from_db()
+    if end < start:
+        raise ValueError(f"Backfill end {end} is before its start {start}")
+    n_steps = (end - start) // step_length + 1
+    if n_steps > BACKFILL_MAX_STEPS:
+        raise ValueError(f"Backfill of {n_steps} steps exceeds BACKFILL_MAX_STEPS ({BACKFILL_MAX_STEPS})")
+    steps = pd.date_range(start, periods=n_steps, freq=step_length)
+
+    lo = to_epoch_micros(steps[0] - max(length for _, length in windows))
+    try:
+        check_key_span(len(load_store_ids()), lo, to_epoch_micros(steps[-1]))
+    except OverflowError as e:
+        raise ValueError(f"Backfill range is too long for one sweep, split it: {e}")
+    return steps
+
+
+def check_backfill_supported() -> None:
+    """Raise ValueError when backfills cannot run here: business_hours engine, or pyarrow missing."""
+    if UPTIME_ENGINE == "business_hours":
+        raise ValueError("Backfills only support the observation-counting uptime engines")
+    try:
+        import pyarrow.parquet  # noqa: F401
+    except ImportError as e:
+        raise ValueError(f"Backfills are written as Parquet and require pyarrow ({e})")
+
+
+def write_backfill(output_dir: Path, steps: pd.DatetimeIndex, windows: Windows = WINDOWS) -> int:
+    """
+    Write every store's uptime at each step as a Parquet dataset partitioned by day.
+
+    Rows are (store_id, as_of, <window columns>) with the same columns and
+    rounding as a report, under output_dir/date=YYYY-MM-DD/part-0.parquet.
+    The observations of the whole range are loaded and sorted once and the
+    steps are a sweep over them (calculator.compute_uptime_series). The
+    dataset is built next to output_dir and renamed into place, so readers
+    never see a partial one. Returns the number of rows written.
+    """
+    check_backfill_supported()
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    since = steps[0] - max(length for _, length in windows)
+    status_df, menu_hours, store_timezones = load_all_data(since=since.to_pydatetime())
+    known_stores = load_store_ids()
+
+    tmp_dir = output_dir.with_name(output_dir.name + ".tmp")
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+    rows = 0
+    try:
+        series = compute_uptime_series(status_df, menu_hours, store_timezones, steps, known_stores, windows)
+        while True:
+            with report_stage("compute"):
+                chunk = next(series, None)
+            if chunk is None:
+                break
+            day_steps, results = chunk
+            with report_stage("serialize"):
+                table = pa.table({
+                    "store_id": pa.array(results.store_ids.tolist(), type=pa.string()),
+                    "as_of": pa.array(day_steps.repeat(len(results) // len(day_steps))),
+                    **{field: pa.array(values) for field, values in results.columns.items()},
+                })
+            with report_stage("write"):
+                partition = tmp_dir / f"date={day_steps[0]:%Y-%m-%d}"
+                partition.mkdir(parents=True)
+                pq.write_table(table, partition / "part-0.parquet")
+            rows += len(results)
+        shutil.rmtree(output_dir, ignore_errors=True)
+        os.replace(tmp_dir, output_dir)
+    finally:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+    count_stage("compute", steps=len(steps))
+    count_stage("write", rows=rows)
+    return rows
+
+
+def _utc(value: datetime) -> pd.Timestamp:
+    ts = pd.Timestamp(value)
+    return ts.tz_localize("UTC") if ts.tzinfo is None else ts.tz_convert("UTC")
@@ -0,0 +1,399 @@
+import os
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from functools import lru_cache
+from pathlib import Path
+from typing import Dict, List, Tuple, Union
+
+import numpy as np
+import pandas as pd
+
+from app.models.schemas import MenuHourRecord
+
+# Stores without a timezone row are assumed to be in Chicago (same default as ingestion)
+DEFAULT_TIMEZONE = "America/Chicago"
+
+# Compiled interval sets kept between reports, keyed by schedule fingerprint and day range
+INTERVAL_CACHE_SIZE = 8
+_interval_cache: "OrderedDict[tuple, BusinessIntervals]" = OrderedDict()
+
+# Weekly schedules compiled from menu hours are saved here (one .npz per
+# distinct menu_hours + timezones content), so they are rebuilt only when
+# that content changes, even across restarts
+BUSINESS_HOURS_CACHE_DIR = Path(os.getenv("BUSINESS_HOURS_CACHE_DIR", "cache/business_hours"))
+_schedule_cache: "OrderedDict[int, WeeklySchedules]" = OrderedDict()
+# Guards both in-memory caches, which request threads, report workers and
+# the poller use concurrently
+_cache_lock = threading.Lock()
+
+# Local-to-UTC projection grids kept in memory, one per (timezone, local week)
+TZ_PROJECTION_CACHE_SIZE = 1024
+
+_MICROS_PER_DAY = 24 * 60 * 60 * 1_000_000
+_SECONDS_PER_DAY = 24 * 60 * 60
+_SECONDS_PER_WEEK = 7 * _SECONDS_PER_DAY
+# Projection grid resolution; UTC offsets almost always change on quarter hours
+_GRID_STEP = 15 * 60 * 1_000_000
+
+# Menu hours as pydantic records, or already as a menu_hours_frame (columnar loader)
+MenuHoursInput = Union[List[MenuHourRecord], pd.DataFrame]
+
+
+@dataclass
+class BusinessIntervals:
+    """
+    Sorted, non-overlapping UTC open intervals for every store with menu hours.
+
+    Times are epoch microseconds. The intervals of store_ids[i] are
+    opens[offsets[i]:offsets[i + 1]] / closes[offsets[i]:offsets[i + 1]].
+    Stores that are not listed have no menu hours and are open 24x7.
+    """
+    store_ids: np.ndarray
+    offsets: np.ndarray
+    opens: np.ndarray
+    closes: np.ndarray
+    start: int
+    end: int
+
+
+@dataclass
+class WeeklySchedules:
+    """
+    Menu hours compiled per store into sorted, disjoint local intervals in
+    seconds since Monday 00:00 local time, plus the store's timezone.
+
+    The intervals of store_ids[i] are starts[offsets[i]:offsets[i + 1]] /
+    ends[offsets[i]:offsets[i + 1]]; hours running past the end of Sunday
+    wrap around to Monday.
+    """
+    store_ids: np.ndarray
+    timezones: np.ndarray
+    offsets: np.ndarray
+    starts: np.ndarray
+    ends: np.ndarray
+    fingerprint: int  # hash of the menu hours and timezones compiled
+
+
+def menu_hours_frame(menu_hours: MenuHoursInput) -> pd.DataFrame:
+    """Menu hours as a frame with times converted to seconds since local midnight."""
+    if isinstance(menu_hours, pd.DataFrame):
+        return menu_hours
+
+    frame = pd.DataFrame(
+        [(h.store_id, h.day_of_week, h.start_time_local, h.end_time_local) for h in menu_hours],
+        columns=["store_id", "day_of_week", "start_time_local", "end_time_local"],
+    )
+    return pd.DataFrame({
+        "store_id": frame["store_id"].astype(object),
+        "day_of_week": frame["day_of_week"].astype(np.int64),
+        "start_seconds": _seconds_of_day(frame["start_time_local"]),
+        "end_seconds": _seconds_of_day(frame["end_time_local"]),
+    })
+
+
+def compile_business_intervals(
+    menu_hours: MenuHoursInput,
+    store_timezones: Dict[str, str],
+    start: int,
+    end: int
+) -> BusinessIntervals:
+    """
+    Compile menu hours into UTC open intervals covering [start, end] (epoch microseconds).
+
+    Each store's weekly schedule (see compile_weekly_schedules) is laid out
+    for every local week that can touch the range and projected to UTC
+    through a per-(timezone, week) grid, so DST changes inside the range are
+    handled by the timezone database once per timezone rather than per
+    store. Results are cached per whole UTC day range, so hourly reports over
+    the same week reuse them.
+    """
+    schedules = compile_weekly_schedules(menu_hours, store_timezones)
+
+    day_lo = start // _MICROS_PER_DAY
+    day_hi = end // _MICROS_PER_DAY + 1
+    key = (schedules.fingerprint, day_lo, day_hi)
+    with _cache_lock:
+        cached = _interval_cache.get(key)
+        if cached is not None:
+            _interval_cache.move_to_end(key)
+            return cached
+
+    intervals = _project(schedules, day_lo * _MICROS_PER_DAY, day_hi * _MICROS_PER_DAY)
+    with _cache_lock:
+        _interval_cache[key] = intervals
+        while len(_interval_cache) > INTERVAL_CACHE_SIZE:
+            _interval_cache.popitem(last=False)
+    return intervals
+
+
+def compile_weekly_schedules(menu_hours: MenuHoursInput, store_timezones: Dict[str, str]) -> WeeklySchedules:
+    """
+    Menu hours as per-store weekly local intervals, compiled once per content.
+
+    Lookups go memory first, then BUSINESS_HOURS_CACHE_DIR, keyed by a hash
+    of the menu hours and the timezones of the stores that have them, so a
+    change to either table (and nothing else) triggers a rebuild.
+    """
+    frame = menu_hours_frame(menu_hours)
+    timezones = frame["store_id"].astype(object).map(store_timezones).fillna(DEFAULT_TIMEZONE)
+    fingerprint = _fingerprint(frame, timezones)
+
+    with _cache_lock:
+        schedules = _schedule_cache.get(fingerprint)
+        if schedules is not None:
+            _schedule_cache.move_to_end(fingerprint)
+            return schedules
+
+    path = BUSINESS_HOURS_CACHE_DIR / f"schedules_{fingerprint:016x}.npz"
+    schedules = _read_schedules(path, fingerprint)
+    if schedules is None:
+        schedules = _compile_weekly(frame, timezones, fingerprint)
+        _write_schedules(path, schedules)
+
+    with _cache_lock:
+        _schedule_cache[fingerprint] = schedules
+        while len(_schedule_cache) > INTERVAL_CACHE_SIZE:
+            _schedule_cache.popitem(last=False)
+    return schedules
+
+
+def open_mask(
+    open_intervals: Tuple[np.ndarray, np.ndarray, np.ndarray],
+    codes: np.ndarray,
+    timestamps: np.ndarray,
+    start: int,
+    end: int
+) -> np.ndarray:
+    """
+    Whether each observation (store code, epoch microseconds) falls inside
+    its store's open hours, for open_intervals from store_intervals over
+    [start, end]. One searchsorted on a composite (store, time) key, however
+    many observations there are.
+    """
+    interval_codes, opens, closes = open_intervals
+    in_range = (timestamps >= start) & (timestamps <= end)
+    if len(interval_codes) == 0:
+        return np.zeros(len(codes), dtype=bool)
+
+    span = end - start + 1
+    keys = interval_codes * span + (opens - start)
+    k = np.searchsorted(keys, codes * span + (np.clip(timestamps, start, end) - start), side="right") - 1
+    kc = np.maximum(k, 0)
+    return in_range & (k >= 0) & (interval_codes[kc] == codes) & (timestamps < closes[kc])
+
+
+def store_intervals(
+    intervals: BusinessIntervals,
+    store_ids: np.ndarray,
+    start: int,
+    end: int
+) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Expand compiled intervals onto report store codes, clipped to [start, end].
+
+    Returns (codes, opens, closes) sorted by code then open time, where codes
+    index into store_ids. Stores without menu hours get the whole range.
+    """
+    n_stores = len(store_ids)
+    if len(intervals.store_ids):
+        positions = np.minimum(np.searchsorted(intervals.store_ids, store_ids), len(intervals.store_ids) - 1)
+        has_schedule = intervals.store_ids[positions] == store_ids
+    else:
+        positions = np.zeros(n_stores, dtype=np.int64)
+        has_schedule = np.zeros(n_stores, dtype=bool)
+
+    if not has_schedule.any():
+        full = np.arange(n_stores, dtype=np.int64)
+        return full, np.full(n_stores, start, dtype=np.int64), np.full(n_stores, end, dtype=np.int64)
+
+    # Scheduled stores take their compiled slice, the rest one interval covering the whole range
+    counts = np.where(has_schedule, intervals.offsets[positions + 1] - intervals.offsets[positions], 1)
+    codes = np.repeat(np.arange(n_stores, dtype=np.int64), counts)
+    firsts = np.cumsum(counts) - counts
+    source = np.repeat(intervals.offsets[positions] - firsts, counts) + np.arange(len(codes), dtype=np.int64)
+
+    scheduled = np.repeat(has_schedule, counts)
+    source = np.where(scheduled, source, 0)
+    opens = np.where(scheduled, intervals.opens[source], start)
+    closes = np.where(scheduled, intervals.closes[source], end)
+
+    opens = np.clip(opens, start, end)
+    closes = np.clip(closes, start, end)
+    keep = closes > opens
+    return codes[keep], opens[keep], closes[keep]
+
+
+def _compile_weekly(frame: pd.DataFrame, timezones: pd.Series, fingerprint: int) -> WeeklySchedules:
+    day_starts = frame["day_of_week"].to_numpy(dtype=np.int64) * _SECONDS_PER_DAY
+    start_seconds = frame["start_seconds"].to_numpy(dtype=np.int64)
+    end_seconds = frame["end_seconds"].to_numpy(dtype=np.int64)
+    # Hours that end at or before they start run past midnight
+    end_seconds = np.where(end_seconds <= start_seconds, end_seconds + _SECONDS_PER_DAY, end_seconds)
+    starts = day_starts + start_seconds
+    ends = day_starts + end_seconds
+    store_ids = frame["store_id"].to_numpy(dtype=object)
+
+    # Sunday hours past midnight continue on Monday at the start of the week
+    wraps = ends > _SECONDS_PER_WEEK
+    store_ids = np.concatenate([store_ids, store_ids[wraps]])
+    starts = np.concatenate([starts, np.zeros(wraps.sum(), dtype=np.int64)])
+    ends = np.concatenate([np.minimum(ends, _SECONDS_PER_WEEK), ends[wraps] - _SECONDS_PER_WEEK])
+
+    merged = _merge_intervals(store_ids, starts, ends, 0, _SECONDS_PER_WEEK)
+    store_timezones = dict(zip(frame["store_id"].to_numpy(dtype=object), timezones.to_numpy(dtype=object)))
+    return WeeklySchedules(
+        store_ids=merged.store_ids,
+        timezones=np.array([store_timezones[store_id] for store_id in merged.store_ids], dtype=object),
+        offsets=merged.offsets,
+        starts=merged.opens,
+        ends=merged.closes,
+        fingerprint=fingerprint,
+    )
+
+
+def _project(schedules: WeeklySchedules, range_start: int, range_end: int) -> BusinessIntervals:
+    """Lay weekly schedules out on the local weeks around a UTC range and convert them to UTC."""
+    # Local dates that can overlap the UTC range, padded a day each side for UTC offsets
+    first_day = range_start // _MICROS_PER_DAY - 1
+    last_day = range_end // _MICROS_PER_DAY + 1
+    first_monday = first_day - (first_day + 3) % 7  # 1970-01-01 was a Thursday
+    week_days = np.arange(first_monday, last_day + 1, 7, dtype=np.int64)
+
+    interval_stores = np.repeat(np.arange(len(schedules.store_ids)), np.diff(schedules.offsets))
+    interval_timezones = schedules.timezones[interval_stores]
+
+    codes, opens, closes = [], [], []
+    for tz_name in np.unique(schedules.timezones):
+        in_tz = interval_timezones == tz_name
+        for week_day in week_days.tolist():
+            week_start = week_day * _MICROS_PER_DAY
+            grid = _projection_grid(tz_name, week_day)
+            codes.append(interval_stores[in_tz])
+            opens.append(_to_utc(week_start + schedules.starts[in_tz] * 1_000_000, week_start, grid, tz_name))
+            closes.append(_to_utc(week_start + schedules.ends[in_tz] * 1_000_000, week_start, grid, tz_name))
+
+    if not codes:
+        return _merge_intervals(np.zeros(0, dtype=object), np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64), range_start, range_end)
+    store_ids = schedules.store_ids[np.concatenate(codes)]
+    return _merge_intervals(store_ids, np.concatenate(opens), np.concatenate(closes), range_start, range_end)
+
+
+@lru_cache(maxsize=TZ_PROJECTION_CACHE_SIZE)
+def _projection_grid(tz_name: str, week_day: int) -> np.ndarray:
+    """
+    UTC epoch microseconds of every quarter hour of one local week in tz_name
+    (plus a day of slack), localized once with the DST rules below and shared
+    by every store in that timezone.
+    """
+    points = week_day * _MICROS_PER_DAY + np.arange(0, 8 * _MICROS_PER_DAY + _GRID_STEP, _GRID_STEP, dtype=np.int64)
+    return _localize(points, tz_name)
+
+
+def _to_utc(local_micros: np.ndarray, grid_start: int, grid: np.ndarray, tz_name: str) -> np.ndarray:
+    """
+    Convert local times with a projection grid. Within a quarter hour whose
+    ends are a quarter hour apart in UTC the offset is constant; the few
+    times in a quarter hour containing a DST transition are localized
+    directly, so results always equal _localize.
+    """
+    cells = (local_micros - grid_start) // _GRID_STEP
+    utc = grid[cells] + (local_micros - grid_start - cells * _GRID_STEP)
+    irregular = grid[cells + 1] - grid[cells] != _GRID_STEP
+    if irregular.any():
+        utc[irregular] = _localize(local_micros[irregular], tz_name)
+    return utc
+
+
+def _merge_intervals(store_ids: np.ndarray, opens: np.ndarray, closes: np.ndarray, start: int, end: int) -> BusinessIntervals:
+    """Merge overlapping intervals per store into sorted disjoint ones."""
+    unique_ids, codes = np.unique(store_ids.astype(str), return_inverse=True)
+
+    opens = np.clip(opens, start, end)
+    closes = np.clip(closes, start, end)
+    keep = closes > opens
+    codes, opens, closes = codes[keep], opens[keep], closes[keep]
+
+    order = np.lexsort((opens, codes))
+    codes, opens, closes = codes[order], opens[order], closes[order]
+
+    # An interval starts a new run unless it begins before the furthest close seen so far in its store
+    reach = pd.Series(closes).groupby(codes).cummax().to_numpy()
+    starts_run = np.ones(len(codes), dtype=bool)
+    if len(codes):
+        starts_run[1:] = (codes[1:] != codes[:-1]) | (opens[1:] > reach[:-1])
+    run_starts = np.flatnonzero(starts_run)
+
+    merged_codes = codes[run_starts]
+    merged_opens = opens[run_starts]
+    merged_closes = np.maximum.reduceat(closes, run_starts) if len(run_starts) else closes
+
+    offsets = np.searchsorted(merged_codes, np.arange(len(unique_ids) + 1))
+    return BusinessIntervals(
+        store_ids=unique_ids.astype(object),
+        offsets=offsets.astype(np.int64),
+        opens=merged_opens,
+        closes=merged_closes,
+        start=start,
+        end=end,
+    )
+
+
+def _localize(local_micros: np.ndarray, tz_name: str) -> np.ndarray:
+    """Interpret naive local times in tz_name and return UTC epoch microseconds."""
+    local = pd.DatetimeIndex(local_micros.astype("datetime64[us]"))
+    localized = local.tz_localize(
+        tz_name,
+        ambiguous=np.ones(len(local), dtype=bool),  # repeated hour: take the first (DST) occurrence
+        nonexistent="shift_forward",  # skipped hour: open from the end of the gap
+    )
+    return localized.tz_convert("UTC").tz_localize(None).to_numpy(dtype="datetime64[us]").view(np.int64)
+
+
+def _seconds_of_day(times: pd.Series) -> np.ndarray:
+    if len(times) == 0:
+        return np.zeros(0, dtype=np.int64)
+    parts = times.astype(str).str.split(":", expand=True).astype(np.int64)
+    seconds = parts[0] * 3600 + parts[1] * 60
+    if parts.shape[1] > 2:
+        seconds += parts[2]
+    return seconds.to_numpy(dtype=np.int64)
+
+
+def _read_schedules(path: Path, fingerprint: int):
+    try:
+        with np.load(path, allow_pickle=False) as data:
+            return WeeklySchedules(
+                store_ids=data["store_ids"].astype(object),
+                timezones=data["timezones"].astype(object),
+                offsets=data["offsets"],
+                starts=data["starts"],
+                ends=data["ends"],
+                fingerprint=fingerprint,
+            )
+    except (OSError, KeyError, ValueError):
+        return None
+
+
+def _write_schedules(path: Path, schedules: WeeklySchedules) -> None:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    # Per thread too: two threads may compile the same schedules at once
+    tmp_path = path.with_name(f"tmp_{os.getpid()}_{threading.get_ident()}_{path.name}")
+    np.savez(
+        tmp_path,
+        store_ids=schedules.store_ids.astype(str),
+        timezones=schedules.timezones.astype(str),
+        offsets=schedules.offsets,
+        starts=schedules.starts,
+        ends=schedules.ends,
+    )
+    os.replace(tmp_path, path)
+
+    # Keep only the most recent compiled versions
+    for stale in sorted(path.parent.glob("schedules_*.npz"), key=lambda p: p.stat().st_mtime)[:-INTERVAL_CACHE_SIZE]:
+        stale.unlink(missing_ok=True)
+
+
+def _fingerprint(frame: pd.DataFrame, timezones: pd.Series) -> int:
+    keyed = frame.assign(timezone=timezones.to_numpy())
+    return int(pd.util.hash_pandas_object(keyed, index=False).sum())
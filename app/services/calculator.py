@@ -1,29 +1,122 @@
+import os
+import re
 from datetime import datetime, timedelta
-from typing import Dict, List
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Tuple
 
+import numpy as np
 import pandas as pd
 
-from app.models.schemas import MenuHourRecord, WindowResult
+from app.models.schemas import UptimeResults, WindowResult
+from app.services.business_hours import MenuHoursInput, compile_business_intervals, store_intervals
+
+# Which implementation compute_store_uptime uses: "vectorized" (default) or the
+# original per-store "legacy" loop, kept around so the two can be compared.
+# "business_hours" switches to time-weighted uptime within each store's menu hours.
+UPTIME_ENGINE = os.getenv("UPTIME_ENGINE", "vectorized")
+UPTIME_ENGINES = ("legacy", "vectorized", "business_hours")
+
+# Report windows as (label, length), all ending at current_time
+Windows = Tuple[Tuple[str, timedelta], ...]
+WINDOWS: Windows = (
+    ("1h", timedelta(hours=1)),
+    ("24h", timedelta(days=1)),
+    ("7d", timedelta(weeks=1)),
+)
+
+# Longest window a report may ask for. Bounds how much history a report
+# loads and keeps the composite (store, time) key of window_counts in int64.
+REPORT_MAX_WINDOW_DAYS = int(os.getenv("REPORT_MAX_WINDOW_DAYS", "90"))
+
+_MICROS_PER_MINUTE = 60 * 1_000_000
+_WINDOW_LABEL = re.compile(r"(\d+)([mhdw])")
+_WINDOW_UNITS = {"m": "minutes", "h": "hours", "d": "days", "w": "weeks"}
+# Windows up to this long are reported in whole minutes, longer ones in hours
+_MINUTES_WINDOW_LIMIT = timedelta(hours=1)
+
+
+def parse_windows(spec: str, check_limit: bool = True) -> Windows:
+    """
+    Parse a comma separated window list such as "15m,6h,30d".
+
+    Each window is a whole number of minutes (m), hours (h), days (d) or weeks
+    (w). Windows are returned shortest first; two labels for the same length
+    (e.g. "24h,1d") are rejected since they would produce the same numbers
+    twice. Raises ValueError for anything else. check_limit=False skips the
+    REPORT_MAX_WINDOW_DAYS request limit, for windows accepted earlier.
+    """
+    windows = {}
+    for label in (part.strip().lower() for part in spec.split(",")):
+        match = _WINDOW_LABEL.fullmatch(label)
+        if not match or int(match.group(1)) == 0:
+            raise ValueError(f"Invalid window '{label}', expected a positive whole number of m, h, d or w (e.g. 15m, 6h, 30d)")
+        label = f"{int(match.group(1))}{match.group(2)}"
+        length = timedelta(**{_WINDOW_UNITS[match.group(2)]: int(match.group(1))})
+        if check_limit and length > timedelta(days=REPORT_MAX_WINDOW_DAYS):
+            raise ValueError(f"Window '{label}' is longer than REPORT_MAX_WINDOW_DAYS ({REPORT_MAX_WINDOW_DAYS} days)")
+        if length in windows:
+            raise ValueError(f"Windows '{windows[length]}' and '{label}' have the same length")
+        windows[length] = label
+    return tuple((label, length) for length, label in sorted(windows.items()))
+
+
+def format_windows(windows: Windows) -> str:
+    """The window list in the form parse_windows accepts."""
+    return ",".join(label for label, _ in windows)
+
+
+def window_fields(windows: Windows) -> List[str]:
+    """
+    Result column names for a window set: every uptime column, then every
+    downtime column, e.g. uptime_minutes_15m, uptime_hours_30d, ...
+    """
+    units = ["minutes" if length <= _MINUTES_WINDOW_LIMIT else "hours" for _, length in windows]
+    return [f"{kind}_{unit}_{label}" for kind in ("uptime", "downtime") for (label, _), unit in zip(windows, units)]
 
 
 def compute_store_uptime(
     status_df: pd.DataFrame,
-    menu_hours: List[MenuHourRecord], 
+    menu_hours: MenuHoursInput,
     store_timezones: Dict[str, str],  # UUID string -> timezone
-    current_time: datetime
-) -> List[WindowResult]:
+    current_time: datetime,
+    engine: Optional[str] = None,
+    known_stores: Iterable[str] = (),
+    windows: Optional[Windows] = None,
+) -> UptimeResults:
     """
     Calculate uptime/downtime for each store using simple observation counting.
     This is much simpler than complex interpolation - just count how many
     observations were 'active' vs 'inactive' in each time window and estimate
     uptime as a proportion.
+
+    known_stores adds stores to the report that have no rows in the inputs,
+    e.g. stores whose observations are all older than the loaded window.
+    windows defaults to WINDOWS; the legacy engine only supports those.
     """
+    engine = engine or UPTIME_ENGINE
+    known_stores = set(known_stores)
+    windows = windows or WINDOWS
+    if engine == "legacy":
+        if windows != WINDOWS:
+            raise ValueError("The legacy engine only computes the default 1h/24h/7d windows")
+        return UptimeResults.from_window_results(
+            _compute_store_uptime_legacy(status_df, menu_hours, store_timezones, current_time, known_stores)
+        )
+    if engine == "vectorized":
+        return _compute_store_uptime_vectorized(status_df, menu_hours, store_timezones, current_time, known_stores, windows)
+    if engine == "business_hours":
+        return _compute_store_uptime_business_hours(status_df, menu_hours, store_timezones, current_time, known_stores, windows)
+    raise ValueError(f"Unknown uptime engine '{engine}', expected one of {UPTIME_ENGINES}")
     
-    # Get all unique stores from all data sources
-    status_stores = set(status_df['store_id'].unique()) if len(status_df) > 0 else set()
-    hours_stores = {h.store_id for h in menu_hours}
-    tz_stores = set(store_timezones.keys())
-    all_stores = status_stores | hours_stores | tz_stores
+
+def _compute_store_uptime_legacy(
+    status_df: pd.DataFrame,
+    menu_hours: MenuHoursInput,
+    store_timezones: Dict[str, str],
+    current_time: datetime,
+    known_stores: set = frozenset()
+) -> List[WindowResult]:
+    """Original implementation: one filtered copy of status_df per store."""
+    all_stores = _all_store_ids(status_df, menu_hours, store_timezones) | known_stores
     
     results = []
     
@@ -66,6 +159,360 @@ def compute_store_uptime(
     return results
 
 
+def _compute_store_uptime_vectorized(
+    status_df: pd.DataFrame,
+    menu_hours: MenuHoursInput,
+    store_timezones: Dict[str, str],
+    current_time: datetime,
+    known_stores: set = frozenset(),
+    windows: Windows = WINDOWS
+) -> UptimeResults:
+    """
+    Same counting rules as the legacy engine, but every store is handled in a
+    single sort of the observations instead of one scan per store.
+    """
+    store_ids = np.array(sorted(_all_store_ids(status_df, menu_hours, store_timezones) | known_stores), dtype=object)
+    counts = _window_counts_from_frame(status_df, store_ids, current_time, windows)
+    return compute_uptime_from_counts(store_ids, counts, windows)
+
+
+def _compute_store_uptime_business_hours(
+    status_df: pd.DataFrame,
+    menu_hours: MenuHoursInput,
+    store_timezones: Dict[str, str],
+    current_time: datetime,
+    known_stores: set = frozenset(),
+    windows: Windows = WINDOWS
+) -> UptimeResults:
+    """
+    Time-weighted uptime restricted to each store's business hours.
+
+    Each observation's status is assumed to hold until halfway to the store's
+    neighbouring observations (the first and last ones extend to the edges of
+    the week). Uptime is the overlap of the active stretches with the store's
+    open hours; downtime is the rest of the open hours in the window.
+    """
+    store_ids = np.array(sorted(_all_store_ids(status_df, menu_hours, store_timezones) | known_stores), dtype=object)
+    codes, timestamps, active = _encode_observations(status_df, store_ids)
+    return _business_hours_results(store_ids, codes, timestamps, active, menu_hours, store_timezones, current_time, windows)
+
+
+def compute_uptime_from_runs(
+    runs: pd.DataFrame,
+    menu_hours: MenuHoursInput,
+    store_timezones: Dict[str, str],
+    current_time: datetime,
+    known_stores: Iterable[str] = (),
+    windows: Optional[Windows] = None
+) -> UptimeResults:
+    """
+    The business_hours engine's results computed from status runs (store_id,
+    start_utc, end_utc, active) instead of raw observations.
+
+    Inside a run every midpoint between neighbouring observations separates
+    two stretches of the same status, so only each run's first and last
+    observations matter. Every run becomes those two observations, clipped
+    to the widest window, and the result is exactly the raw engine's. A run
+    covering the whole widest window has to be left out when the store has
+    no observation inside the window (the raw engine sees nothing there).
+    """
+    windows = windows or WINDOWS
+    store_ids = np.array(sorted(_all_store_ids(runs, menu_hours, store_timezones) | set(known_stores)), dtype=object)
+    end = to_epoch_micros(current_time)
+    lo = end - max(_micros(length) for _, length in windows)
+
+    codes = pd.Categorical(runs["store_id"], categories=store_ids).codes.astype(np.int64)
+    firsts = np.clip(to_epoch_micros(runs["start_utc"]), lo, end) if len(runs) else np.zeros(0, dtype=np.int64)
+    lasts = np.clip(to_epoch_micros(runs["end_utc"]), lo, end) if len(runs) else np.zeros(0, dtype=np.int64)
+    active = runs["active"].to_numpy(dtype=bool)
+    return _business_hours_results(
+        store_ids, np.concatenate((codes, codes)), np.concatenate((firsts, lasts)), np.concatenate((active, active)),
+        menu_hours, store_timezones, current_time, windows,
+    )
+
+
+def _business_hours_results(
+    store_ids: np.ndarray,
+    codes: np.ndarray,
+    timestamps: np.ndarray,
+    active: np.ndarray,
+    menu_hours: MenuHoursInput,
+    store_timezones: Dict[str, str],
+    current_time: datetime,
+    windows: Windows
+) -> UptimeResults:
+    end = to_epoch_micros(current_time)
+    lo = end - max(_micros(length) for _, length in windows)
+    intervals = compile_business_intervals(menu_hours, store_timezones, lo, end)
+    open_intervals = store_intervals(intervals, store_ids, lo, end)
+
+    minutes = business_window_minutes(
+        codes, timestamps, active, n_stores=len(store_ids), open_intervals=open_intervals,
+        current_time=current_time, windows=windows,
+    )
+    return _build_results(store_ids, minutes, windows)
+
+
+def business_window_minutes(
+    codes: np.ndarray,
+    timestamps: np.ndarray,
+    active: np.ndarray,
+    n_stores: int,
+    open_intervals: Tuple[np.ndarray, np.ndarray, np.ndarray],
+    current_time: datetime,
+    windows: Windows = WINDOWS
+) -> Dict[str, Tuple[np.ndarray, np.ndarray]]:
+    """
+    Business-hours uptime and downtime minutes per store for every window.
+
+    open_intervals is (codes, opens, closes) as returned by store_intervals.
+    Observations and open intervals of all stores are laid out on one
+    composite (store, time) axis, where "open time before t" becomes a
+    single searchsorted into the cumulative interval lengths. Intersecting
+    every status stretch with the open hours is then a difference of two
+    lookups, with no per-store or per-observation Python loop.
+    """
+    end = to_epoch_micros(current_time)
+    lo = end - max(_micros(length) for _, length in windows)
+    span = end - lo + 1
+    if n_stores * span >= np.iinfo(np.int64).max:
+        raise OverflowError("Too many stores for the composite (store, time) key")
+    store_base = np.arange(n_stores, dtype=np.int64) * span
+
+    # Open hours on the composite axis, with running totals of open time
+    interval_codes, opens, closes = open_intervals
+    open_keys = interval_codes * span + (opens - lo)
+    lengths = closes - opens
+    cum_lengths = np.concatenate(([0], np.cumsum(lengths)))
+
+    def open_time_before(keys: np.ndarray) -> np.ndarray:
+        if len(open_keys) == 0:
+            return np.zeros(len(keys), dtype=np.int64)
+        k = np.searchsorted(open_keys, keys, side="right") - 1
+        kc = np.maximum(k, 0)
+        return np.where(k >= 0, cum_lengths[kc] + np.minimum(keys - open_keys[kc], lengths[kc]), 0)
+
+    # Observations in the widest window, sorted per store
+    in_range = (timestamps >= lo) & (timestamps <= end)
+    codes = codes[in_range]
+    offsets = timestamps[in_range] - lo
+    active = active[in_range]
+    order = np.lexsort((offsets, codes))
+    codes, offsets, active = codes[order], offsets[order], active[order]
+
+    # Each observation holds from the midpoint with its predecessor to the midpoint with its successor
+    same_prev = np.zeros(len(codes), dtype=bool)
+    same_prev[1:] = codes[1:] == codes[:-1]
+    same_next = np.zeros(len(codes), dtype=bool)
+    same_next[:-1] = same_prev[1:]
+    midpoints = (offsets[:-1] + offsets[1:]) // 2
+    seg_starts = np.zeros(len(codes), dtype=np.int64)
+    seg_starts[1:] = np.where(same_prev[1:], midpoints, 0)
+    seg_ends = np.full(len(codes), end - lo, dtype=np.int64)
+    seg_ends[:-1] = np.where(same_next[:-1], midpoints, end - lo)
+
+    minutes = {}
+    for label, length in windows:
+        window_start = end - _micros(length) - lo
+        starts = np.minimum(np.maximum(seg_starts, window_start), seg_ends)
+        covered = open_time_before(codes * span + seg_ends) - open_time_before(codes * span + starts)
+        uptime = np.bincount(codes, weights=np.where(active, covered, 0), minlength=n_stores)
+        open_total = open_time_before(store_base + (end - lo)) - open_time_before(store_base + window_start)
+
+        uptime_minutes = uptime / _MICROS_PER_MINUTE
+        minutes[label] = (uptime_minutes, open_total / _MICROS_PER_MINUTE - uptime_minutes)
+    return minutes
+
+
+def compute_uptime_from_counts(
+    store_ids: List[str],
+    counts: Dict[str, Tuple[np.ndarray, np.ndarray]],
+    windows: Windows = WINDOWS
+) -> UptimeResults:
+    """Apply the counting rule to per-window counts computed elsewhere (e.g. in the database)."""
+    minutes = {
+        label: _counts_to_minutes(*counts[label], _minutes(length))
+        for label, length in windows
+    }
+    return _build_results(store_ids, minutes, windows)
+
+
+def _window_counts_from_frame(
+    status_df: pd.DataFrame,
+    store_ids: np.ndarray,
+    current_time: datetime,
+    windows: Windows = WINDOWS
+) -> Dict[str, Tuple[np.ndarray, np.ndarray]]:
+    """Encode status_df against the sorted store_ids and count every window."""
+    codes, timestamps, active = _encode_observations(status_df, store_ids)
+    return window_counts(codes, timestamps, active, len(store_ids), current_time, windows)
+
+
+def _encode_observations(status_df: pd.DataFrame, store_ids: np.ndarray) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """status_df as (store codes into store_ids, epoch microseconds, active flags)."""
+    if len(status_df) == 0:
+        return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64), np.zeros(0, dtype=bool)
+
+    codes = pd.Categorical(status_df['store_id'], categories=store_ids).codes.astype(np.int64)
+    timestamps = to_epoch_micros(status_df['timestamp_utc'])
+    active = _active_mask(status_df['status'])
+    return codes, timestamps, active
+
+
+def window_counts(
+    codes: np.ndarray,
+    timestamps: np.ndarray,
+    active: np.ndarray,
+    n_stores: int,
+    current_time: datetime,
+    windows: Windows = WINDOWS
+) -> Dict[str, Tuple[np.ndarray, np.ndarray]]:
+    """
+    Count active and total observations per store for every window.
+
+    codes are store indexes in [0, n_stores), timestamps are epoch microseconds
+    and active is a boolean array. Rows are sorted once on a composite
+    (store, time) key; each window boundary is then a searchsorted per store
+    and the counts fall out of a cumulative sum (see _sliding_window_counter).
+
+    Returns {label: (active_counts, total_counts)} with one entry per store.
+    """
+    end = to_epoch_micros(current_time)
+    lo = end - max(_micros(length) for _, length in windows)
+    count = _sliding_window_counter(codes, timestamps, active, n_stores, lo, end)
+    return {label: (active_counts[0], total_counts[0]) for label, (active_counts, total_counts) in count(np.array([end]), windows).items()}
+
+
+def compute_uptime_series(
+    status_df: pd.DataFrame,
+    menu_hours: MenuHoursInput,
+    store_timezones: Dict[str, str],
+    steps: pd.DatetimeIndex,
+    known_stores: Iterable[str] = (),
+    windows: Windows = WINDOWS
+) -> Iterator[Tuple[pd.DatetimeIndex, UptimeResults]]:
+    """
+    Counting-rule uptime of every store as of each time in steps (ascending, UTC), for backfills.
+
+    The observations are sorted once for the whole range and every step is a
+    lookup into the same cumulative counts, so a range costs one sort plus
+    O(steps * stores * log(rows)) rather than a recompute per step. Results
+    are yielded per UTC day of steps, rows ordered by step then store_id,
+    which keeps memory bounded however long the range is.
+    """
+    if len(steps) == 0:
+        return
+    store_ids = np.array(sorted(_all_store_ids(status_df, menu_hours, store_timezones) | set(known_stores)), dtype=object)
+    codes, timestamps, active = _encode_observations(status_df, store_ids)
+
+    ends = to_epoch_micros(pd.Series(steps))
+    lo = int(ends[0]) - max(_micros(length) for _, length in windows)
+    count = _sliding_window_counter(codes, timestamps, active, len(store_ids), lo, int(ends[-1]))
+
+    _, day_starts = np.unique(steps.floor("D"), return_index=True)
+    for first, last in zip(day_starts, np.append(day_starts[1:], len(steps))):
+        counts = {
+            label: (active_counts.ravel(), total_counts.ravel())
+            for label, (active_counts, total_counts) in count(ends[first:last], windows).items()
+        }
+        yield steps[first:last], compute_uptime_from_counts(np.tile(store_ids, last - first), counts, windows)
+
+
+def _sliding_window_counter(
+    codes: np.ndarray,
+    timestamps: np.ndarray,
+    active: np.ndarray,
+    n_stores: int,
+    lo: int,
+    hi: int
+) -> Callable[[np.ndarray, Windows], Dict[str, Tuple[np.ndarray, np.ndarray]]]:
+    """
+    Sort the observations between lo and hi (epoch microseconds, inclusive)
+    once on a composite (store, time) key and return count(ends, windows).
+
+    count gives active and total observations per store for every window
+    ending at each of ends, as {label: (active_counts, total_counts)} of
+    shape (len(ends), n_stores). Each window boundary is a searchsorted per
+    store and the counts fall out of a cumulative sum, so a window costs
+    O(stores * log(rows)) instead of another pass over the data.
+    """
+    # Windows are inclusive at both ends
+    in_range = (timestamps >= lo) & (timestamps <= hi)
+    codes = codes[in_range]
+    offsets = timestamps[in_range] - lo
+    active = active[in_range]
+
+    span = check_key_span(n_stores, lo, hi)
+    keys = codes.astype(np.int64, copy=False) * span + offsets
+    order = np.argsort(keys, kind="stable")
+    keys = keys[order]
+    cum_active = np.concatenate(([0], np.cumsum(active[order], dtype=np.int64)))
+    store_base = np.arange(n_stores, dtype=np.int64) * span
+
+    def count(ends: np.ndarray, windows: Windows) -> Dict[str, Tuple[np.ndarray, np.ndarray]]:
+        ends = np.asarray(ends, dtype=np.int64)[:, None] - lo
+        right = np.searchsorted(keys, store_base + ends, side="right")
+        counts = {}
+        for label, length in windows:
+            left = np.searchsorted(keys, store_base + (ends - _micros(length)), side="left")
+            counts[label] = (cum_active[right] - cum_active[left], right - left)
+        return counts
+
+    return count
+
+
+def check_key_span(n_stores: int, lo: int, hi: int) -> int:
+    """
+    Width of the time part of _sliding_window_counter's composite key over
+    [lo, hi]. Raises OverflowError when n_stores such spans do not fit in
+    int64 (computed with Python ints, which cannot wrap).
+    """
+    span = int(hi) - int(lo) + 1
+    if int(n_stores) * span >= np.iinfo(np.int64).max:
+        raise OverflowError(f"Too many stores ({n_stores:,}) over {pd.Timedelta(microseconds=span)} for the composite (store, time) key")
+    return span
+
+
+def _counts_to_minutes(active: np.ndarray, total: np.ndarray, total_minutes: int) -> Tuple[np.ndarray, np.ndarray]:
+    """The counting rule of _calculate_window_uptime, applied to arrays of counts."""
+    with np.errstate(invalid="ignore", divide="ignore"):
+        uptime_minutes = active / total * total_minutes
+    # No observations in window = assume inactive (conservative estimate)
+    uptime_minutes = np.where(total == 0, 0.0, uptime_minutes)
+    return uptime_minutes, total_minutes - uptime_minutes
+
+
+def _build_results(store_ids: np.ndarray, minutes: Dict[str, Tuple[np.ndarray, np.ndarray]], windows: Windows) -> UptimeResults:
+    """
+    Round per-window minutes the way the legacy engine does, as the result
+    columns named by window_fields: truncated whole minutes for short
+    windows, hours to 2 decimals for the rest.
+    """
+    columns = {}
+    for field in window_fields(windows):
+        kind, unit, label = field.split("_", 2)
+        values = minutes[label][0 if kind == "uptime" else 1]
+        columns[field] = np.trunc(values).astype(np.int64) if unit == "minutes" else _round_hours(values)
+    return UptimeResults(store_ids, **columns)
+
+
+def _round_hours(minutes: np.ndarray) -> np.ndarray:
+    """
+    round(m / 60, 2) for every element, with exactly the result of Python's
+    round(). np.round works on the float product m / 60 * 100, which can land
+    on the other side of a half-cent than the exact value; only elements
+    within float error of a half-cent can differ, and those few go through
+    Python's round().
+    """
+    hours = np.asarray(minutes, dtype=np.float64) / 60
+    scaled = hours * 100
+    rounded = np.rint(scaled) / 100
+    near_half = np.abs(scaled - np.floor(scaled) - 0.5) < 1e-6
+    if near_half.any():
+        rounded[near_half] = [round(value, 2) for value in hours[near_half].tolist()]
+    return rounded
+
+
 def _calculate_window_uptime(store_data: pd.DataFrame, start_time: datetime, end_time: datetime, total_minutes: int):
     """
     Simple uptime calculation: count active vs inactive observations in the window.
@@ -82,7 +529,7 @@ def _calculate_window_uptime(store_data: pd.DataFrame, start_time: datetime, end
         return 0, total_minutes
     
     # Count active vs inactive observations
-    active_count = len(window_data[window_data['status'] == 'active'])
+    active_count = int(_active_mask(window_data['status']).sum())
     total_count = len(window_data)
     
     # Estimate uptime as proportion
@@ -93,9 +540,41 @@ def _calculate_window_uptime(store_data: pd.DataFrame, start_time: datetime, end
     return uptime_minutes, downtime_minutes
 
 
-# TODO: For production, add business hours filtering
-# def _filter_to_business_hours(store_data, menu_hours, timezone):
-#     """Filter observations to only include business hours"""
-#     # This would convert business hours to UTC and filter data
-#     # For now, we include all hours (24x7 assumption)
-#     return store_data
+def _all_store_ids(status_df: pd.DataFrame, menu_hours: MenuHoursInput, store_timezones: Dict[str, str]) -> set:
+    """Get all unique stores from all data sources."""
+    status_stores = set(status_df['store_id'].unique()) if len(status_df) > 0 else set()
+    if isinstance(menu_hours, pd.DataFrame):
+        hours_stores = set(menu_hours['store_id'].unique())
+    else:
+        hours_stores = {h.store_id for h in menu_hours}
+    tz_stores = set(store_timezones.keys())
+    return status_stores | hours_stores | tz_stores
+
+
+def _active_mask(status: pd.Series) -> np.ndarray:
+    """Active flags for a status column holding 'active'/'inactive' or booleans (columnar loader)."""
+    if status.dtype == bool:
+        return status.to_numpy()
+    return (status == 'active').to_numpy(dtype=bool)
+
+
+def to_epoch_micros(value) -> np.ndarray:
+    """
+    Convert a timestamp (or a Series of them) to epoch microseconds as int64.
+    Naive values are treated as UTC, matching what SQLite hands back.
+    """
+    if isinstance(value, pd.Series):
+        series = pd.to_datetime(value, utc=True)
+        return series.to_numpy(dtype="datetime64[us]").view(np.int64)
+    ts = pd.Timestamp(value)
+    if ts.tzinfo is None:
+        ts = ts.tz_localize("UTC")
+    return ts.value // 1000
+
+
+def _micros(delta: timedelta) -> int:
+    return delta // timedelta(microseconds=1)
+
+
+def _minutes(delta: timedelta) -> int:
+    return delta // timedelta(minutes=1)
@@ -1,55 +1,434 @@
-from typing import Dict, List, Tuple
+import asyncio
+import os
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Sequence, Tuple, Union
 
+import numpy as np
 import pandas as pd
+from sqlalchemy import and_, case, func, select, union
 
-from app.database.config import get_db_session
-from app.database.models import StoreStatus, MenuHours, StoreTimezone
+from app.database.config import async_engine_enabled, current_engine, get_async_engine, get_db_session
+from app.database.models import StoreStatus, StoreStatusHourly, MenuHours, StoreTimezone, DataVersion, RetentionCutoff
 from app.models.schemas import MenuHourRecord
+from app.services.metrics import count_stage, report_stage
 
+# "columnar" (default) streams rows with Core selects into typed arrays;
+# "orm" is the original path that materializes ORM objects row by row.
+LOADER_MODE = os.getenv("LOADER_MODE", "columnar")
+LOADER_MODES = ("orm", "columnar")
+# Rows fetched per round trip by the columnar loader
+LOADER_CHUNK_SIZE = int(os.getenv("LOADER_CHUNK_SIZE", "50000"))
 
-def load_all_data() -> Tuple[pd.DataFrame, List[MenuHourRecord], Dict[int, str]]:
+
+# Inclusive (first, last) store_id bounds, used to load one shard of stores
+StoreRange = Tuple[str, str]
+
+
+def load_all_data(
+    mode: Optional[str] = None,
+    since: Optional[datetime] = None,
+    store_range: Optional[StoreRange] = None
+) -> Tuple[pd.DataFrame, Union[List[MenuHourRecord], pd.DataFrame], Dict[str, str]]:
+    """
+    Load status observations, menu hours and timezones.
+
+    When since is given only observations at or after it are read, which is
+    how the report pipeline keeps the query to its widest window.
+    store_range restricts every table to stores between two ids (inclusive).
+    """
+    mode = mode or LOADER_MODE
+    if mode == "orm":
+        return _load_all_data_orm(since, store_range)
+    if mode == "columnar":
+        return _load_all_data_columnar(since, store_range)
+    raise ValueError(f"Unknown loader mode '{mode}', expected one of {LOADER_MODES}")
+
+
+def _load_all_data_orm(
+    since: Optional[datetime] = None,
+    store_range: Optional[StoreRange] = None
+) -> Tuple[pd.DataFrame, List[MenuHourRecord], Dict[str, str]]:
 
     session = get_db_session()
     try:
         # Load store status as DataFrame
         print("Loading store status from database...")
-        status_query = session.query(StoreStatus).order_by(StoreStatus.store_id, StoreStatus.timestamp_utc)
+        status_query = session.query(StoreStatus).filter(*_in_store_range(StoreStatus.store_id, store_range))
+        if since is not None:
+            status_query = status_query.filter(StoreStatus.timestamp_utc >= since)
+        status_query = status_query.order_by(StoreStatus.store_id, StoreStatus.timestamp_utc)
         status_data = []
-        for record in status_query:
-            status_data.append({
-                'store_id': record.store_id,
-                'timestamp_utc': record.timestamp_utc,
-                'status': record.status
-            })
-        status_df = pd.DataFrame(status_data)
-        
+        with report_stage("query"):
+            for record in status_query:
+                status_data.append({
+                    'store_id': record.store_id,
+                    'timestamp_utc': record.timestamp_utc,
+                    'status': record.status
+                })
+        count_stage("query", rows=len(status_data))
+        with report_stage("materialize"):
+            status_df = pd.DataFrame(status_data)
+            if len(status_df):
+                # Naive on backends without timezone support (SQLite); the stored values are UTC
+                status_df['timestamp_utc'] = pd.to_datetime(status_df['timestamp_utc'], utc=True)
+
         # Load menu hours as list of records
         print("Loading menu hours from database...")
-        menu_hours_query = session.query(MenuHours)
+        menu_hours_query = session.query(MenuHours).filter(*_in_store_range(MenuHours.store_id, store_range))
         menu_hours = []
-        for record in menu_hours_query:
-            menu_hours.append(MenuHourRecord(
-                store_id=record.store_id,  # Keep as string
-                day_of_week=record.day_of_week,
-                start_time_local=str(record.start_time_local),
-                end_time_local=str(record.end_time_local)
-            ))
-        
+        with report_stage("query"):
+            for record in menu_hours_query:
+                menu_hours.append(MenuHourRecord(
+                    store_id=record.store_id,  # Keep as string
+                    day_of_week=record.day_of_week,
+                    start_time_local=str(record.start_time_local),
+                    end_time_local=str(record.end_time_local)
+                ))
+
         # Load timezones as dictionary
         print("Loading timezones from database...")
-        timezone_query = session.query(StoreTimezone)
+        timezone_query = session.query(StoreTimezone).filter(*_in_store_range(StoreTimezone.store_id, store_range))
         timezones = {}
-        for record in timezone_query:
-            timezones[record.store_id] = record.timezone_str  # Keep as string
-        
+        with report_stage("query"):
+            for record in timezone_query:
+                timezones[record.store_id] = record.timezone_str  # Keep as string
+
         print(f"Loaded {len(status_df)} status records, {len(menu_hours)} menu hours, {len(timezones)} timezones")
         return status_df, menu_hours, timezones
-        
+
     finally:
         session.close()
 
 
+def _load_all_data_columnar(
+    since: Optional[datetime] = None,
+    store_range: Optional[StoreRange] = None
+) -> Tuple[pd.DataFrame, pd.DataFrame, Dict[str, str]]:
+    """
+    Load the same data as the ORM path without building a Python object per row.
+
+    store_status is streamed through a server-side cursor in LOADER_CHUNK_SIZE
+    chunks and written straight into preallocated arrays: store_id as
+    categorical codes, timestamp_utc as int64 microseconds and status as a
+    boolean (True = active). Menu hours come back as a frame with times in
+    seconds since local midnight, the shape business_hours compiles from.
+    """
+    with current_engine().connect() as conn:
+        print("Loading store status from database...")
+        status_df = _stream_store_status(conn, since, store_range)
+
+        print("Loading menu hours from database...")
+        menu_hours = _load_menu_hours_frame(conn, store_range)
+
+        print("Loading timezones from database...")
+        timezones = _load_timezones(conn, store_range)
+
+    print(f"Loaded {len(status_df)} status records, {len(menu_hours)} menu hours, {len(timezones)} timezones")
+    return status_df, menu_hours, timezones
+
+
+def load_store_data(store_id: str, since: datetime) -> Tuple[pd.DataFrame, pd.DataFrame, Dict[str, str]]:
+    """
+    Columnar load of a single store, quietly: observations since a time
+    (a range scan on the (store_id, timestamp_utc) index), its menu hours
+    and its timezone.
+    """
+    store_range = (store_id, store_id)
+    with current_engine().connect() as conn:
+        status_df = _stream_store_status(conn, since, store_range)
+        menu_hours = _load_menu_hours_frame(conn, store_range)
+        timezones = _load_timezones(conn, store_range)
+    return status_df, menu_hours, timezones
+
+
+def store_has_status(store_id: str) -> bool:
+    with current_engine().connect() as conn:
+        return conn.execute(select(StoreStatus.id).where(StoreStatus.store_id == store_id).limit(1)).first() is not None
+
+
+def _load_menu_hours_frame(conn, store_range: Optional[StoreRange] = None) -> pd.DataFrame:
+    with report_stage("query"):
+        menu_rows = conn.execute(select(
+            MenuHours.store_id, MenuHours.day_of_week, MenuHours.start_time_local, MenuHours.end_time_local
+        ).where(*_in_store_range(MenuHours.store_id, store_range))).all()
+    with report_stage("materialize"):
+        store_ids, days, starts, ends = zip(*menu_rows) if menu_rows else ((), (), (), ())
+        return pd.DataFrame({
+            "store_id": np.array(store_ids, dtype=object),
+            "day_of_week": np.array(days, dtype=np.int64),
+            "start_seconds": np.array([t.hour * 3600 + t.minute * 60 + t.second for t in starts], dtype=np.int64),
+            "end_seconds": np.array([t.hour * 3600 + t.minute * 60 + t.second for t in ends], dtype=np.int64),
+        })
+
+
+def _load_timezones(conn, store_range: Optional[StoreRange] = None) -> Dict[str, str]:
+    with report_stage("query"):
+        return dict(conn.execute(
+            select(StoreTimezone.store_id, StoreTimezone.timezone_str)
+            .where(*_in_store_range(StoreTimezone.store_id, store_range))
+        ).all())
+
+
+def _stream_store_status(
+    conn,
+    since: Optional[datetime] = None,
+    store_range: Optional[StoreRange] = None
+) -> pd.DataFrame:
+    in_range = _in_store_range(StoreStatus.store_id, store_range)
+    if since is not None:
+        in_range.append(StoreStatus.timestamp_utc >= since)
+    dictionary: Dict[str, int] = {}
+    codes, timestamps, active = _stream_status_arrays(conn, in_range, dictionary, ordered=True)
+    with report_stage("materialize"):
+        return status_frame(codes, timestamps, active, pd.Index(list(dictionary), dtype=object))
+
+
+def load_status_arrays(
+    dictionary: Dict[str, int],
+    after_id: Optional[int] = None,
+    up_to_id: Optional[int] = None,
+    since: Optional[datetime] = None
+) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Observations with an id in (after_id, up_to_id] and a timestamp at or
+    after since, in no particular order, as (store codes, epoch microseconds,
+    active flags). Codes index into dictionary, which is extended in place
+    with stores it does not know yet.
+    """
+    conditions = []
+    if after_id is not None:
+        conditions.append(StoreStatus.id > after_id)
+    if up_to_id is not None:
+        conditions.append(StoreStatus.id <= up_to_id)
+    if since is not None:
+        conditions.append(StoreStatus.timestamp_utc >= since)
+    with current_engine().connect() as conn:
+        return _stream_status_arrays(conn, conditions, dictionary, ordered=False)
+
+
+def status_frame(codes: np.ndarray, timestamps: np.ndarray, active: np.ndarray, categories: pd.Index) -> pd.DataFrame:
+    """The columnar loader's frame: categorical store_id over categories, UTC timestamps and boolean status."""
+    return pd.DataFrame({
+        "store_id": pd.Categorical.from_codes(codes, categories=categories),
+        "timestamp_utc": pd.DatetimeIndex(timestamps.view("datetime64[us]")).tz_localize("UTC"),
+        "status": active,
+    }, copy=False)
+
+
+def _stream_status_arrays(
+    conn,
+    conditions: list,
+    dictionary: Dict[str, int],
+    ordered: bool
+) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Stream store_status rows matching conditions through a server-side
+    cursor in LOADER_CHUNK_SIZE chunks, straight into preallocated arrays.
+
+    The count and the stream are separate statements, so both are bounded
+    by the max(id) read first: rows committed in between (ids become visible
+    in order) are left for the next report, and rows deleted in between
+    (retention) only leave the arrays partly filled, which is trimmed.
+    """
+    with report_stage("query"):
+        max_id = conn.execute(select(func.max(StoreStatus.id))).scalar_one()
+        conditions = [*conditions, StoreStatus.id <= (max_id or 0)]
+        total = conn.execute(select(func.count()).select_from(StoreStatus).where(*conditions)).scalar_one()
+
+    codes = np.empty(total, dtype=np.int32)
+    timestamps = np.empty(total, dtype=np.int64)
+    active = np.empty(total, dtype=bool)
+
+    stmt = select(StoreStatus.store_id, StoreStatus.timestamp_utc, StoreStatus.status).where(*conditions)
+    if ordered:
+        stmt = stmt.order_by(StoreStatus.store_id, StoreStatus.timestamp_utc)
+    with report_stage("query"):
+        result = conn.execution_options(stream_results=True, yield_per=LOADER_CHUNK_SIZE).execute(stmt)
+        partitions = result.partitions()
+
+    filled = 0
+    while True:
+        with report_stage("query"):
+            chunk = next(partitions, None)
+        if not chunk:
+            break
+        with report_stage("materialize"):
+            chunk_store_ids, chunk_timestamps, chunk_statuses = zip(*chunk)
+            end = filled + len(chunk)
+
+            # Factorize the chunk, then map its (few) distinct ids onto the global dictionary
+            chunk_codes, uniques = pd.factorize(np.array(chunk_store_ids, dtype=object))
+            mapping = np.array([dictionary.setdefault(store_id, len(dictionary)) for store_id in uniques], dtype=np.int32)
+            codes[filled:end] = mapping[chunk_codes]
+
+            timestamps[filled:end] = pd.to_datetime(chunk_timestamps, utc=True).as_unit("us").asi8
+            active[filled:end] = np.array(chunk_statuses, dtype=object) == "active"
+            filled = end
+    count_stage("query", rows=filled)
+    return codes[:filled], timestamps[:filled], active[:filled]
+
+
+def _in_store_range(column, store_range: Optional[StoreRange]) -> list:
+    if store_range is None:
+        return []
+    return [column.between(*store_range)]
+
+
 def get_current_time_from_data(status_df: pd.DataFrame) -> pd.Timestamp:
     if len(status_df) == 0:
         return pd.Timestamp.now(tz='UTC')
     return status_df['timestamp_utc'].max()
+
+
+def get_current_time_from_db() -> pd.Timestamp:
+    """Same as get_current_time_from_data, but read with a max() probe on the timestamp index."""
+    with current_engine().connect() as conn:
+        latest = conn.execute(select(func.max(StoreStatus.timestamp_utc))).scalar_one()
+    if latest is None:
+        return pd.Timestamp.now(tz='UTC')
+    latest = pd.Timestamp(latest)
+    # Backends without timezone support (SQLite) return the stored UTC value naive
+    return latest if latest.tzinfo is not None else latest.tz_localize('UTC')
+
+
+def load_max_status_id() -> Optional[int]:
+    """Highest store_status id, a primary-key probe used to detect new observations."""
+    with current_engine().connect() as conn:
+        return conn.execute(select(func.max(StoreStatus.id))).scalar_one()
+
+
+async def load_max_status_id_async() -> Optional[int]:
+    """load_max_status_id for callers on the event loop (async engine, or a worker thread)."""
+    if not async_engine_enabled():
+        return await asyncio.to_thread(load_max_status_id)
+    async with get_async_engine().connect() as conn:
+        return (await conn.execute(select(func.max(StoreStatus.id)))).scalar_one()
+
+
+def load_new_status_store_ids(after_id: int, up_to_id: int) -> List[str]:
+    """Stores with observations whose id is in (after_id, up_to_id], a primary-key range scan."""
+    with current_engine().connect() as conn:
+        return list(conn.execute(_new_status_store_ids(after_id, up_to_id)).scalars())
+
+
+async def load_new_status_store_ids_async(after_id: int, up_to_id: int) -> List[str]:
+    """load_new_status_store_ids for callers on the event loop."""
+    if not async_engine_enabled():
+        return await asyncio.to_thread(load_new_status_store_ids, after_id, up_to_id)
+    async with get_async_engine().connect() as conn:
+        return list((await conn.execute(_new_status_store_ids(after_id, up_to_id))).scalars())
+
+
+def _new_status_store_ids(after_id: int, up_to_id: int):
+    return select(StoreStatus.store_id).where(StoreStatus.id > after_id, StoreStatus.id <= up_to_id).distinct()
+
+
+def load_data_watermark() -> Tuple:
+    """
+    Cheap summary of everything a report depends on: the newest store_status
+    id and timestamp (both index probes) plus the ingestion version of each
+    table. Equal watermarks mean equal reports.
+    """
+    with current_engine().connect() as conn:
+        max_id, max_timestamp = conn.execute(select(func.max(StoreStatus.id), func.max(StoreStatus.timestamp_utc))).one()
+    versions = load_data_versions()
+    return (
+        max_id,
+        max_timestamp.isoformat() if max_timestamp is not None else None,
+        versions.get("store_status", 0),
+        versions.get("menu_hours", 0),
+        versions.get("store_timezones", 0),
+    )
+
+
+def load_status_bounds() -> Tuple[Optional[int], Optional[pd.Timestamp]]:
+    """Newest store_status id and timestamp (UTC), both index probes; (None, None) when empty."""
+    with current_engine().connect() as conn:
+        max_id, max_timestamp = conn.execute(select(func.max(StoreStatus.id), func.max(StoreStatus.timestamp_utc))).one()
+    if max_timestamp is None:
+        return max_id, None
+    max_timestamp = pd.Timestamp(max_timestamp)
+    return max_id, max_timestamp if max_timestamp.tzinfo is not None else max_timestamp.tz_localize('UTC')
+
+
+def load_store_reference() -> Tuple[pd.DataFrame, Dict[str, str]]:
+    """Menu hours frame and timezones of every store, as the columnar loader returns them."""
+    with current_engine().connect() as conn:
+        return _load_menu_hours_frame(conn), _load_timezones(conn)
+
+
+def load_retention_cutoff() -> Optional[pd.Timestamp]:
+    """Time before which store_status observations were removed by retention, if any (UTC)."""
+    with current_engine().connect() as conn:
+        cutoff = conn.execute(select(RetentionCutoff.cutoff_utc).where(RetentionCutoff.name == "store_status")).scalar_one_or_none()
+    if cutoff is None:
+        return None
+    cutoff = pd.Timestamp(cutoff)
+    return cutoff if cutoff.tzinfo is not None else cutoff.tz_localize('UTC')
+
+
+def load_data_versions() -> Dict[str, int]:
+    """Ingestion version per table name (see ingestion.bump_data_version)."""
+    with current_engine().connect() as conn:
+        return dict(conn.execute(select(DataVersion.name, DataVersion.version)).all())
+
+
+def load_store_ids(store_range: Optional[StoreRange] = None) -> List[str]:
+    """
+    Every store known to any table, sorted - the set of rows a report covers.
+    store_status_hourly is included so stores whose raw observations were
+    all removed by retention keep their row.
+    """
+    stmt = union(
+        select(StoreStatus.store_id).where(*_in_store_range(StoreStatus.store_id, store_range)).distinct(),
+        select(StoreStatusHourly.store_id).where(*_in_store_range(StoreStatusHourly.store_id, store_range)).distinct(),
+        select(MenuHours.store_id).where(*_in_store_range(MenuHours.store_id, store_range)).distinct(),
+        select(StoreTimezone.store_id).where(*_in_store_range(StoreTimezone.store_id, store_range)),
+    )
+    with report_stage("query"), current_engine().connect() as conn:
+        return sorted(conn.execute(stmt).scalars())
+
+
+def load_window_counts(
+    current_time: datetime,
+    windows: Sequence[Tuple[str, timedelta]]
+) -> Tuple[List[str], Dict[str, Tuple[np.ndarray, np.ndarray]]]:
+    """
+    Count active and total observations per store for each window inside the database.
+
+    One grouped query with conditional aggregates per window, restricted to
+    the widest window so it can use the (store_id, timestamp_utc) index;
+    only one row per store comes back. Returns the sorted store ids of the
+    report and {label: (active_counts, total_counts)} aligned with them, the
+    same shape as calculator.window_counts.
+    """
+    lo = current_time - max(length for _, length in windows)
+    is_active = StoreStatus.status == "active"
+
+    columns = []
+    for label, length in windows:
+        in_window = StoreStatus.timestamp_utc >= current_time - length
+        columns.append(func.sum(case((and_(in_window, is_active), 1), else_=0)).label(f"active_{label}"))
+        columns.append(func.sum(case((in_window, 1), else_=0)).label(f"total_{label}"))
+
+    stmt = (
+        select(StoreStatus.store_id, *columns)
+        .where(StoreStatus.timestamp_utc >= lo, StoreStatus.timestamp_utc <= current_time)
+        .group_by(StoreStatus.store_id)
+    )
+    with report_stage("query"), current_engine().connect() as conn:
+        rows = conn.execute(stmt).all()
+    count_stage("query", rows=len(rows))
+
+    store_ids = load_store_ids()
+    with report_stage("materialize"):
+        counts_df = pd.DataFrame(rows, columns=["store_id"] + [c.name for c in columns])
+        counts_df = counts_df.set_index("store_id").reindex(store_ids, fill_value=0)
+
+        counts = {}
+        for label, _ in windows:
+            counts[label] = (
+                counts_df[f"active_{label}"].to_numpy(dtype=np.int64),
+                counts_df[f"total_{label}"].to_numpy(dtype=np.int64),
+            )
+    return store_ids, counts
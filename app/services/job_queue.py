@@ -0,0 +1,280 @@
+import json
+import os
+import threading
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Tuple
+
+from sqlalchemy import func, select, update
+from sqlalchemy.orm import aliased
+
+from app.database.config import get_db_session, use_report_pool
+from app.database.models import ReportJob
+
+# Reports computed at the same time by one process's worker pool
+REPORT_JOB_CONCURRENCY = int(os.getenv("REPORT_JOB_CONCURRENCY", "2"))
+# Distinct reports allowed to wait in the queue before submissions are refused
+REPORT_QUEUE_MAX_DEPTH = int(os.getenv("REPORT_QUEUE_MAX_DEPTH", "100"))
+# How often idle workers look for jobs submitted by other processes
+REPORT_JOB_POLL_SECONDS = float(os.getenv("REPORT_JOB_POLL_SECONDS", "1"))
+# Running jobs older than this are assumed to belong to a dead worker and are requeued
+REPORT_JOB_STALE_SECONDS = int(os.getenv("REPORT_JOB_STALE_SECONDS", "3600"))
+
+# (report_id, fingerprint) of a claimed job
+ClaimedJob = Tuple[str, str]
+
+
+class QueueFullError(Exception):
+    """Raised when a report is submitted while REPORT_QUEUE_MAX_DEPTH reports are waiting."""
+
+
+def enqueue_job(
+    report_id: str, fingerprint: str, priority: int = 0, windows: Optional[str] = None, backfill: Optional[dict] = None
+) -> None:
+    """
+    Add a queued job. Jobs sharing a fingerprint count once towards the
+    queue depth, since they are all answered by the same computation.
+    """
+    session = get_db_session()
+    try:
+        depth = session.execute(
+            select(func.count(func.distinct(ReportJob.fingerprint))).where(ReportJob.status == "queued")
+        ).scalar_one()
+        joins_existing = session.execute(
+            select(ReportJob.report_id)
+            .where(ReportJob.fingerprint == fingerprint, ReportJob.status.in_(("queued", "running")))
+            .limit(1)
+        ).first() is not None
+        if depth >= REPORT_QUEUE_MAX_DEPTH and not joins_existing:
+            raise QueueFullError(f"{depth} reports are already queued")
+
+        session.add(ReportJob(
+            report_id=report_id, status="queued", priority=priority, fingerprint=fingerprint, windows=windows,
+            backfill=json.dumps(backfill) if backfill is not None else None,
+        ))
+        session.commit()
+    finally:
+        session.close()
+
+
+def record_completed_job(
+    report_id: str, fingerprint: str, output_path: Path, priority: int = 0, windows: Optional[str] = None,
+    backfill: Optional[dict] = None,
+) -> None:
+    """Add a job that is already complete, e.g. answered from the report cache."""
+    now = datetime.now(timezone.utc)
+    session = get_db_session()
+    try:
+        session.add(ReportJob(
+            report_id=report_id, status="complete", priority=priority, fingerprint=fingerprint, windows=windows,
+            backfill=json.dumps(backfill) if backfill is not None else None, output_csv_path=str(output_path), started_at=now, finished_at=now,
+        ))
+        session.commit()
+    finally:
+        session.close()
+
+
+def claim_next_job() -> Optional[ClaimedJob]:
+    """
+    Move the highest-priority, oldest queued job to running and return it.
+
+    Jobs whose fingerprint is already being computed are skipped: they are
+    completed together with the running one. The UPDATE re-checks both the
+    job's status and that no job with its fingerprint is running, under a
+    per-fingerprint advisory lock on PostgreSQL, so two workers can neither
+    claim the same job nor two jobs of one fingerprint.
+    """
+    running = aliased(ReportJob)
+    candidate = (
+        select(ReportJob.report_id, ReportJob.fingerprint)
+        .where(
+            ReportJob.status == "queued",
+            ~select(running.report_id)
+            .where(running.fingerprint == ReportJob.fingerprint, running.status == "running")
+            .exists(),
+        )
+        .order_by(ReportJob.priority.desc(), ReportJob.created_at)
+        .limit(1)
+        .with_for_update(skip_locked=True)
+    )
+
+    session = get_db_session()
+    try:
+        row = session.execute(candidate).first()
+        if row is None:
+            session.commit()
+            return None
+        if session.get_bind().dialect.name == "postgresql":
+            # Held until commit: a concurrent claim of the same fingerprint sees this one's running job
+            session.execute(select(func.pg_advisory_xact_lock(func.hashtext(row.fingerprint))))
+        claimed = session.execute(
+            update(ReportJob)
+            .where(
+                ReportJob.report_id == row.report_id,
+                ReportJob.status == "queued",
+                ~select(running.report_id)
+                .where(running.fingerprint == row.fingerprint, running.status == "running")
+                .exists(),
+            )
+            .values(status="running", started_at=datetime.now(timezone.utc))
+        ).rowcount
+        session.commit()
+        return (row.report_id, row.fingerprint) if claimed else None
+    finally:
+        session.close()
+
+
+def finish_jobs(
+    fingerprint: str,
+    status: str,
+    output_path: Optional[Path] = None,
+    error_message: Optional[str] = None,
+    stage_timings: Optional[dict] = None,
+) -> int:
+    """Record the outcome, and how long each stage took, for every queued or running job with this fingerprint."""
+    session = get_db_session()
+    try:
+        finished = session.execute(
+            update(ReportJob)
+            .where(ReportJob.fingerprint == fingerprint, ReportJob.status.in_(("queued", "running")))
+            .values(
+                status=status,
+                output_csv_path=str(output_path) if output_path is not None else None,
+                error_message=error_message,
+                stage_timings=json.dumps(stage_timings) if stage_timings is not None else None,
+                finished_at=datetime.now(timezone.utc),
+            )
+        ).rowcount
+        session.commit()
+        return finished
+    finally:
+        session.close()
+
+
+def job_counts() -> Dict[str, Tuple[int, int]]:
+    """{status: (jobs, distinct reports)} for queued and running jobs across every process."""
+    session = get_db_session()
+    try:
+        rows = session.execute(
+            select(ReportJob.status, func.count(), func.count(func.distinct(ReportJob.fingerprint)))
+            .where(ReportJob.status.in_(("queued", "running")))
+            .group_by(ReportJob.status)
+        ).all()
+    finally:
+        session.close()
+    counts = {"queued": (0, 0), "running": (0, 0)}
+    counts.update({status: (jobs, reports) for status, jobs, reports in rows})
+    return counts
+
+
+def requeue_stale_jobs() -> int:
+    cutoff = datetime.now(timezone.utc) - timedelta(seconds=REPORT_JOB_STALE_SECONDS)
+    session = get_db_session()
+    try:
+        requeued = session.execute(
+            update(ReportJob)
+            .where(ReportJob.status == "running", ReportJob.started_at < cutoff)
+            .values(status="queued", started_at=None)
+        ).rowcount
+        session.commit()
+        return requeued
+    finally:
+        session.close()
+
+
+class ReportWorkerPool:
+    """
+    Fixed set of worker threads that run queued report jobs.
+
+    Workers are woken immediately by submissions from this process and poll
+    the jobs table every REPORT_JOB_POLL_SECONDS for submissions from other
+    processes, so any number of API processes can share the queue.
+    """
+
+    def __init__(self, handler: Callable[[str, str], None], concurrency: Optional[int] = None):
+        self.handler = handler
+        self.concurrency = REPORT_JOB_CONCURRENCY if concurrency is None else concurrency
+        self._threads: List[threading.Thread] = []
+        self._stop = threading.Event()
+        self._wakeup = threading.Event()
+        self._in_flight = 0
+        self._in_flight_lock = threading.Lock()
+
+    @property
+    def is_running(self) -> bool:
+        return any(thread.is_alive() for thread in self._threads)
+
+    @property
+    def in_flight(self) -> int:
+        """Jobs this process's workers are running right now."""
+        return self._in_flight
+
+    def start(self) -> None:
+        if self.is_running or self.concurrency <= 0:
+            return
+        self._stop.clear()
+        requeued = requeue_stale_jobs()
+        if requeued:
+            print(f"Requeued {requeued} stale report job(s)")
+        self._threads = [
+            threading.Thread(target=self._run, name=f"report-worker-{i}", daemon=True)
+            for i in range(self.concurrency)
+        ]
+        for thread in self._threads:
+            thread.start()
+        print(f"Started {self.concurrency} report worker(s)")
+
+    def stop(self, timeout: Optional[float] = None) -> None:
+        self._stop.set()
+        self._wakeup.set()
+        for thread in self._threads:
+            thread.join(timeout)
+        self._threads = []
+
+    def run_forever(self) -> None:
+        """Run the workers in the foreground until interrupted."""
+        self.start()
+        try:
+            while self.is_running:
+                self._stop.wait(1)
+        except KeyboardInterrupt:
+            print("Stopping report workers...")
+        finally:
+            self.stop()
+
+    def notify(self) -> None:
+        """Wake idle workers after a submission."""
+        self._wakeup.set()
+
+    def _run(self) -> None:
+        # Workers use their own connection pool, so reports never starve API requests
+        with use_report_pool():
+            self._work()
+
+    def _work(self) -> None:
+        while not self._stop.is_set():
+            try:
+                job = claim_next_job()
+            except Exception as e:
+                print(f"Report worker error: {e}")
+                job = None
+
+            if job is None:
+                self._wakeup.wait(REPORT_JOB_POLL_SECONDS)
+                self._wakeup.clear()
+                continue
+
+            report_id, fingerprint = job
+            with self._in_flight_lock:
+                self._in_flight += 1
+            try:
+                self.handler(report_id, fingerprint)
+            except Exception as e:
+                try:
+                    finish_jobs(fingerprint, "failed", error_message=str(e))
+                except Exception as finish_error:
+                    # The job stays running until requeue_stale_jobs picks it up again
+                    print(f"Report worker error: {finish_error}")
+            finally:
+                with self._in_flight_lock:
+                    self._in_flight -= 1
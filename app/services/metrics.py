@@ -0,0 +1,196 @@
+import contextvars
+import math
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, Optional, Sequence, Tuple
+
+# Report stages, in pipeline order: database round trips, turning rows into
+# arrays/frames, the uptime calculation, CSV formatting and file output
+REPORT_STAGES = ("query", "materialize", "compute", "serialize", "write")
+# Seconds; covers single-store reads up to multi-minute fleet reports
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600)
+# Rows per write
+BATCH_SIZE_BUCKETS = (1, 10, 100, 1000, 2500, 5000, 10000, 25000, 50000, 100000, 250000)
+
+
+class ReportTimings:
+    """
+    Time spent in each stage of one report, plus row/store counts.
+
+    A stage can be entered many times (e.g. once per fetched chunk); its
+    seconds and counts accumulate. as_dict() is what is stored with the job.
+    """
+
+    def __init__(self):
+        self.stages: Dict[str, Dict[str, float]] = {}
+        self._started = time.perf_counter()
+
+    @contextmanager
+    def stage(self, name: str) -> Iterator[None]:
+        entry = self.stages.setdefault(name, {"seconds": 0.0})
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            entry["seconds"] += time.perf_counter() - started
+
+    def count(self, name: str, **counts: int) -> None:
+        entry = self.stages.setdefault(name, {"seconds": 0.0})
+        for key, value in counts.items():
+            entry[key] = entry.get(key, 0) + int(value)
+
+    def merge(self, stages: Dict[str, Dict[str, float]]) -> None:
+        """Add another recorder's stages, e.g. from a shard computed in a worker process."""
+        for name, entry in stages.items():
+            target = self.stages.setdefault(name, {"seconds": 0.0})
+            for key, value in entry.items():
+                target[key] = target.get(key, 0) + value
+
+    def as_dict(self) -> Dict[str, Dict[str, float]]:
+        ordered = sorted(self.stages, key=lambda n: REPORT_STAGES.index(n) if n in REPORT_STAGES else len(REPORT_STAGES))
+        stages = {name: {k: round(v, 4) if k == "seconds" else v for k, v in self.stages[name].items()} for name in ordered}
+        stages["total"] = {"seconds": round(time.perf_counter() - self._started, 4)}
+        return stages
+
+
+_current_timings: contextvars.ContextVar[Optional[ReportTimings]] = contextvars.ContextVar("report_timings", default=None)
+
+
+@contextmanager
+def record_report_timings() -> Iterator[ReportTimings]:
+    """Collect report_stage/count_stage calls made in this context (thread) into a new recorder."""
+    timings = ReportTimings()
+    token = _current_timings.set(timings)
+    try:
+        yield timings
+    finally:
+        _current_timings.reset(token)
+
+
+@contextmanager
+def report_stage(name: str) -> Iterator[None]:
+    """Time a block as part of a stage of the report being recorded, if any."""
+    timings = _current_timings.get()
+    if timings is None:
+        yield
+        return
+    with timings.stage(name):
+        yield
+
+
+def count_stage(name: str, **counts: int) -> None:
+    timings = _current_timings.get()
+    if timings is not None:
+        timings.count(name, **counts)
+
+
+def merge_report_timings(stages: Dict[str, Dict[str, float]]) -> None:
+    timings = _current_timings.get()
+    if timings is not None:
+        timings.merge(stages)
+
+
+class Histogram:
+    """Prometheus histogram with fixed buckets and optional labels."""
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = LATENCY_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets) + (math.inf,)
+        # label values -> (cumulative bucket counts, sum, count)
+        self._series: Dict[Tuple[str, ...], Tuple[List[int], float, int]] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels: str) -> None:
+        key = tuple(str(labels[name]) for name in self.labelnames)
+        with self._lock:
+            counts, total, count = self._series.get(key, ([0] * len(self.buckets), 0.0, 0))
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[i] += 1
+            self._series[key] = (counts, total + value, count + 1)
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            series = sorted(self._series.items())
+        for key, (counts, total, count) in series:
+            labels = list(zip(self.labelnames, key))
+            for bound, bucket_count in zip(self.buckets, counts):
+                le = "+Inf" if bound == math.inf else repr(float(bound))
+                lines.append(f"{self.name}_bucket{_labels(labels + [('le', le)])} {bucket_count}")
+            lines.append(f"{self.name}_sum{_labels(labels)} {total!r}")
+            lines.append(f"{self.name}_count{_labels(labels)} {count}")
+        return lines
+
+
+class Counter:
+    """Prometheus counter with optional labels."""
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        # An unlabelled counter is exported as 0 before its first increment
+        self._values: Dict[Tuple[str, ...], float] = {} if self.labelnames else {(): 0}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1, **labels: str) -> None:
+        key = tuple(str(labels[name]) for name in self.labelnames)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            values = sorted(self._values.items())
+        for key, value in values:
+            lines.append(f"{self.name}{_labels(list(zip(self.labelnames, key)))} {value!r}")
+        return lines
+
+
+def gauge(name: str, documentation: str, samples: Sequence[Tuple[Dict[str, str], float]]) -> List[str]:
+    """Render a gauge whose samples are read at scrape time."""
+    lines = [f"# HELP {name} {documentation}", f"# TYPE {name} gauge"]
+    for labels, value in samples:
+        lines.append(f"{name}{_labels(list(labels.items()))} {float(value)!r}")
+    return lines
+
+
+def _labels(pairs: List[Tuple[str, str]]) -> str:
+    if not pairs:
+        return ""
+    escaped = (value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"') for _, value in pairs)
+    return "{" + ",".join(f'{name}="{value}"' for (name, _), value in zip(pairs, escaped)) + "}"
+
+
+# Metrics recorded by this process
+report_stage_seconds = Histogram(
+    "store_monitoring_report_stage_seconds", "Time spent in each report generation stage.", ("stage", "engine"),
+)
+report_duration_seconds = Histogram(
+    "store_monitoring_report_duration_seconds", "End-to-end report generation time by outcome.", ("engine", "status"),
+)
+report_cache_hits = Counter(
+    "store_monitoring_report_cache_hits_total", "Triggered reports answered from an existing report file.",
+)
+observation_flush_seconds = Histogram(
+    "store_monitoring_observation_flush_seconds", "Time to write one buffered batch of posted observations to store_status.",
+)
+observation_wait_seconds = Histogram(
+    "store_monitoring_observation_wait_seconds", "Time the oldest observation of a batch waited in the buffer before its flush.",
+)
+observation_flush_rows = Histogram(
+    "store_monitoring_observation_flush_rows", "Observations written per flush.", buckets=BATCH_SIZE_BUCKETS,
+)
+observation_flush_errors = Counter(
+    "store_monitoring_observation_flush_errors_total",
+    "Failed flushes of posted observations by outcome: retried, or dead_lettered after OBSERVATION_FLUSH_MAX_RETRIES.",
+    ("outcome",),
+)
+observations_received = Counter(
+    "store_monitoring_observations_total", "Posted observations by outcome: accepted, rejected (invalid) or refused (buffer full).",
+    ("outcome",),
+)
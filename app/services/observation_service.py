@@ -0,0 +1,301 @@
+import io
+import json
+import os
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from typing import List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from app.database.config import get_db_session
+from app.database.ingestion import insert_observations
+from app.models.schemas import ObservationBatchResponse
+from app.services.metrics import (
+    observation_flush_errors, observation_flush_rows, observation_flush_seconds, observation_wait_seconds,
+    observations_received,
+)
+from app.services.store_uptime_service import invalidate_store_uptime
+
+# Observations one POST /observations request may carry
+OBSERVATION_MAX_BATCH = int(os.getenv("OBSERVATION_MAX_BATCH", "50000"))
+# Buffered observations are written once this many are waiting, or this many
+# seconds after the oldest one arrived, whichever comes first
+OBSERVATION_FLUSH_ROWS = int(os.getenv("OBSERVATION_FLUSH_ROWS", "10000"))
+OBSERVATION_FLUSH_SECONDS = float(os.getenv("OBSERVATION_FLUSH_SECONDS", "1"))
+# Observations buffered (including a flush in progress) before POST /observations answers 429
+OBSERVATION_BUFFER_MAX_ROWS = int(os.getenv("OBSERVATION_BUFFER_MAX_ROWS", "200000"))
+# Seconds before a failed flush is retried; its observations stay buffered meanwhile
+OBSERVATION_RETRY_SECONDS = 5
+# Retries of a failed flush before its observations are given up on (a batch
+# the database always refuses would otherwise hold the buffer full forever)
+OBSERVATION_FLUSH_MAX_RETRIES = int(os.getenv("OBSERVATION_FLUSH_MAX_RETRIES", "12"))
+# Given-up observations are written here as CSV, re-postable to
+# POST /observations once the cause is fixed (empty = dropped)
+OBSERVATION_DEAD_LETTER_DIR = os.getenv("OBSERVATION_DEAD_LETTER_DIR", "dead_letter")
+# Timestamps further ahead of this server's clock are rejected: one would move every report's current time
+OBSERVATION_MAX_CLOCK_SKEW = timedelta(minutes=5)
+# Rejected rows described in a response
+MAX_REPORTED_ERRORS = 20
+
+COLUMNS = ["store_id", "timestamp_utc", "status"]
+
+
+class BufferFullError(Exception):
+    """Raised when a batch would take the observation buffer past OBSERVATION_BUFFER_MAX_ROWS."""
+
+    def __init__(self, message: str, retry_after: float):
+        super().__init__(message)
+        self.retry_after = retry_after  # seconds until the buffer is expected to drain
+
+
+def parse_observations(body: bytes, content_type: str) -> pd.DataFrame:
+    """
+    A posted batch as a frame of raw values: CSV with a store_id,
+    timestamp_utc,status header (the ingestion file format), or JSON, either
+    a list of objects or {"observations": [...]}. Raises ValueError.
+    """
+    if content_type.split(";")[0].strip() == "text/csv":
+        try:
+            frame = pd.read_csv(io.BytesIO(body), dtype=str)
+        except (ValueError, pd.errors.ParserError) as e:
+            raise ValueError(f"Invalid CSV: {e}")
+        frame.columns = [str(c).strip() for c in frame.columns]
+    else:
+        try:
+            document = json.loads(body)
+        except ValueError as e:
+            raise ValueError(f"Invalid JSON: {e}")
+        records = document.get("observations") if isinstance(document, dict) else document
+        if not isinstance(records, list) or not all(isinstance(record, dict) for record in records):
+            raise ValueError('Expected a list of {"store_id", "timestamp_utc", "status"} objects')
+        frame = pd.DataFrame.from_records(records)
+
+    missing = [column for column in COLUMNS if column not in frame.columns and len(frame)]
+    if missing:
+        raise ValueError(f"Missing field(s): {', '.join(missing)}")
+    return frame.reindex(columns=COLUMNS)
+
+
+def validate_observations(frame: pd.DataFrame, now: Optional[datetime] = None) -> Tuple[pd.DataFrame, List[dict]]:
+    """
+    Check and clean a batch column by column, never per row. Returns the
+    valid rows in the staging shape (str store_id, UTC timestamp_utc,
+    lowercase status) and one {"row", "error"} per rejected row (first
+    MAX_REPORTED_ERRORS only).
+    """
+    now = now or datetime.now(timezone.utc)
+    store_ids = frame["store_id"].astype("string").str.strip()
+    timestamps = pd.to_datetime(frame["timestamp_utc"], utc=True, errors="coerce", format="mixed")
+    statuses = frame["status"].astype("string").str.strip().str.lower()
+
+    reasons = np.select(
+        [
+            (store_ids.isna() | ~store_ids.str.len().between(1, 50)).to_numpy(dtype=bool),
+            timestamps.isna().to_numpy(),
+            (timestamps > now + OBSERVATION_MAX_CLOCK_SKEW).to_numpy(),
+            (~statuses.isin(["active", "inactive"])).to_numpy(dtype=bool),
+        ],
+        [
+            "store_id must be 1 to 50 characters",
+            "timestamp_utc is not a timestamp",
+            "timestamp_utc is in the future",
+            "status must be active or inactive",
+        ],
+        default="",
+    )
+    rejected = np.flatnonzero(reasons != "")
+    errors = [{"row": int(row), "error": str(reasons[row])} for row in rejected[:MAX_REPORTED_ERRORS]]
+
+    valid = reasons == ""
+    observations = pd.DataFrame({
+        "store_id": store_ids[valid].astype(object),
+        "timestamp_utc": timestamps[valid],
+        "status": statuses[valid].astype(object),
+    }).reset_index(drop=True)
+    return observations, errors
+
+
+class ObservationBuffer:
+    """
+    In-memory queue of validated observations with one flusher thread.
+
+    The flusher writes everything buffered as one bulk insert into
+    store_status (insert_observations: duplicates on (store_id,
+    timestamp_utc) are skipped) once OBSERVATION_FLUSH_ROWS are waiting or
+    the oldest has waited OBSERVATION_FLUSH_SECONDS. submit() refuses
+    batches that would take the buffer past OBSERVATION_BUFFER_MAX_ROWS, so
+    a slow or unavailable database pushes back on clients instead of
+    growing memory. A failed flush keeps its observations and is retried
+    on its own every OBSERVATION_RETRY_SECONDS, up to
+    OBSERVATION_FLUSH_MAX_RETRIES times; then they are dead-lettered
+    (OBSERVATION_DEAD_LETTER_DIR) so the buffer drains.
+    """
+
+    def __init__(
+        self,
+        flush_rows: int = OBSERVATION_FLUSH_ROWS,
+        flush_seconds: float = OBSERVATION_FLUSH_SECONDS,
+        max_rows: int = OBSERVATION_BUFFER_MAX_ROWS,
+    ):
+        self.flush_rows = flush_rows
+        self.flush_seconds = flush_seconds
+        self.max_rows = max_rows
+        self._chunks: List[pd.DataFrame] = []
+        self._rows = 0
+        self._flushing = 0  # rows taken by the flusher and not written yet
+        self._oldest: Optional[float] = None  # monotonic arrival time of the oldest buffered row
+        # A failed flush waiting to be retried (counted in _flushing), and its failures so far
+        self._failed: Optional[Tuple[pd.DataFrame, float]] = None
+        self._failures = 0
+        self._condition = threading.Condition()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def buffered(self) -> int:
+        """Observations accepted and not written yet, including a flush in progress."""
+        return self._rows + self._flushing
+
+    def start(self) -> None:
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="observation-flusher", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: Optional[float] = None) -> None:
+        """Write what is buffered and stop the flusher."""
+        self._stop.set()
+        with self._condition:
+            self._condition.notify()
+        if self._thread is not None:
+            self._thread.join(timeout)
+        self._thread = None
+
+    def submit(self, observations: pd.DataFrame) -> int:
+        """Queue validated observations; returns the rows now buffered. Raises BufferFullError."""
+        if observations.empty:
+            return self.buffered
+        with self._condition:
+            if self._rows + self._flushing + len(observations) > self.max_rows:
+                # While a flush is failing the buffer drains no sooner than its next retry
+                retry_after = OBSERVATION_RETRY_SECONDS if self._failed is not None else self.flush_seconds
+                raise BufferFullError(
+                    f"{self._rows + self._flushing:,} observations are waiting to be written "
+                    f"(OBSERVATION_BUFFER_MAX_ROWS={self.max_rows:,}), retry later",
+                    retry_after,
+                )
+            self._chunks.append(observations)
+            self._rows += len(observations)
+            if self._oldest is None:
+                self._oldest = time.monotonic()
+                self._condition.notify()  # the flusher now has a deadline
+            elif self._rows >= self.flush_rows:
+                self._condition.notify()
+            return self._rows + self._flushing
+
+    def _run(self) -> None:
+        while True:
+            if self._failed is not None:
+                # Retried alone: rows that arrived since are not held back (or given up) with it
+                observations, oldest = self._failed
+            else:
+                with self._condition:
+                    while not self._due():
+                        if self._stop.is_set():
+                            return
+                        timeout = None if self._oldest is None else self._oldest + self.flush_seconds - time.monotonic()
+                        self._condition.wait(timeout)
+                    chunks, oldest = self._chunks, self._oldest
+                    self._flushing, self._rows = self._rows, 0
+                    self._chunks, self._oldest = [], None
+                observations = pd.concat(chunks, ignore_index=True)
+
+            try:
+                self._flush(observations, oldest)
+            except Exception as e:
+                self._failures += 1
+                if self._failures > OBSERVATION_FLUSH_MAX_RETRIES:
+                    observation_flush_errors.inc(outcome="dead_lettered")
+                    self._dead_letter(observations, e)
+                    self._done_flushing()
+                    continue
+                observation_flush_errors.inc(outcome="retried")
+                print(f"Observation flush failed, retrying in {OBSERVATION_RETRY_SECONDS}s: {e}")
+                self._failed = (observations, oldest)
+                if self._stop.wait(OBSERVATION_RETRY_SECONDS):
+                    print(f"Observation flusher stopped with {self.buffered:,} observations unwritten")
+                    return
+            else:
+                self._done_flushing()
+
+    def _done_flushing(self) -> None:
+        self._failed, self._failures = None, 0
+        with self._condition:
+            self._flushing = 0
+
+    def _dead_letter(self, observations: pd.DataFrame, error: Exception) -> None:
+        if not OBSERVATION_DEAD_LETTER_DIR:
+            print(f"Dropped {len(observations):,} observations after {self._failures} failed flushes: {error}")
+            return
+        path = Path(OBSERVATION_DEAD_LETTER_DIR) / f"observations_{datetime.now(timezone.utc):%Y%m%dT%H%M%S%f}.csv"
+        try:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            observations.to_csv(path, index=False, columns=COLUMNS)
+        except OSError as write_error:
+            print(f"Dropped {len(observations):,} observations, could not write {path}: {write_error}")
+            return
+        print(f"Gave up on {len(observations):,} observations after {self._failures} failed flushes ({error}), saved to {path}")
+
+    def _due(self) -> bool:
+        if self._rows == 0:
+            return False
+        return (
+            self._stop.is_set() or self._rows >= self.flush_rows
+            or time.monotonic() - self._oldest >= self.flush_seconds
+        )
+
+    def _flush(self, observations: pd.DataFrame, oldest: float) -> None:
+        started = time.monotonic()
+        observation_wait_seconds.observe(started - oldest)
+        session = get_db_session()
+        try:
+            inserted = insert_observations(session, observations)
+            session.commit()
+        except Exception:
+            session.rollback()
+            raise
+        finally:
+            session.close()
+        observation_flush_seconds.observe(time.monotonic() - started)
+        observation_flush_rows.observe(len(observations))
+        # Single-store results of these stores may now be stale; reports see the new max(id)
+        invalidate_store_uptime(observations["store_id"].unique())
+        if len(observations) >= self.flush_rows:
+            print(f"Flushed {len(observations):,} observations ({inserted:,} new) in {time.monotonic() - started:.2f}s")
+
+
+def submit_observations(body: bytes, content_type: str) -> ObservationBatchResponse:
+    """Parse, validate and buffer one POST /observations batch. Raises ValueError and BufferFullError."""
+    frame = parse_observations(body, content_type)
+    if len(frame) > OBSERVATION_MAX_BATCH:
+        raise ValueError(f"At most {OBSERVATION_MAX_BATCH:,} observations per request, got {len(frame):,}")
+    observations, errors = validate_observations(frame)
+    rejected = len(frame) - len(observations)
+    observations_received.inc(rejected, outcome="rejected")
+    if len(frame) and observations.empty:
+        raise ValueError(f"No valid observations: {errors[0]['error']} (row {errors[0]['row']})")
+    try:
+        buffered = observation_buffer.submit(observations)
+    except BufferFullError:
+        observations_received.inc(len(observations), outcome="refused")
+        raise
+    observations_received.inc(len(observations), outcome="accepted")
+    return ObservationBatchResponse(accepted=len(observations), rejected=rejected, errors=errors, buffered=buffered)
+
+
+# Shared by every request of this process
+observation_buffer = ObservationBuffer()
@@ -1,70 +1,129 @@
 import asyncio
-from datetime import datetime, timezone, timedelta
-from sqlalchemy.orm import Session
+import os
+import select
+import threading
+from datetime import datetime, timezone
+from typing import Optional
 
-from app.database.config import get_db_session
-from app.database.models import StoreStatus
+from app.database.config import engine
+from app.database.ingestion import NEW_DATA_CHANNEL
 from app.services import report_service
+from app.services.data_loader import load_max_status_id_async, load_new_status_store_ids_async
+from app.services.store_uptime_service import invalidate_store_uptime
+
+# Seconds between checks when no new-data notification arrives
+POLLING_INTERVAL_SECONDS = int(os.getenv("POLLING_INTERVAL_SECONDS", "3600"))
+POLLING_RETRY_SECONDS = 300
+# Queue priority of automatic reports; below the default 0 of user-triggered ones
+POLLING_REPORT_PRIORITY = int(os.getenv("POLLING_REPORT_PRIORITY", "-10"))
+# Wake up on PostgreSQL NOTIFY from ingestion instead of waiting for the next check
+POLLING_LISTEN = os.getenv("POLLING_LISTEN", "true").lower() in ("1", "true", "yes")
+
 
 class SimplePollingService:
-    
+
     def __init__(self):
         self.is_running = False
         self.last_report_id = None
         self.last_check_time = None
-        
+        # Highest store_status.id seen at the last check; ids only grow, so a
+        # different max(id) is new data and the check is a single index probe
+        self.last_seen_id: Optional[int] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._wakeup: Optional[asyncio.Event] = None
+
     async def start_polling(self):
-        """Start hourly polling loop."""
+        """Check for new data every POLLING_INTERVAL_SECONDS, or as soon as ingestion signals it."""
         self.is_running = True
-        self.last_check_time = datetime.now(timezone.utc) - timedelta(hours=1)  # Start from 1 hour ago
-        print("Starting hourly polling service...")
-        
-        while self.is_running:
-            try:
-                await self._check_for_new_data()
-                print("Next check in 1 hour...")
-                await asyncio.sleep(3600)  # 1 hour = 3600 seconds
-            except Exception as e:
-                print(f"Polling error: {e}")
-                await asyncio.sleep(300)  # Wait 5 minutes before retry
-    
+        self._loop = asyncio.get_running_loop()
+        self._wakeup = asyncio.Event()
+        listener_stop = self._start_listener()
+        print("Starting polling service...")
+
+        try:
+            while self.is_running:
+                try:
+                    await self._check_for_new_data()
+                    delay = POLLING_INTERVAL_SECONDS
+                except Exception as e:
+                    print(f"Polling error: {e}")
+                    delay = POLLING_RETRY_SECONDS
+                print(f"Next check in {delay} seconds, or when new data is signalled...")
+                await self._sleep(delay)
+        finally:
+            if listener_stop is not None:
+                listener_stop.set()
+
     def stop_polling(self):
         self.is_running = False
+        self.notify_new_data()  # wake the loop so it exits now rather than after the interval
         print("Stopping polling service...")
-    
+
+    def notify_new_data(self):
+        """Run the next check immediately. Safe to call from any thread."""
+        if self._loop is None or self._wakeup is None:
+            return
+        try:
+            self._loop.call_soon_threadsafe(self._wakeup.set)
+        except RuntimeError:
+            pass  # event loop already closed
+
+    async def _sleep(self, seconds: float):
+        try:
+            await asyncio.wait_for(self._wakeup.wait(), timeout=seconds)
+        except asyncio.TimeoutError:
+            pass
+        self._wakeup.clear()
+
     async def _check_for_new_data(self):
-        session = get_db_session()
+        self.last_check_time = datetime.now(timezone.utc)
+        max_id = await load_max_status_id_async()
+
+        # != rather than >: ids restart after a reset on some backends
+        if max_id is None or max_id == self.last_seen_id:
+            print("No new data found")
+            return
+
+        print(f"Found new store status data (max id {self.last_seen_id} -> {max_id})")
+        if self.last_seen_id is not None and max_id > self.last_seen_id:
+            store_ids = await load_new_status_store_ids_async(self.last_seen_id, max_id)
+            invalidate_store_uptime(store_ids)
+        report_id = await asyncio.to_thread(report_service.trigger_report, POLLING_REPORT_PRIORITY)
+        # Only advance once the report is queued, so a refused submission is retried
+        self.last_seen_id = max_id
+        self.last_report_id = report_id
+        print(f"Queued report: {report_id}")
+
+    def _start_listener(self) -> Optional[threading.Event]:
+        if not POLLING_LISTEN or engine.dialect.driver != "psycopg2":
+            return None
+        stop = threading.Event()
+        threading.Thread(target=self._listen, args=(stop,), name="new-data-listener", daemon=True).start()
+        return stop
+
+    def _listen(self, stop: threading.Event):
+        """LISTEN for ingestion's NOTIFY on a dedicated connection and wake the poller."""
+        connection = engine.raw_connection()
         try:
-            current_time = datetime.now(timezone.utc)
-            
-            # Count new records since last check
-            new_records_count = session.query(StoreStatus).filter(
-                StoreStatus.timestamp_utc > self.last_check_time
-            ).count()
-            
-            if new_records_count > 0:
-                print(f"Found {new_records_count} new records since last check")
-                
-                # Generate report
-                try:
-                    report_id = report_service.trigger_report()
-                    self.last_report_id = report_id
-                    print(f"Generated report: {report_id}")
-                except Exception as e:
-                    print(f"Failed to generate report: {e}")
-            else:
-                print("No new data found")
-            
-            # Update last check time
-            self.last_check_time = current_time
-            
+            pg_connection = connection.driver_connection
+            pg_connection.autocommit = True
+            cursor = pg_connection.cursor()
+            cursor.execute(f"LISTEN {NEW_DATA_CHANNEL}")
+            while not stop.is_set():
+                if select.select([pg_connection], [], [], 1.0) == ([], [], []):
+                    continue
+                pg_connection.poll()
+                if pg_connection.notifies:
+                    pg_connection.notifies.clear()
+                    self.notify_new_data()
         except Exception as e:
-            print(f"Error checking for new data: {e}")
+            print(f"New data listener stopped: {e}")
         finally:
-            session.close()
+            # Never hand a LISTENing autocommit connection back to the pool
+            connection.invalidate()
 
 
-# Global polling service instance  
+# Global polling service instance
 polling_service = SimplePollingService()
 
 
@@ -0,0 +1,107 @@
+import os
+import threading
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+# A store counts as changed when one of its report values moved by more than
+# this many minutes (hour columns are compared in minutes); 0 = any change
+REPORT_DELTA_MIN_CHANGE_MINUTES = float(os.getenv("REPORT_DELTA_MIN_CHANGE_MINUTES", "0"))
+
+# Deltas of the same pair are serialized by one of a fixed set of locks
+# (striped by path), so the set does not grow with the number of reports
+_DELTA_LOCK_STRIPES = 64
+_delta_locks = [threading.Lock() for _ in range(_DELTA_LOCK_STRIPES)]
+
+
+def delta_file(base_csv: Path, csv_path: Path) -> Path:
+    """
+    Path of the delta from the report base_csv to the report csv_path at
+    REPORT_DELTA_MIN_CHANGE_MINUTES, computing it the first time it is
+    asked for. The delta is named after the newer report
+    (report_<id>.delta-<base id>.csv), so cache eviction removes it together
+    with that report. Raises ValueError when the reports have different
+    columns (windows).
+    """
+    base_id = base_csv.name[len("report_"):-len(".csv")]
+    output_path = csv_path.with_name(f"{csv_path.name[:-len('.csv')]}.delta-{base_id}.csv")
+    if output_path.exists():
+        return output_path
+
+    with _delta_lock(output_path):
+        if output_path.exists():  # computed while we waited
+            return output_path
+        delta = compute_delta(_read_report(base_csv), _read_report(csv_path), REPORT_DELTA_MIN_CHANGE_MINUTES)
+        # Write aside and rename, so a reader never sees a partial file
+        tmp_path = output_path.with_name(output_path.name + ".tmp")
+        try:
+            delta.to_csv(tmp_path, index=False)
+            os.replace(tmp_path, output_path)
+        finally:
+            tmp_path.unlink(missing_ok=True)
+    return output_path
+
+
+def delta_csv(base_csv: Path, csv_path: Path, min_change: float) -> str:
+    """
+    The delta at another threshold, as CSV text. Not cached: a file per
+    threshold a client sends would pile up on disk.
+    """
+    if min_change < 0:
+        raise ValueError("min_change must not be negative")
+    return compute_delta(_read_report(base_csv), _read_report(csv_path), min_change).to_csv(index=False)
+
+
+def compute_delta(base: pd.DataFrame, report: pd.DataFrame, min_change: float = 0) -> pd.DataFrame:
+    """
+    Stores added, removed or changed from base to report, as a frame of
+    store_id, change ("added", "changed" or "removed") and the report's
+    values (empty for removed stores), ordered by store_id.
+
+    Both reports are joined on sorted store codes: the union of their store
+    ids (as fixed-width strings, which sort far faster than objects) is
+    sorted once, each report's rows are placed by searchsorted, and the
+    value columns of the stores in both are compared as whole arrays.
+    """
+    columns = list(report.columns[1:])
+    if list(base.columns[1:]) != columns:
+        raise ValueError("Reports have different windows, no delta between them")
+
+    base_ids = base["store_id"].to_numpy(dtype=str)
+    report_ids = report["store_id"].to_numpy(dtype=str)
+    store_ids = np.union1d(base_ids, report_ids)
+    base_rows = np.full(len(store_ids), -1, dtype=np.int64)
+    base_rows[np.searchsorted(store_ids, base_ids)] = np.arange(len(base_ids))
+    report_rows = np.full(len(store_ids), -1, dtype=np.int64)
+    report_rows[np.searchsorted(store_ids, report_ids)] = np.arange(len(report_ids))
+
+    in_base, in_report = base_rows >= 0, report_rows >= 0
+    both = in_base & in_report
+    minutes = np.array([60.0 if column.endswith("(in hours)") else 1.0 for column in columns])
+    base_values = base[columns].to_numpy(dtype=float)[base_rows[both]] * minutes
+    report_values = report[columns].to_numpy(dtype=float)[report_rows[both]] * minutes
+    # Tolerance for the float error of the conversion to minutes
+    moved = (np.abs(report_values - base_values) > min_change + 1e-9).any(axis=1) if columns else np.zeros(both.sum(), dtype=bool)
+
+    change = np.full(len(store_ids), "", dtype=object)
+    change[in_report & ~in_base] = "added"
+    change[in_base & ~in_report] = "removed"
+    change[np.flatnonzero(both)[moved]] = "changed"
+    rows = np.flatnonzero(change != "")
+
+    delta = pd.DataFrame({"store_id": store_ids[rows].astype(object), "change": change[rows]})
+    # Object columns, so removed stores are blank and minutes stay integers
+    for column in columns:
+        values = np.full(len(store_ids), "", dtype=object)
+        values[in_report] = report[column].to_numpy(dtype=object)[report_rows[in_report]]
+        delta[column] = values[rows]
+    return delta
+
+
+def _read_report(csv_path: Path) -> pd.DataFrame:
+    return pd.read_csv(csv_path, dtype={"store_id": str}, keep_default_na=False)
+
+
+def _delta_lock(path: Path) -> threading.Lock:
+    return _delta_locks[hash(path) % _DELTA_LOCK_STRIPES]
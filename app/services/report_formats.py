@@ -0,0 +1,73 @@
+import gzip
+import os
+import shutil
+import threading
+from pathlib import Path
+from typing import Dict, Tuple
+
+import pandas as pd
+
+# format -> (media type, file suffix replacing ".csv")
+REPORT_FORMATS: Dict[str, Tuple[str, str]] = {
+    "csv": ("text/csv", ".csv"),
+    "csv.gz": ("application/gzip", ".csv.gz"),
+    "parquet": ("application/vnd.apache.parquet", ".parquet"),
+    "arrow": ("application/vnd.apache.arrow.file", ".arrow"),
+}
+
+# Conversions of the same file are serialized by one of a fixed set of locks
+# (striped by path), so the set does not grow with the number of reports
+_CONVERSION_LOCK_STRIPES = 64
+_conversion_locks = [threading.Lock() for _ in range(_CONVERSION_LOCK_STRIPES)]
+
+
+def report_file(csv_path: Path, fmt: str) -> Path:
+    """
+    Path of a report in the requested format, converting it from the CSV the
+    first time it is asked for. Converted files live next to the CSV and
+    share its name, so later downloads and cache eviction treat them as one
+    report. Raises ValueError for an unknown format or a missing optional
+    dependency (pyarrow for parquet/arrow).
+    """
+    if fmt not in REPORT_FORMATS:
+        raise ValueError(f"Unknown report format '{fmt}', expected one of {tuple(REPORT_FORMATS)}")
+
+    output_path = csv_path.with_name(csv_path.name[:-len(".csv")] + REPORT_FORMATS[fmt][1])
+    if output_path.exists():
+        return output_path
+
+    with _conversion_lock(output_path):
+        if output_path.exists():  # converted while we waited
+            return output_path
+        # Write aside and rename, so a reader never sees a partial file
+        tmp_path = output_path.with_name(output_path.name + ".tmp")
+        try:
+            _convert(csv_path, tmp_path, fmt)
+            os.replace(tmp_path, output_path)
+        finally:
+            tmp_path.unlink(missing_ok=True)
+    return output_path
+
+
+def _convert(csv_path: Path, output_path: Path, fmt: str) -> None:
+    if fmt == "csv.gz":
+        with open(csv_path, "rb") as source, gzip.open(output_path, "wb", compresslevel=6) as target:
+            shutil.copyfileobj(source, target)
+        return
+
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError as e:
+        raise ValueError(f"Report format '{fmt}' requires pyarrow ({e})")
+
+    table = pa.Table.from_pandas(pd.read_csv(csv_path, dtype={"store_id": str}), preserve_index=False)
+    if fmt == "parquet":
+        pq.write_table(table, output_path, compression="zstd")
+    else:
+        with pa.OSFile(str(output_path), "wb") as sink, pa.ipc.new_file(sink, table.schema) as writer:
+            writer.write_table(table)
+
+
+def _conversion_lock(path: Path) -> threading.Lock:
+    return _conversion_locks[hash(path) % _CONVERSION_LOCK_STRIPES]
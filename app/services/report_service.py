@@ -1,69 +1,589 @@
+import asyncio
+import csv
+import hashlib
+import io
+import json
+import multiprocessing
+import os
+import shutil
+import threading
 import uuid
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timedelta, timezone
 from pathlib import Path
-from typing import Dict, Optional
+from typing import Dict, List, Optional, Tuple, Union
 
-import pandas as pd
-from fastapi import BackgroundTasks
+import numpy as np
+from sqlalchemy import func, select, update
 
-from app.models.schemas import ReportInfo
-from app.services.calculator import compute_store_uptime
-from app.services.data_loader import get_current_time_from_data, load_all_data
+from app.database.config import async_engine_enabled, get_async_session, get_db_session
+from app.database.models import ReportJob
+from app.models.schemas import ReportInfo, UptimeResults
+from app.services.backfill_service import BACKFILL_DIR, backfill_steps, check_backfill_supported, write_backfill
+from app.services.calculator import (
+    UPTIME_ENGINE, WINDOWS, Windows, compute_store_uptime, compute_uptime_from_counts, compute_uptime_from_runs,
+    format_windows, parse_windows, window_fields,
+)
+from app.services.data_loader import (
+    StoreRange, get_current_time_from_db, load_all_data, load_data_watermark, load_retention_cutoff, load_store_ids,
+    load_window_counts,
+)
+from app.services.job_queue import ReportWorkerPool, enqueue_job, finish_jobs, record_completed_job
+from app.services.metrics import (
+    count_stage, merge_report_timings, record_report_timings, report_cache_hits, report_duration_seconds, report_stage,
+    report_stage_seconds,
+)
+from app.services.report_delta import REPORT_DELTA_MIN_CHANGE_MINUTES, delta_csv, delta_file
+from app.services.rollup_service import refresh_hourly_rollups, rollup_window_counts
+from app.services.snapshot import DATASET_SNAPSHOT, dataset_snapshot
+from app.services.timeline_service import load_runs_report_data, refresh_status_runs
 
 # Simple module-level state
 REPORTS_DIR = Path("reports")
 REPORTS_DIR.mkdir(parents=True, exist_ok=True)
 
-# Global dictionary to track reports
-_reports: Dict[str, ReportInfo] = {}
+# Where window counts are computed: "pandas" (default) loads the widest window
+# of observations and runs the calculator; "sql" aggregates inside the database;
+# "rollup" reads the incrementally maintained hourly rollup table; "runs"
+# computes UPTIME_ENGINE=business_hours from the per-store status runs.
+REPORT_ENGINE = os.getenv("REPORT_ENGINE", "pandas")
+REPORT_ENGINES = ("pandas", "sql", "rollup", "runs")
 
+# Worker processes for the pandas engine. Above 1, stores are split into
+# contiguous store_id ranges that are loaded and computed in parallel.
+REPORT_WORKERS = int(os.getenv("REPORT_WORKERS", "1"))
+_process_pool: Optional[ProcessPoolExecutor] = None
+_process_pool_size = 0
+_process_pool_lock = threading.Lock()
 
-def trigger_report(background_tasks: BackgroundTasks) -> str:
+# Rows formatted and written per step when saving a report
+REPORT_WRITE_CHUNK_SIZE = int(os.getenv("REPORT_WRITE_CHUNK_SIZE", "50000"))
+# CSV headers name these window lengths in words, as the original 1h/24h/7d
+# report did; other windows use their label, e.g. uptime_last_15m(in minutes)
+CSV_WINDOW_NAMES = {timedelta(hours=1): "hour", timedelta(days=1): "day", timedelta(weeks=1): "week"}
+
+# Disk budget for report CSVs in REPORTS_DIR; least recently used files are
+# deleted once it is exceeded. 0 disables eviction.
+REPORT_CACHE_MAX_BYTES = int(os.getenv("REPORT_CACHE_MAX_BYTES", str(1024 ** 3)))
+_eviction_lock = threading.Lock()
+
+
+def trigger_report(priority: int = 0, windows: Optional[Windows] = None) -> str:
+    """
+    Submit a report to the job queue, reusing work whenever the data has not changed.
+
+    A report is a pure function of the data fingerprint, so a trigger whose
+    fingerprint matches a completed report completes immediately against the
+    existing CSV, and one matching a queued or running job is answered by
+    that job's computation. windows (see calculator.parse_windows) replaces
+    the default 1h/24h/7d report windows. Raises ValueError for windows
+    reaching back past the retention cutoff (see check_retention) and
+    QueueFullError when the queue is full.
+    """
+    current_time = get_current_time_from_db()
+    check_retention(current_time - max(length for _, length in (windows or WINDOWS)))
     report_id = str(uuid.uuid4())
-    
-    report_info = ReportInfo(report_id=report_id, status="running")
-    _reports[report_id] = report_info
-    
-    background_tasks.add_task(generate_report_sync, report_id)
-    
+    window_spec = format_windows(windows) if windows and windows != WINDOWS else None
+    fingerprint = report_fingerprint(windows)
+
+    cached_path = _cached_report_path(fingerprint)
+    if cached_path is not None:
+        # The job's finished_at marks the report as used for eviction
+        record_completed_job(report_id, fingerprint, cached_path, priority, window_spec)
+        report_cache_hits.inc()
+        return report_id
+
+    enqueue_job(report_id, fingerprint, priority, window_spec)
+    worker_pool.notify()
+    return report_id
+
+
+def report_fingerprint(windows: Optional[Windows] = None, backfill: Optional[dict] = None) -> str:
+    """Hash of the data watermark and the settings that change report contents."""
+    key = (load_data_watermark(), UPTIME_ENGINE)
+    if windows and windows != WINDOWS:
+        key += (format_windows(windows),)
+    if backfill is not None:
+        key += ("backfill", backfill["start"], backfill["end"], backfill["step"])
+    return hashlib.sha1(repr(key).encode()).hexdigest()
+
+
+def check_retention(since: datetime, engine: Optional[str] = None) -> None:
+    """
+    Raise ValueError when a report reading observations from since on would
+    need raw observations that retention removed: the pandas and sql
+    engines (and backfills) read only store_status and would silently
+    undercount. rollup and runs keep what retention folded into them.
+    """
+    engine = engine or REPORT_ENGINE
+    if engine in ("rollup", "runs"):
+        return
+    cutoff = load_retention_cutoff()
+    if cutoff is not None and since < cutoff:
+        raise ValueError(
+            f"Window starting {since:%Y-%m-%d %H:%M} reaches before the retention cutoff "
+            f"{cutoff:%Y-%m-%d}; raw observations before it were removed (use REPORT_ENGINE=rollup)"
+        )
+
+
+def trigger_backfill(
+    start: datetime, end: Optional[datetime] = None, step: str = "1h", windows: Optional[Windows] = None,
+    priority: int = 0
+) -> str:
+    """
+    Submit a backfill - every store's uptime at each step from start to end -
+    to the job queue. It is a job like a report: cached by fingerprint,
+    shared by identical submissions and answered by the same workers, but
+    its output is a Parquet dataset in BACKFILL_DIR (see backfill_service).
+    Raises ValueError for an invalid range and QueueFullError when the
+    queue is full.
+    """
+    # Refused here rather than failing in the worker
+    check_backfill_supported()
+    steps = backfill_steps(start, end, step, windows or WINDOWS)
+    check_retention(steps[0] - max(length for _, length in (windows or WINDOWS)), engine="backfill")
+    backfill = {"start": steps[0].isoformat(), "end": steps[-1].isoformat(), "step": step}
+
+    report_id = str(uuid.uuid4())
+    window_spec = format_windows(windows) if windows and windows != WINDOWS else None
+    fingerprint = report_fingerprint(windows, backfill)
+
+    cached_path = _cached_report_path(fingerprint)
+    if cached_path is not None:
+        record_completed_job(report_id, fingerprint, cached_path, priority, window_spec, backfill)
+        report_cache_hits.inc()
+        return report_id
+
+    enqueue_job(report_id, fingerprint, priority, window_spec, backfill)
+    worker_pool.notify()
     return report_id
 
 
 def get_report_info(report_id: str) -> Optional[ReportInfo]:
-    return _reports.get(report_id)
+    session = get_db_session()
+    try:
+        return _report_info(session.get(ReportJob, report_id))
+    finally:
+        session.close()
+
 
+async def get_report_info_async(report_id: str) -> Optional[ReportInfo]:
+    """get_report_info for endpoints on the event loop (async engine, or a worker thread)."""
+    if not async_engine_enabled():
+        return await asyncio.to_thread(get_report_info, report_id)
+    async with get_async_session() as session:
+        return _report_info(await session.get(ReportJob, report_id))
 
-def generate_report_sync(report_id: str) -> None:
+
+def _report_info(job: Optional[ReportJob]) -> Optional[ReportInfo]:
+    if job is None:
+        return None
+    return ReportInfo(
+        report_id=job.report_id,
+        status=job.status,
+        output_csv_path=Path(job.output_csv_path) if job.output_csv_path else None,
+        error_message=job.error_message,
+        priority=job.priority,
+        timestamp=job.finished_at,
+        windows=job.windows,
+        backfill=json.loads(job.backfill) if job.backfill else None,
+        stage_timings=json.loads(job.stage_timings) if job.stage_timings else None,
+    )
+
+
+def _cached_report_path(fingerprint: str) -> Optional[Path]:
+    session = get_db_session()
     try:
-        status_df, menu_hours, store_timezones = load_all_data()
-        
-        current_time = get_current_time_from_data(status_df).to_pydatetime()
-        
-        results = compute_store_uptime(status_df, menu_hours, store_timezones, current_time)
-        
+        paths = session.execute(
+            select(ReportJob.output_csv_path)
+            .where(ReportJob.fingerprint == fingerprint, ReportJob.status == "complete")
+            .order_by(ReportJob.finished_at.desc())
+            .limit(1)
+        ).scalars().all()
+    finally:
+        session.close()
+    if paths and Path(paths[0]).exists():
+        return Path(paths[0])
+    return None
+
+
+def generate_report_sync(report_id: str, fingerprint: str) -> None:
+    """
+    Job handler: compute the report and finish every job waiting on its fingerprint.
+
+    Time spent per stage (query, materialize, compute, serialize, write) is
+    stored with the jobs and exported as metrics. Backfill jobs write their
+    dataset instead of a report CSV.
+    """
+    info = get_report_info(report_id)
+    backfill = info.backfill if info is not None else None
+    if backfill is not None:
+        output_path = BACKFILL_DIR / f"backfill_{report_id}"
+    else:
         output_path = REPORTS_DIR / f"report_{report_id}.csv"
-        _save_results_csv(results, output_path)
-        
-        _reports[report_id].status = "complete"
-        _reports[report_id].output_csv_path = output_path
-            
+    engine = "backfill" if backfill is not None else REPORT_ENGINE
+
+    with record_report_timings() as timings:
+        try:
+            # Checked against REPORT_MAX_WINDOW_DAYS when the job was submitted
+            windows = parse_windows(info.windows, check_limit=False) if info is not None and info.windows else WINDOWS
+            if backfill is not None:
+                steps = backfill_steps(
+                    datetime.fromisoformat(backfill["start"]), datetime.fromisoformat(backfill["end"]), backfill["step"], windows
+                )
+                BACKFILL_DIR.mkdir(parents=True, exist_ok=True)
+                write_backfill(output_path, steps, windows)
+            elif REPORT_WORKERS > 1 and REPORT_ENGINE == "pandas":
+                generate_sharded_report(output_path, REPORT_WORKERS, windows)
+            else:
+                results = compute_report_results(windows=windows)
+                _save_results_csv(results, output_path)
+            status, error_message = "complete", None
+        except Exception as e:
+            status, error_message = "failed", str(e)
+
+    stage_timings = timings.as_dict()
+    _observe_report(stage_timings, status, engine)
+    if status == "failed":
+        finish_jobs(fingerprint, "failed", error_message=error_message, stage_timings=stage_timings)
+        return
+
+    finish_jobs(fingerprint, "complete", output_path, stage_timings=stage_timings)
+    if backfill is None:
+        _write_delta_from_previous(output_path, info.windows if info is not None else None)
+    _evict_reports(keep=output_path)
+    print(f"{'Backfill' if backfill is not None else 'Report'} {report_id} generated in {stage_timings['total']['seconds']:.2f}s: " + ", ".join(
+        f"{stage} {entry['seconds']:.2f}s" for stage, entry in stage_timings.items() if stage != "total"
+    ))
+
+
+def report_delta(since: str, min_change: Optional[float] = None) -> Optional[Tuple[str, Union[Path, str]]]:
+    """
+    Delta from the completed report since to the newest completed report
+    with the same windows: (newest report id, delta). The delta is a cached
+    CSV file at the default threshold (report_delta.delta_file), or CSV
+    text for another min_change. None for an unknown report id. Raises
+    ValueError for a report that is not complete, and FileNotFoundError
+    when either report was evicted from the cache.
+    """
+    info = get_report_info(since)
+    if info is None:
+        return None
+    if info.backfill is not None:
+        raise ValueError("since is a backfill, not a report")
+    if info.status == "expired":
+        raise FileNotFoundError(info.output_csv_path)
+    if info.status != "complete":
+        raise ValueError(f"since report is {info.status}, deltas start from a complete report")
+
+    latest_id, latest_path = _latest_report(info.windows)
+    if not info.output_csv_path.exists() or latest_path is None or not latest_path.exists():
+        raise FileNotFoundError(info.output_csv_path)
+    if min_change is None or min_change == REPORT_DELTA_MIN_CHANGE_MINUTES:
+        return latest_id, delta_file(info.output_csv_path, latest_path)
+    return latest_id, delta_csv(info.output_csv_path, latest_path, min_change)
+
+
+def _latest_report(windows: Optional[str], exclude: Optional[Path] = None) -> Tuple[Optional[str], Optional[Path]]:
+    """(report id, CSV path) of the newest completed report with these windows, optionally skipping one CSV."""
+    conditions = [
+        ReportJob.status == "complete",
+        ReportJob.backfill.is_(None),
+        ReportJob.windows == windows if windows is not None else ReportJob.windows.is_(None),
+    ]
+    if exclude is not None:
+        conditions.append(ReportJob.output_csv_path != str(exclude))
+    session = get_db_session()
+    try:
+        row = session.execute(
+            select(ReportJob.report_id, ReportJob.output_csv_path)
+            .where(*conditions)
+            .order_by(ReportJob.finished_at.desc())
+            .limit(1)
+        ).first()
+    finally:
+        session.close()
+    return (row.report_id, Path(row.output_csv_path)) if row is not None else (None, None)
+
+
+def _write_delta_from_previous(output_path: Path, windows: Optional[str]) -> None:
+    # Consumers polling GET /get_report_delta?since=<previous report> get a ready file
+    _, previous_path = _latest_report(windows, exclude=output_path)
+    if previous_path is None or not previous_path.exists():
+        return
+    try:
+        delta_file(previous_path, output_path)
     except Exception as e:
-        _reports[report_id].status = "failed"
-        _reports[report_id].error_message = str(e)
+        print(f"Delta against {previous_path.name} failed: {e}")
+
+
+def _observe_report(stage_timings: Dict[str, Dict[str, float]], status: str, engine: str) -> None:
+    for stage, entry in stage_timings.items():
+        if stage != "total":
+            report_stage_seconds.observe(entry["seconds"], stage=stage, engine=engine)
+    report_duration_seconds.observe(stage_timings["total"]["seconds"], engine=engine, status=status)
+
+
+def _evict_reports(keep: Path) -> None:
+    """
+    Delete the least recently used reports and backfills until REPORTS_DIR
+    and BACKFILL_DIR together fit in REPORT_CACHE_MAX_BYTES. A report is its
+    CSV plus any converted formats and deltas next to it (see
+    report_formats), evicted together; a backfill is its dataset directory.
+    Jobs still pointing at a deleted output are marked expired.
+
+    Recency is the newest job answered by an output (cache hits record a
+    completed job), not file times: a served file's mtime is its
+    Last-Modified and must not change.
+    """
+    if REPORT_CACHE_MAX_BYTES <= 0:
+        return
+
+    last_used = _last_used_outputs()
+    with _eviction_lock:
+        # {job output path: (bytes, last used, paths to delete)}
+        groups = {}
+        # report_<id>.csv, report_<id>.csv.gz, report_<id>.parquet, ... grouped by report_<id>
+        for path in REPORTS_DIR.glob("report_*"):
+            if ".part" in path.name or path.name.endswith(".tmp"):
+                continue
+            try:
+                stat = path.stat()
+            except FileNotFoundError:
+                continue  # evicted by another process
+            output = str(REPORTS_DIR / f"{path.name.split('.')[0]}.csv")
+            size, used, paths = groups.get(output, (0, 0.0, []))
+            groups[output] = (size + stat.st_size, last_used.get(output, max(used, stat.st_mtime)), paths + [path])
+        for path in BACKFILL_DIR.glob("backfill_*"):
+            if path.name.endswith(".tmp") or not path.is_dir():
+                continue  # .tmp: being written
+            stats = [file.stat() for file in path.rglob("*.parquet")]
+            groups[str(path)] = (
+                sum(stat.st_size for stat in stats),
+                last_used.get(str(path), max((stat.st_mtime for stat in stats), default=0.0)),
+                [path],
+            )
+
+        total = sum(size for size, _, _ in groups.values())
+        evicted = []
+        for output, (size, _, paths) in sorted(groups.items(), key=lambda item: item[1][1]):
+            if total <= REPORT_CACHE_MAX_BYTES:
+                break
+            if keep in paths:
+                continue
+            for path in paths:
+                if path.is_dir():
+                    shutil.rmtree(path, ignore_errors=True)
+                else:
+                    path.unlink(missing_ok=True)
+            evicted.append(output)
+            total -= size
+
+    if not evicted:
+        return
+    session = get_db_session()
+    try:
+        session.execute(
+            update(ReportJob)
+            .where(ReportJob.output_csv_path.in_(evicted), ReportJob.status == "complete")
+            .values(status="expired")
+        )
+        session.commit()
+    finally:
+        session.close()
+    print(f"Evicted {len(evicted)} cached report(s)/backfill(s) over the {REPORT_CACHE_MAX_BYTES:,} byte budget")
+
+
+def _last_used_outputs() -> Dict[str, float]:
+    """{output path: epoch seconds of the newest completed job answered by it}."""
+    session = get_db_session()
+    try:
+        rows = session.execute(
+            select(ReportJob.output_csv_path, func.max(ReportJob.finished_at))
+            .where(ReportJob.status == "complete", ReportJob.output_csv_path.is_not(None))
+            .group_by(ReportJob.output_csv_path)
+        ).all()
+    finally:
+        session.close()
+    # SQLite hands back naive UTC datetimes
+    return {
+        path: (finished_at if finished_at.tzinfo is not None else finished_at.replace(tzinfo=timezone.utc)).timestamp()
+        for path, finished_at in rows if finished_at is not None
+    }
+
+
+def compute_report_results(
+    engine: Optional[str] = None,
+    current_time: Optional[datetime] = None,
+    store_range: Optional[StoreRange] = None,
+    windows: Windows = WINDOWS
+) -> UptimeResults:
+    engine = engine or REPORT_ENGINE
+    # Unsharded pandas reports read the warm snapshot when it holds their window
+    view = dataset_snapshot.refresh() if engine == "pandas" and store_range is None and DATASET_SNAPSHOT else None
+    if current_time is None:
+        current_time = view.current_time.to_pydatetime() if view is not None else get_current_time_from_db().to_pydatetime()
+    # Also checked here: retention may have run since the report was queued
+    check_retention(current_time - max(length for _, length in windows), engine)
+
+    if engine == "pandas":
+        # Only observations inside the widest window can affect a report
+        since = current_time - max(length for _, length in windows)
+        if view is not None and view.covers(since):
+            status_df, menu_hours, store_timezones, known_stores = view.report_data(since)
+        else:
+            status_df, menu_hours, store_timezones = load_all_data(since=since, store_range=store_range)
+            known_stores = load_store_ids(store_range)
+        with report_stage("compute"):
+            results = compute_store_uptime(
+                status_df, menu_hours, store_timezones, current_time, known_stores=known_stores, windows=windows
+            )
+        count_stage("compute", stores=len(results))
+        return results
+
+    if store_range is not None:
+        raise ValueError(f"REPORT_ENGINE={engine} does not support sharding")
+
+    if engine in ("sql", "rollup") and UPTIME_ENGINE == "business_hours":
+        raise ValueError(f"REPORT_ENGINE={engine} only supports the observation-counting uptime engines")
+
+    if engine == "runs":
+        if UPTIME_ENGINE != "business_hours":
+            raise ValueError("REPORT_ENGINE=runs only supports UPTIME_ENGINE=business_hours")
+        with report_stage("query"):  # folds new observations into the status runs
+            refresh_status_runs()
+        runs, menu_hours, store_timezones, known_stores = load_runs_report_data(current_time, windows)
+        with report_stage("compute"):
+            results = compute_uptime_from_runs(
+                runs, menu_hours, store_timezones, current_time, known_stores=known_stores, windows=windows
+            )
+        count_stage("compute", stores=len(results))
+        return results
+
+    if engine == "sql":
+        store_ids, counts = load_window_counts(current_time, windows)
+    elif engine == "rollup":
+        with report_stage("query"):  # folds new observations into the rollup table
+            refresh_hourly_rollups()
+        store_ids, counts = rollup_window_counts(current_time, windows)
+    else:
+        raise ValueError(f"Unknown report engine '{engine}', expected one of {REPORT_ENGINES}")
+
+    with report_stage("compute"):
+        results = compute_uptime_from_counts(store_ids, counts, windows)
+    count_stage("compute", stores=len(results))
+    return results
+
+
+def generate_sharded_report(output_path: Path, workers: int, windows: Windows = WINDOWS) -> None:
+    """
+    Compute a report with the pandas engine across a pool of worker processes.
+
+    The sorted store ids are cut into one contiguous range per worker; each
+    worker loads only its range, computes it and writes a partial CSV. Since
+    the ranges are ordered, the final sorted CSV is the parts streamed back
+    to back with a single header. Stage timings of the shards are added up,
+    so they are worker seconds rather than wall time.
+    """
+    current_time = get_current_time_from_db().to_pydatetime()
+    shards = [ids for ids in np.array_split(np.array(load_store_ids(), dtype=object), workers) if len(ids)]
+    part_paths = [output_path.with_name(f"{output_path.stem}.part{i}.csv") for i in range(len(shards))]
+
+    try:
+        pool = _get_process_pool(workers)
+        futures = [
+            pool.submit(_compute_shard, current_time, (ids[0], ids[-1]), part_path, windows)
+            for ids, part_path in zip(shards, part_paths)
+        ]
+        timings = [future.result() for future in futures]
+        with report_stage("write"):
+            _merge_csv_parts(part_paths, output_path, windows)
+        for shard_timings in timings:
+            merge_report_timings(shard_timings)
+    finally:
+        for part_path in part_paths:
+            part_path.unlink(missing_ok=True)
+
+
+def _compute_shard(
+    current_time: datetime, store_range: StoreRange, output_path: Path, windows: Windows
+) -> Dict[str, Dict[str, float]]:
+    """Worker-process entry point: compute one store range, write it as CSV and return its stage timings."""
+    with record_report_timings() as timings:
+        results = compute_report_results("pandas", current_time, store_range, windows)
+        _save_results_csv(results, output_path)
+    stages = timings.as_dict()
+    del stages["total"]
+    return stages
+
+
+def _merge_csv_parts(part_paths: List[Path], output_path: Path, windows: Windows) -> None:
+    if not part_paths:
+        empty = {field: np.zeros(0) for field in window_fields(windows)}
+        _save_results_csv(UptimeResults(np.zeros(0, dtype=object), **empty), output_path)
+        return
+
+    with open(output_path, "wb") as output:
+        for i, part_path in enumerate(part_paths):
+            with open(part_path, "rb") as part:
+                header = part.readline()
+                if i == 0:
+                    output.write(header)
+                shutil.copyfileobj(part, output)
+
+
+def _get_process_pool(workers: int) -> ProcessPoolExecutor:
+    global _process_pool, _process_pool_size
+    with _process_pool_lock:
+        if _process_pool is None or _process_pool_size != workers:
+            if _process_pool is not None:
+                _process_pool.shutdown()
+            # spawn: workers must not inherit the parent's threads or pooled DB connections
+            _process_pool = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"))
+            _process_pool_size = workers
+        return _process_pool
 
 
 def _save_results_csv(results, output_path):
-    rows = []
-    for result in results:
-        rows.append({
-            "store_id": result.store_id,
-            "uptime_last_hour(in minutes)": result.uptime_minutes_1h,
-            "uptime_last_day(in hours)": result.uptime_hours_24h,
-            "uptime_last_week(in hours)": result.uptime_hours_7d,
-            "downtime_last_hour(in minutes)": result.downtime_minutes_1h,
-            "downtime_last_day(in hours)": result.downtime_hours_24h,
-            "downtime_last_week(in hours)": result.downtime_hours_7d,
-        })
-    
-    df = pd.DataFrame(rows)
-    df = df.sort_values("store_id")
-    df.to_csv(output_path, index=False)
\ No newline at end of file
+    """
+    Write report rows sorted by store_id, streaming REPORT_WRITE_CHUNK_SIZE
+    rows at a time so memory stays flat however many stores there are.
+    Accepts UptimeResults or, for older callers, WindowResults.
+    """
+    if not isinstance(results, UptimeResults):
+        results = UptimeResults.from_window_results(results)
+
+    with report_stage("serialize"):
+        order = np.argsort(results.store_ids, kind="stable")
+        columns = [results.store_ids] + list(results.columns.values())
+    # Each chunk is formatted into a buffer, then written, so the two are timed apart
+    buffer = io.StringIO()
+    writer = csv.writer(buffer, lineterminator="\n")
+    written = 0
+    with open(output_path, "w", newline="") as output:
+        writer.writerow(["store_id"] + [_csv_header(field) for field in results.fields])
+        for start in range(0, max(len(order), 1), REPORT_WRITE_CHUNK_SIZE):
+            with report_stage("serialize"):
+                rows = order[start:start + REPORT_WRITE_CHUNK_SIZE]
+                writer.writerows(zip(*(column[rows].tolist() for column in columns)))
+                text = buffer.getvalue()
+                buffer.seek(0)
+                buffer.truncate()
+            with report_stage("write"):
+                output.write(text)
+                written += len(text)
+        with report_stage("write"):
+            output.flush()
+    count_stage("serialize", rows=len(order))
+    count_stage("write", bytes=written)
+
+
+def _csv_header(field: str) -> str:
+    """CSV header of a result column, e.g. uptime_hours_24h -> uptime_last_day(in hours)."""
+    kind, unit, label = field.split("_", 2)
+    (_, length), = parse_windows(label, check_limit=False)
+    return f"{kind}_last_{CSV_WINDOW_NAMES.get(length, label)}(in {unit})"
+
+
+# Report job workers for this process, started by the API's lifespan or report_worker.py
+worker_pool = ReportWorkerPool(generate_report_sync)
@@ -0,0 +1,168 @@
+import csv
+import gzip
+import os
+from datetime import timedelta
+from pathlib import Path
+from typing import Optional, Tuple
+
+import pandas as pd
+from sqlalchemy import delete, func, select
+
+from app.database.config import dialect_insert, engine, get_db_session
+from app.database.ingestion import bump_data_version
+from app.database.models import RetentionCutoff, StoreStatus
+from app.database.partitions import PARTITION_SPAN, drop_partition, is_partitioned, list_partitions, week_start
+from app.services.data_loader import get_current_time_from_db, load_retention_cutoff
+from app.services.rollup_service import refresh_hourly_rollups
+from app.services.timeline_service import refresh_status_runs
+
+# Raw observations older than this many days before the newest one are
+# downsampled into store_status_hourly and removed; 0 keeps everything
+STORE_STATUS_RETENTION_DAYS = int(os.getenv("STORE_STATUS_RETENTION_DAYS", "0"))
+# Removed observations are first written here as gzipped CSV, one file per week; empty to just drop them
+STORE_STATUS_ARCHIVE_DIR = os.getenv("STORE_STATUS_ARCHIVE_DIR", "")
+# Rows removed per DELETE when store_status is not partitioned
+RETENTION_DELETE_BATCH_SIZE = int(os.getenv("RETENTION_DELETE_BATCH_SIZE", "50000"))
+# Shortest horizon that keeps the default 7 day report window in raw observations
+MIN_RETENTION_DAYS = 7
+
+
+def apply_retention(days: Optional[int] = None) -> Tuple[Optional[pd.Timestamp], int]:
+    """
+    Downsample and remove store_status observations older than the horizon.
+
+    The cutoff is the start of the week (UTC) `days` before the newest
+    observation, so it always falls on a partition boundary. Then:
+    1. the cutoff is recorded; from then on ingestion skips older rows,
+       which the hourly summary already accounts for
+    2. every remaining observation is folded into store_status_hourly and
+       store_status_runs
+    3. observations before the cutoff are archived (STORE_STATUS_ARCHIVE_DIR)
+       and removed: whole weekly partitions are dropped on partitioned
+       PostgreSQL, other databases delete the range in batches
+    Re-running is safe, e.g. after a crash between steps. Returns the cutoff
+    (None when retention is off) and the number of observations removed.
+    """
+    days = STORE_STATUS_RETENTION_DAYS if days is None else days
+    if days <= 0:
+        return None, 0
+    if days < MIN_RETENTION_DAYS:
+        raise ValueError(f"Retention of {days} days would remove observations inside the {MIN_RETENTION_DAYS} day report window")
+
+    cutoff = week_start(get_current_time_from_db() - timedelta(days=days))
+    previous = load_retention_cutoff()
+    if previous is not None and previous > cutoff:
+        cutoff = previous  # the cutoff never moves back
+    _record_cutoff(cutoff)
+
+    folded = refresh_hourly_rollups()
+    if folded:
+        print(f"Folded {folded:,} observations into store_status_hourly")
+    folded = refresh_status_runs()
+    if folded:
+        print(f"Folded {folded:,} observations into store_status_runs")
+
+    with engine.connect() as conn:
+        partitioned = is_partitioned(conn)
+    removed = _drop_partitions(cutoff) if partitioned else _delete_range(cutoff)
+    if removed:
+        session = get_db_session()
+        try:
+            bump_data_version(session, "store_status")
+            session.commit()
+        finally:
+            session.close()
+    print(f"Retention: removed {removed:,} observations before {cutoff:%Y-%m-%d} (kept in store_status_hourly)")
+    return cutoff, removed
+
+
+def _record_cutoff(cutoff: pd.Timestamp) -> None:
+    session = get_db_session()
+    try:
+        stmt = dialect_insert(session.get_bind())(RetentionCutoff).values(name="store_status", cutoff_utc=cutoff.to_pydatetime())
+        stmt = stmt.on_conflict_do_update(index_elements=["name"], set_={"cutoff_utc": stmt.excluded.cutoff_utc})
+        session.execute(stmt)
+        session.commit()
+    finally:
+        session.close()
+
+
+def _drop_partitions(cutoff: pd.Timestamp) -> int:
+    """Archive and drop every partition that ends at or before the cutoff, one transaction each."""
+    removed = 0
+    with engine.connect() as conn:
+        expired = [(name, lower, upper) for name, lower, upper in list_partitions(conn) if upper <= cutoff]
+    for name, lower, upper in expired:
+        with engine.begin() as conn:
+            rows = _archive_week(conn, lower, upper)
+            if rows is None:
+                rows = conn.execute(select(func.count()).select_from(StoreStatus).where(
+                    StoreStatus.timestamp_utc >= lower.to_pydatetime(), StoreStatus.timestamp_utc < upper.to_pydatetime()
+                )).scalar_one()
+            drop_partition(conn, name)
+        removed += rows
+        print(f"  Dropped partition {name} ({rows:,} observations)")
+    return removed
+
+
+def _delete_range(cutoff: pd.Timestamp) -> int:
+    """Archive the weeks before the cutoff, then delete them in RETENTION_DELETE_BATCH_SIZE batches."""
+    with engine.connect() as conn:
+        oldest = conn.execute(select(func.min(StoreStatus.timestamp_utc))).scalar_one()
+    if oldest is None or week_start(oldest) >= cutoff:
+        return 0
+
+    if STORE_STATUS_ARCHIVE_DIR:
+        lower = week_start(oldest)
+        while lower < cutoff:
+            with engine.connect() as conn:
+                _archive_week(conn, lower, lower + PARTITION_SPAN)
+            lower += PARTITION_SPAN
+
+    removed = 0
+    expired_ids = (
+        select(StoreStatus.id)
+        .where(StoreStatus.timestamp_utc < cutoff.to_pydatetime())
+        .limit(RETENTION_DELETE_BATCH_SIZE)
+        .scalar_subquery()
+    )
+    while True:
+        with engine.begin() as conn:
+            deleted = conn.execute(delete(StoreStatus).where(StoreStatus.id.in_(expired_ids))).rowcount
+        removed += deleted
+        if deleted < RETENTION_DELETE_BATCH_SIZE:
+            return removed
+
+
+def _archive_week(conn, lower: pd.Timestamp, upper: pd.Timestamp) -> Optional[int]:
+    """
+    Write one week of observations to STORE_STATUS_ARCHIVE_DIR as
+    store_status_YYYYMMDD.csv.gz (the ingestion file format). Returns the
+    rows written, or None when archiving is off.
+    """
+    if not STORE_STATUS_ARCHIVE_DIR:
+        return None
+    path = Path(STORE_STATUS_ARCHIVE_DIR) / f"store_status_{lower:%Y%m%d}.csv.gz"
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_name(path.name + ".tmp")
+
+    result = conn.execution_options(stream_results=True).execute(
+        select(StoreStatus.store_id, StoreStatus.status, StoreStatus.timestamp_utc)
+        .where(StoreStatus.timestamp_utc >= lower.to_pydatetime(), StoreStatus.timestamp_utc < upper.to_pydatetime())
+    )
+    rows = 0
+    with gzip.open(tmp_path, "wt", newline="") as output:
+        writer = csv.writer(output, lineterminator="\n")
+        writer.writerow(["store_id", "status", "timestamp_utc"])
+        for chunk in result.partitions(RETENTION_DELETE_BATCH_SIZE):
+            writer.writerows((store_id, status, _utc_text(timestamp)) for store_id, status, timestamp in chunk)
+            rows += len(chunk)
+    os.replace(tmp_path, path)
+    return rows
+
+
+def _utc_text(timestamp) -> str:
+    # SQLite hands back naive datetimes, which are stored as UTC
+    ts = pd.Timestamp(timestamp)
+    ts = ts.tz_localize("UTC") if ts.tzinfo is None else ts.tz_convert("UTC")
+    return ts.strftime("%Y-%m-%d %H:%M:%S.%f UTC")
@@ -0,0 +1,195 @@
+import os
+import threading
+from datetime import datetime, timedelta
+from typing import Dict, List, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+from sqlalchemy import and_, case, func, or_, select
+
+from app.database.config import current_engine, dialect_insert, get_db_session
+from app.database.models import RollupWatermark, StoreStatus, StoreStatusHourly
+from app.services.data_loader import load_store_ids
+from app.services.metrics import count_stage, report_stage
+
+HOURLY_ROLLUP = "store_status_hourly"
+# New store_status rows folded into the rollup (and the status runs) per transaction
+ROLLUP_BATCH_SIZE = int(os.getenv("ROLLUP_BATCH_SIZE", "100000"))
+# The upsert adds counts, so a range folded twice is counted twice: refreshes
+# in this process take turns here, other processes wait on the watermark row
+_refresh_lock = threading.Lock()
+
+
+def refresh_hourly_rollups() -> int:
+    """
+    Fold store_status rows added since the last run into store_status_hourly.
+
+    New rows are read by id past the stored watermark, counted per
+    (store, hour) and added onto the existing buckets with an upsert; the
+    watermark moves in the same transaction, so a crash never double counts,
+    and is read locked, so neither does a concurrent refresh. Cost is proportional to the new rows, not the table. Assumes ids become
+    visible in order: every store_status writer (file ingestion and the
+    observation flushers) holds ingestion's write lock until it commits,
+    see ingestion._merge_staged_status.
+
+    Returns the number of observations folded in.
+    """
+    processed = 0
+    with _refresh_lock:
+        while True:
+            session = get_db_session()
+            try:
+                watermark = lock_watermark(session, HOURLY_ROLLUP)
+                rows = session.execute(
+                    select(StoreStatus.id, StoreStatus.store_id, StoreStatus.timestamp_utc, StoreStatus.status)
+                    .where(StoreStatus.id > watermark.last_id)
+                    .order_by(StoreStatus.id)
+                    .limit(ROLLUP_BATCH_SIZE)
+                ).all()
+                if not rows:
+                    session.commit()
+                    return processed
+
+                batch = pd.DataFrame(rows, columns=["id", "store_id", "timestamp_utc", "status"])
+                _upsert_hourly_counts(session, batch)
+                watermark.last_id = int(batch["id"].max())
+                session.commit()
+                processed += len(batch)
+            except Exception:
+                session.rollback()
+                raise
+            finally:
+                session.close()
+
+
+def lock_watermark(session, name: str) -> RollupWatermark:
+    """
+    The watermark row name, created at 0 if missing, locked until the
+    session commits. The insert never conflicts with a concurrent first run
+    (do nothing), and on SQLite it also takes the database write lock, which
+    stands in for FOR UPDATE there.
+    """
+    session.execute(
+        dialect_insert(session.get_bind())(RollupWatermark)
+        .values(name=name, last_id=0)
+        .on_conflict_do_nothing(index_elements=[RollupWatermark.name])
+    )
+    return session.get(RollupWatermark, name, with_for_update=True, populate_existing=True)
+
+
+def _upsert_hourly_counts(session, batch: pd.DataFrame) -> None:
+    hourly = (
+        batch.assign(
+            hour_utc=pd.to_datetime(batch["timestamp_utc"], utc=True).dt.floor("h"),
+            active=(batch["status"] == "active").astype(np.int64),
+        )
+        .groupby(["store_id", "hour_utc"], as_index=False)
+        .agg(active_count=("active", "sum"), total_count=("active", "size"))
+    )
+    records = [
+        {
+            "store_id": store_id,
+            "hour_utc": hour_utc.to_pydatetime(),
+            "active_count": int(active_count),
+            "total_count": int(total_count),
+        }
+        for store_id, hour_utc, active_count, total_count in hourly.itertuples(index=False)
+    ]
+
+    stmt = dialect_insert(session.get_bind())(StoreStatusHourly)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[StoreStatusHourly.store_id, StoreStatusHourly.hour_utc],
+        set_={
+            "active_count": StoreStatusHourly.active_count + stmt.excluded.active_count,
+            "total_count": StoreStatusHourly.total_count + stmt.excluded.total_count,
+        },
+    )
+    # One statement executed over all buckets (executemany)
+    session.execute(stmt, records)
+
+
+def rollup_window_counts(
+    current_time: datetime,
+    windows: Sequence[Tuple[str, timedelta]]
+) -> Tuple[List[str], Dict[str, Tuple[np.ndarray, np.ndarray]]]:
+    """
+    Per-store active/total counts per window, read from the hourly rollup.
+
+    Whole hours inside a window come from store_status_hourly (at most 168
+    rows per store for a week); only the partial hours at the window edges
+    are read from store_status, so the result matches the raw-data engines
+    exactly. Same return shape as data_loader.load_window_counts.
+    """
+    current_hour = _floor_hour(current_time)
+
+    rollup_columns = []
+    raw_columns = []
+    raw_ranges = [StoreStatus.timestamp_utc.between(current_hour, current_time)]
+    is_active = StoreStatus.status == "active"
+    for label, length in windows:
+        start = current_time - length
+        first_full_hour = _ceil_hour(start)
+
+        if first_full_hour < current_hour:
+            in_rollup = and_(StoreStatusHourly.hour_utc >= first_full_hour, StoreStatusHourly.hour_utc < current_hour)
+            # Partial hour before the first full one, plus the current hour so far
+            in_raw = or_(
+                and_(StoreStatus.timestamp_utc >= start, StoreStatus.timestamp_utc < first_full_hour),
+                StoreStatus.timestamp_utc.between(current_hour, current_time),
+            )
+            raw_ranges.append(and_(StoreStatus.timestamp_utc >= start, StoreStatus.timestamp_utc < first_full_hour))
+        else:
+            # Window shorter than the hour boundaries around it: read it raw
+            in_rollup = None
+            in_raw = StoreStatus.timestamp_utc.between(start, current_time)
+            raw_ranges.append(in_raw)
+
+        if in_rollup is not None:
+            rollup_columns.append(func.sum(case((in_rollup, StoreStatusHourly.active_count), else_=0)).label(f"active_{label}"))
+            rollup_columns.append(func.sum(case((in_rollup, StoreStatusHourly.total_count), else_=0)).label(f"total_{label}"))
+        raw_columns.append(func.sum(case((and_(in_raw, is_active), 1), else_=0)).label(f"active_{label}"))
+        raw_columns.append(func.sum(case((in_raw, 1), else_=0)).label(f"total_{label}"))
+
+    earliest_hour = min(_ceil_hour(current_time - length) for _, length in windows)
+    with current_engine().connect() as conn:
+        frames = [_grouped_frame(conn, (
+            select(StoreStatus.store_id, *raw_columns)
+            .where(or_(*raw_ranges))
+            .group_by(StoreStatus.store_id)
+        ), raw_columns)]
+        if rollup_columns:
+            frames.append(_grouped_frame(conn, (
+                select(StoreStatusHourly.store_id, *rollup_columns)
+                .where(StoreStatusHourly.hour_utc >= earliest_hour, StoreStatusHourly.hour_utc < current_hour)
+                .group_by(StoreStatusHourly.store_id)
+            ), rollup_columns))
+
+    store_ids = load_store_ids()
+    with report_stage("materialize"):
+        totals = pd.concat(frames).groupby(level=0).sum().reindex(store_ids, fill_value=0)
+
+    counts = {}
+    for label, _ in windows:
+        counts[label] = (
+            totals[f"active_{label}"].to_numpy(dtype=np.int64),
+            totals[f"total_{label}"].to_numpy(dtype=np.int64),
+        )
+    return store_ids, counts
+
+
+def _grouped_frame(conn, stmt, columns) -> pd.DataFrame:
+    with report_stage("query"):
+        rows = conn.execute(stmt).all()
+    count_stage("query", rows=len(rows))
+    with report_stage("materialize"):
+        frame = pd.DataFrame(rows, columns=["store_id"] + [c.name for c in columns])
+        return frame.set_index("store_id").astype(np.int64)
+
+
+def _floor_hour(value: datetime) -> datetime:
+    return value.replace(minute=0, second=0, microsecond=0)
+
+
+def _ceil_hour(value: datetime) -> datetime:
+    floored = _floor_hour(value)
+    return floored if floored == value else floored + timedelta(hours=1)
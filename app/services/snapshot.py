@@ -0,0 +1,296 @@
+import os
+import sys
+import threading
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from app.database.config import use_report_pool
+from app.services.data_loader import (
+    load_data_versions, load_retention_cutoff, load_status_arrays, load_status_bounds, load_store_ids,
+    load_store_reference, status_frame,
+)
+from app.services.metrics import count_stage, report_stage
+
+# Keep a warm in-process copy of recent observations for REPORT_ENGINE=pandas
+# reports and the single-store endpoint instead of reading them per request
+DATASET_SNAPSHOT = os.getenv("DATASET_SNAPSHOT", "true").lower() in ("1", "true", "yes")
+# Days of observations the snapshot holds; reports with a longer window read the database
+DATASET_SNAPSHOT_DAYS = int(os.getenv("DATASET_SNAPSHOT_DAYS", "7"))
+
+
+class SnapshotView:
+    """
+    Immutable state of the snapshot at one watermark. Arrays are views into
+    the snapshot's buffers that later refreshes never write to.
+    """
+
+    def __init__(
+        self,
+        codes: np.ndarray,
+        timestamps: np.ndarray,
+        active: np.ndarray,
+        store_ids: List[str],
+        menu_hours: pd.DataFrame,
+        timezones: Dict[str, str],
+        current_time: pd.Timestamp,
+        horizon: pd.Timestamp,
+        watermark: Tuple,
+    ):
+        self.codes = codes
+        self.timestamps = timestamps
+        self.active = active
+        self.store_ids = store_ids
+        self.menu_hours = menu_hours
+        self.timezones = timezones
+        self.current_time = current_time
+        self.horizon = horizon
+        self.watermark = watermark
+        self._categories: Optional[pd.Index] = None
+        self._store_index: Optional[Dict[str, int]] = None
+        self._store_rows: Optional[Tuple[np.ndarray, np.ndarray]] = None
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self.codes)
+
+    @property
+    def nbytes(self) -> int:
+        """Memory held for observations (13 bytes each) plus the store id dictionary."""
+        strings = sum(sys.getsizeof(store_id) for store_id in self.store_ids)
+        return self.codes.nbytes + self.timestamps.nbytes + self.active.nbytes + strings
+
+    def covers(self, since: datetime) -> bool:
+        """Whether every observation at or after since is in the snapshot."""
+        return pd.Timestamp(since) >= self.horizon
+
+    def report_data(self, since: datetime) -> Tuple[pd.DataFrame, pd.DataFrame, Dict[str, str], List[str]]:
+        """
+        (status_df, menu_hours, timezones, known store ids) for a report
+        reading observations at or after since, in the columnar loader's shapes.
+        """
+        with report_stage("materialize"):
+            codes, timestamps, active = self.codes, self.timestamps, self.active
+            if to_micros(since) > to_micros(self.horizon):
+                keep = timestamps >= to_micros(since)
+                codes, timestamps, active = codes[keep], timestamps[keep], active[keep]
+            status_df = status_frame(codes, timestamps, active, self._store_categories())
+        count_stage("query", rows=len(status_df))
+        return status_df, self.menu_hours, self.timezones, self.store_ids
+
+    def store_data(self, store_id: str, since: datetime) -> Optional[Tuple[pd.DataFrame, pd.DataFrame, Dict[str, str]]]:
+        """One store's observations since a time, menu hours and timezone; None for an unknown store."""
+        code = self._index().get(store_id)
+        if code is None:
+            return None
+        order, bounds = self._rows_by_store()
+        rows = order[bounds[code]:bounds[code + 1]]
+        rows = rows[self.timestamps[rows] >= to_micros(since)]
+        status_df = status_frame(
+            np.zeros(len(rows), dtype=np.int32), self.timestamps[rows], self.active[rows], pd.Index([store_id], dtype=object)
+        )
+        menu_hours = self.menu_hours[self.menu_hours["store_id"] == store_id].reset_index(drop=True)
+        timezones = {store_id: self.timezones[store_id]} if store_id in self.timezones else {}
+        return status_df, menu_hours, timezones
+
+    def _store_categories(self) -> pd.Index:
+        with self._lock:
+            if self._categories is None:
+                self._categories = pd.Index(self.store_ids, dtype=object)
+            return self._categories
+
+    def _index(self) -> Dict[str, int]:
+        with self._lock:
+            if self._store_index is None:
+                self._store_index = {store_id: code for code, store_id in enumerate(self.store_ids)}
+            return self._store_index
+
+    def _rows_by_store(self) -> Tuple[np.ndarray, np.ndarray]:
+        # Built on the first single-store query of each view: rows grouped by store code
+        with self._lock:
+            if self._store_rows is None:
+                order = np.argsort(self.codes, kind="stable")
+                bounds = np.searchsorted(self.codes[order], np.arange(len(self.store_ids) + 1))
+                self._store_rows = (order, bounds)
+            return self._store_rows
+
+
+class DatasetSnapshot:
+    """
+    Long-lived, compact copy of the data reports read, shared by every
+    report and single-store query of this process.
+
+    Observations since the horizon (DATASET_SNAPSHOT_DAYS before the newest
+    one, never before the retention cutoff) are three parallel arrays in
+    arrival order: store code (int32 into a dictionary of every known
+    store), epoch microseconds (int64) and active flag (bool). The engines
+    sort what they use. refresh() probes the newest id/timestamp and the
+    ingestion versions, then only reads store_status rows past the last id
+    it holds, re-reads menu hours and timezones when their version changes,
+    and reloads everything after a reset.
+    """
+
+    def __init__(self, days: int = DATASET_SNAPSHOT_DAYS):
+        self.days = days
+        self._lock = threading.Lock()
+        self._view: Optional[SnapshotView] = None
+        self._dictionary: Dict[str, int] = {}
+        self._store_ids: List[str] = []
+        # Observation buffers, filled up to _size; grown by doubling
+        self._codes = np.empty(0, dtype=np.int32)
+        self._timestamps = np.empty(0, dtype=np.int64)
+        self._active = np.empty(0, dtype=bool)
+        self._size = 0
+        self._menu_hours: Optional[pd.DataFrame] = None
+        self._timezones: Dict[str, str] = {}
+        self._max_id: Optional[int] = None
+        self._versions: Dict[str, int] = {}
+        self._cutoff: Optional[pd.Timestamp] = None
+
+    @property
+    def view(self) -> Optional[SnapshotView]:
+        """The last refreshed state, without checking the database."""
+        return self._view
+
+    def refresh(self) -> Optional[SnapshotView]:
+        """
+        Bring the snapshot up to the database's current watermark and return
+        it; None while store_status is empty. When nothing changed this is
+        two index probes and no lock.
+        """
+        with report_stage("query"):
+            max_id, max_timestamp = load_status_bounds()
+            versions = load_data_versions()
+        watermark = (max_id, max_timestamp, tuple(sorted(versions.items())))
+        view = self._view
+        if view is not None and view.watermark == watermark:
+            return view
+        if max_timestamp is None:
+            return None
+
+        with self._lock:
+            if self._view is not None and self._view.watermark == watermark:
+                return self._view
+            reset = versions.get("store_status_reset", 0) != self._versions.get("store_status_reset", 0)
+            if self._view is None or reset or max_id < self._max_id:
+                self._load(max_id, max_timestamp, versions)
+            else:
+                self._update(max_id, max_timestamp, versions)
+            self._versions = versions
+            self._view = SnapshotView(
+                self._codes[:self._size], self._timestamps[:self._size], self._active[:self._size],
+                list(self._store_ids), self._menu_hours, self._timezones,
+                current_time=max_timestamp, horizon=self._horizon(max_timestamp), watermark=watermark,
+            )
+            return self._view
+
+    def warm_up(self) -> None:
+        """Load the snapshot in a background thread, so the first report does not pay for it."""
+        def load():
+            try:
+                with use_report_pool():
+                    self.refresh()
+            except Exception as e:
+                print(f"Dataset snapshot warm-up failed: {e}")
+
+        threading.Thread(target=load, name="dataset-snapshot", daemon=True).start()
+
+    def clear(self) -> None:
+        with self._lock:
+            self.__init__(self.days)
+
+    def _load(self, max_id: int, max_timestamp: pd.Timestamp, versions: Dict[str, int]) -> None:
+        print("Loading dataset snapshot...")
+        self._dictionary = {}
+        self._store_ids = []
+        # Every known store gets a code, including ones with no recent observations
+        self._add_stores(load_store_ids())
+        self._menu_hours, self._timezones = load_store_reference()
+        self._add_stores(self._menu_hours["store_id"])
+        self._add_stores(self._timezones)
+
+        self._cutoff = load_retention_cutoff()
+        horizon = self._horizon(max_timestamp)
+        codes, timestamps, active = self._read(None, max_id, horizon)
+        self._codes, self._timestamps, self._active, self._size = codes, timestamps, active, len(codes)
+        self._max_id = max_id
+        print(f"Dataset snapshot: {self._size:,} observations of {len(self._store_ids):,} stores since {horizon}")
+
+    def _update(self, max_id: int, max_timestamp: pd.Timestamp, versions: Dict[str, int]) -> None:
+        if any(versions.get(name, 0) != self._versions.get(name, 0) for name in ("menu_hours", "store_timezones")):
+            self._menu_hours, self._timezones = load_store_reference()
+            self._add_stores(self._menu_hours["store_id"])
+            self._add_stores(self._timezones)
+        if versions.get("store_status", 0) != self._versions.get("store_status", 0):
+            self._cutoff = load_retention_cutoff()
+
+        horizon = self._horizon(max_timestamp)
+        if self._size and self._timestamps[0] < to_micros(horizon):
+            self._trim(horizon)
+        if max_id > self._max_id:
+            self._append(*self._read(self._max_id, max_id, horizon))
+            self._max_id = max_id
+
+    def _read(self, after_id: Optional[int], up_to_id: int, horizon: pd.Timestamp) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        n_stores = len(self._dictionary)
+        codes, timestamps, active = load_status_arrays(self._dictionary, after_id, up_to_id, horizon.to_pydatetime())
+        self._store_ids.extend(list(self._dictionary)[n_stores:])
+        # Oldest first, so trimming the horizon is a cut at the front
+        order = np.argsort(timestamps, kind="stable")
+        return codes[order], timestamps[order], active[order]
+
+    def _append(self, codes: np.ndarray, timestamps: np.ndarray, active: np.ndarray) -> None:
+        # Late rows older than the newest one held break the front-trim order; merge them in
+        needed = self._size + len(codes)
+        late = len(codes) and self._size and timestamps[0] < self._timestamps[self._size - 1]
+        if needed > len(self._codes) or late:
+            # New buffers: views handed out earlier keep the old ones
+            capacity = max(needed, 2 * len(self._codes), 1024)
+            self._codes = _grow(self._codes, self._size, capacity)
+            self._timestamps = _grow(self._timestamps, self._size, capacity)
+            self._active = _grow(self._active, self._size, capacity)
+        self._codes[self._size:needed] = codes
+        self._timestamps[self._size:needed] = timestamps
+        self._active[self._size:needed] = active
+        if late:
+            order = np.argsort(self._timestamps[:needed], kind="stable")
+            for buffer in (self._codes, self._timestamps, self._active):
+                buffer[:needed] = buffer[:needed][order]
+        self._size = needed
+
+    def _trim(self, horizon: pd.Timestamp) -> None:
+        first = int(np.searchsorted(self._timestamps[:self._size], to_micros(horizon), side="left"))
+        kept = self._size - first
+        capacity = max(2 * kept, 1024)
+        self._codes = _grow(self._codes[first:], kept, capacity)
+        self._timestamps = _grow(self._timestamps[first:], kept, capacity)
+        self._active = _grow(self._active[first:], kept, capacity)
+        self._size = kept
+
+    def _horizon(self, max_timestamp: pd.Timestamp) -> pd.Timestamp:
+        horizon = max_timestamp - timedelta(days=self.days)
+        return max(horizon, self._cutoff) if self._cutoff is not None else horizon
+
+    def _add_stores(self, store_ids) -> None:
+        for store_id in store_ids:
+            if store_id not in self._dictionary:
+                self._dictionary[store_id] = len(self._dictionary)
+                self._store_ids.append(store_id)
+
+
+def to_micros(value) -> int:
+    ts = pd.Timestamp(value)
+    ts = ts.tz_localize("UTC") if ts.tzinfo is None else ts
+    return ts.value // 1000
+
+
+def _grow(values: np.ndarray, size: int, capacity: int) -> np.ndarray:
+    grown = np.empty(capacity, dtype=values.dtype)
+    grown[:size] = values[:size]
+    return grown
+
+
+# Shared by the report workers and the single-store endpoint of this process
+dataset_snapshot = DatasetSnapshot()
@@ -0,0 +1,85 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime
+from typing import Iterable, Optional, Tuple
+
+from app.models.schemas import WindowResult
+from app.services.calculator import UPTIME_ENGINE, WINDOWS, compute_store_uptime
+from app.services.data_loader import get_current_time_from_db, load_data_versions, load_store_data, store_has_status
+from app.services.snapshot import DATASET_SNAPSHOT, dataset_snapshot
+
+# Single-store results kept in memory, least recently used evicted first
+STORE_UPTIME_CACHE_SIZE = int(os.getenv("STORE_UPTIME_CACHE_SIZE", "10000"))
+# Upper bound on how long a result is served without recomputing, for
+# backfilled observations that arrive without an invalidation
+STORE_UPTIME_CACHE_TTL_SECONDS = float(os.getenv("STORE_UPTIME_CACHE_TTL_SECONDS", "300"))
+
+# store_id -> (validity key, result, computed at monotonic time)
+_cache: "OrderedDict[str, Tuple[tuple, WindowResult, float]]" = OrderedDict()
+_cache_lock = threading.Lock()
+
+
+def get_store_uptime(store_id: str) -> Tuple[Optional[WindowResult], datetime, bool]:
+    """
+    Uptime/downtime of one store over the report windows, computed on demand.
+
+    Uses the same current time as a fleet report (the newest observation of
+    any store) and the same calculator, so the numbers match that store's
+    report row. Only the store's own observations inside the widest window
+    are read. Results are cached until the current time or the menu
+    hours/timezone versions change, the store is invalidated, or the TTL
+    passes.
+
+    Returns (result or None for an unknown store, current time, cache hit).
+    """
+    view = dataset_snapshot.refresh() if DATASET_SNAPSHOT else None
+    if view is not None:
+        current_time = view.current_time.to_pydatetime()
+        versions = dict(view.watermark[2])
+    else:
+        current_time = get_current_time_from_db().to_pydatetime()
+        versions = load_data_versions()
+    key = (current_time, versions.get("menu_hours", 0), versions.get("store_timezones", 0), UPTIME_ENGINE)
+
+    with _cache_lock:
+        entry = _cache.get(store_id)
+        if entry is not None and entry[0] == key and time.monotonic() - entry[2] < STORE_UPTIME_CACHE_TTL_SECONDS:
+            _cache.move_to_end(store_id)
+            return entry[1], current_time, True
+
+    since = current_time - max(length for _, length in WINDOWS)
+    if view is not None and view.covers(since):
+        # Every store ever observed has a snapshot code, so no code means unknown
+        store_data = view.store_data(store_id, since)
+        if store_data is None:
+            return None, current_time, False
+        status_df, menu_hours, store_timezones = store_data
+    else:
+        status_df, menu_hours, store_timezones = load_store_data(store_id, since)
+        # Observations older than the widest window still make the store known
+        if len(status_df) == 0 and len(menu_hours) == 0 and store_id not in store_timezones and not store_has_status(store_id):
+            return None, current_time, False
+
+    results = compute_store_uptime(status_df, menu_hours, store_timezones, current_time, known_stores={store_id})
+    result = next(iter(results))  # known_stores is this store only
+
+    with _cache_lock:
+        _cache[store_id] = (key, result, time.monotonic())
+        _cache.move_to_end(store_id)
+        while len(_cache) > STORE_UPTIME_CACHE_SIZE:
+            _cache.popitem(last=False)
+    return result, current_time, False
+
+
+def invalidate_store_uptime(store_ids: Iterable[str]) -> None:
+    """Drop cached results for stores that received new observations."""
+    with _cache_lock:
+        for store_id in store_ids:
+            _cache.pop(store_id, None)
+
+
+def clear_store_uptime_cache() -> None:
+    with _cache_lock:
+        _cache.clear()
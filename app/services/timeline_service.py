@@ -0,0 +1,340 @@
+import threading
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+from sqlalchemy import and_, delete, func, select
+
+from app.database.config import current_engine, dialect_insert, get_db_session
+from app.database.models import StoreStatus, StoreStatusRun
+from app.database.partitions import PARTITION_SPAN
+from app.models.schemas import Outage, OutagesResponse
+from app.services.calculator import Windows, to_epoch_micros
+from app.services.data_loader import load_retention_cutoff, load_status_arrays, load_store_ids, load_store_reference
+from app.services.metrics import count_stage, report_stage
+from app.services.rollup_service import ROLLUP_BATCH_SIZE, lock_watermark
+
+STATUS_RUNS = "store_status_runs"
+# Runs are cut at UTC week boundaries (the store_status partitions), so a run
+# overlapping [start, end] starts at most this long before start
+RUN_MAX_SPAN = PARTITION_SPAN
+# Stores per IN (...) list when reading runs of specific stores
+_STORE_CHUNK = 1000
+
+_WEEK_MICROS = PARTITION_SPAN // timedelta(microseconds=1)
+# The epoch was a Thursday; weeks start on Monday
+_MONDAY_OFFSET_MICROS = timedelta(days=3) // timedelta(microseconds=1)
+_refresh_lock = threading.Lock()
+
+
+def refresh_status_runs() -> int:
+    """
+    Fold store_status rows added since the last run into store_status_runs.
+
+    New rows are read by id past the stored watermark, like the hourly
+    rollup. Per store they continue its latest run (same status and week)
+    or start new ones, with one upsert per batch. A store that received an
+    observation older than its latest run has its runs rebuilt from
+    store_status from that observation's week on. The watermark moves in
+    the same transaction. The first run builds every store's runs in one
+    pass. Returns the number of observations folded in.
+    """
+    processed = 0
+    with _refresh_lock:
+        while True:
+            session = get_db_session()
+            try:
+                # Row lock: concurrent refreshes from other processes wait here
+                watermark = lock_watermark(session, STATUS_RUNS)
+                if watermark.last_id == 0:
+                    # First build: one pass over everything, whatever order the ids are in
+                    watermark.last_id, folded = _build_all(session)
+                    session.commit()
+                    if not folded:
+                        return processed
+                    processed += folded
+                    continue
+
+                rows = session.execute(
+                    select(StoreStatus.id, StoreStatus.store_id, StoreStatus.timestamp_utc, StoreStatus.status)
+                    .where(StoreStatus.id > watermark.last_id)
+                    .order_by(StoreStatus.id)
+                    .limit(ROLLUP_BATCH_SIZE)
+                ).all()
+                if not rows:
+                    session.commit()
+                    return processed
+
+                batch = pd.DataFrame(rows, columns=["id", "store_id", "timestamp_utc", "status"])
+                _fold_batch(session, batch)
+                watermark.last_id = int(batch["id"].max())
+                session.commit()
+                processed += len(batch)
+            except Exception:
+                session.rollback()
+                raise
+            finally:
+                session.close()
+
+
+def _build_all(session) -> Tuple[int, int]:
+    """Replace store_status_runs with runs of every observation; returns (last id, observations)."""
+    up_to_id = session.execute(select(func.max(StoreStatus.id))).scalar_one()
+    session.execute(delete(StoreStatusRun))
+    if up_to_id is None:
+        return 0, 0
+    dictionary: Dict[str, int] = {}
+    codes, timestamps, active = load_status_arrays(dictionary, up_to_id=up_to_id)
+    runs = _build_runs(
+        np.array(list(dictionary), dtype=object)[codes], timestamps, timestamps, active,
+        np.ones(len(codes), dtype=np.int64), np.zeros(len(codes), dtype=bool),
+    )
+    for i in range(0, len(runs), ROLLUP_BATCH_SIZE):
+        _upsert_runs(session, runs.iloc[i:i + ROLLUP_BATCH_SIZE])
+    print(f"Built {len(runs):,} status runs from {len(codes):,} observations")
+    return up_to_id, len(codes)
+
+
+def _fold_batch(session, batch: pd.DataFrame) -> None:
+    timestamps = to_epoch_micros(batch["timestamp_utc"])
+    active = (batch["status"] == "active").to_numpy()
+    store_ids = batch["store_id"].to_numpy(dtype=object)
+    tails = _latest_runs(session, pd.unique(store_ids))
+
+    # Observations at or before the end of their store's latest run arrived late
+    tail_ends = pd.Series(tails["end"].to_numpy(), index=tails["store_id"]).reindex(store_ids).to_numpy()
+    late = pd.unique(store_ids[timestamps <= np.nan_to_num(tail_ends, nan=-np.inf)])
+    in_order = ~pd.Series(store_ids).isin(late).to_numpy()
+
+    # In-order stores: new observations after the store's latest run, which they may extend
+    tails = tails[~tails["store_id"].isin(late)]
+    runs = _build_runs(
+        np.concatenate((tails["store_id"].to_numpy(dtype=object), store_ids[in_order])),
+        np.concatenate((tails["start"].to_numpy(), timestamps[in_order])),
+        np.concatenate((tails["end"].to_numpy(), timestamps[in_order])),
+        np.concatenate((tails["active"].to_numpy(dtype=bool), active[in_order])),
+        np.concatenate((tails["observations"].to_numpy(), np.ones(in_order.sum(), dtype=np.int64))),
+        np.concatenate((np.ones(len(tails), dtype=bool), np.zeros(in_order.sum(), dtype=bool))),
+    )
+    _upsert_runs(session, runs)
+
+    if len(late):
+        first_weeks = (
+            pd.DataFrame({"store_id": store_ids, "week": _week_starts(timestamps)})
+            .loc[~in_order].groupby("store_id")["week"].min()
+        )
+        _rebuild_runs(session, first_weeks, int(batch["id"].max()))
+
+
+def _latest_runs(session, store_ids: Sequence[str]) -> pd.DataFrame:
+    """The latest run of each given store that has one: store_id, start, end (epoch micros), active, observations."""
+    frames = []
+    for i in range(0, len(store_ids), _STORE_CHUNK):
+        chunk = list(store_ids[i:i + _STORE_CHUNK])
+        latest = (
+            select(StoreStatusRun.store_id, func.max(StoreStatusRun.start_utc).label("start_utc"))
+            .where(StoreStatusRun.store_id.in_(chunk))
+            .group_by(StoreStatusRun.store_id)
+            .subquery()
+        )
+        rows = session.execute(
+            select(StoreStatusRun.store_id, StoreStatusRun.start_utc, StoreStatusRun.end_utc, StoreStatusRun.active,
+                   StoreStatusRun.observations)
+            .join(latest, and_(StoreStatusRun.store_id == latest.c.store_id, StoreStatusRun.start_utc == latest.c.start_utc))
+        ).all()
+        frames.append(pd.DataFrame(rows, columns=["store_id", "start", "end", "active", "observations"]))
+    tails = pd.concat(frames, ignore_index=True) if frames else pd.DataFrame(columns=["store_id", "start", "end", "active", "observations"])
+    if len(tails):
+        tails["start"] = to_epoch_micros(tails["start"])
+        tails["end"] = to_epoch_micros(tails["end"])
+    return tails.astype({"start": np.int64, "end": np.int64, "active": bool, "observations": np.int64})
+
+
+def _rebuild_runs(session, first_weeks: pd.Series, up_to_id: int) -> None:
+    """Replace the runs of each store from its week in first_weeks (epoch micros) on, from store_status."""
+    for week, stores in first_weeks.groupby(first_weeks).groups.items():
+        week_start = pd.Timestamp(week, unit="us", tz="UTC").to_pydatetime()
+        stores = list(stores)
+        for i in range(0, len(stores), _STORE_CHUNK):
+            chunk = stores[i:i + _STORE_CHUNK]
+            session.execute(delete(StoreStatusRun).where(
+                StoreStatusRun.store_id.in_(chunk), StoreStatusRun.start_utc >= week_start
+            ))
+            # Rows past this batch are folded by a later one
+            rows = session.execute(
+                select(StoreStatus.store_id, StoreStatus.timestamp_utc, StoreStatus.status)
+                .where(StoreStatus.store_id.in_(chunk), StoreStatus.timestamp_utc >= week_start, StoreStatus.id <= up_to_id)
+            ).all()
+            raw = pd.DataFrame(rows, columns=["store_id", "timestamp_utc", "status"])
+            timestamps = to_epoch_micros(raw["timestamp_utc"]) if len(raw) else np.zeros(0, dtype=np.int64)
+            _upsert_runs(session, _build_runs(
+                raw["store_id"].to_numpy(dtype=object), timestamps, timestamps, (raw["status"] == "active").to_numpy(),
+                np.ones(len(raw), dtype=np.int64), np.zeros(len(raw), dtype=bool),
+            ))
+
+
+def _build_runs(
+    store_ids: np.ndarray,
+    starts: np.ndarray,
+    ends: np.ndarray,
+    active: np.ndarray,
+    observations: np.ndarray,
+    existing: np.ndarray
+) -> pd.DataFrame:
+    """
+    Collapse observations (or existing runs, flagged in existing) into runs:
+    a new run starts wherever the store, the status or the UTC week changes.
+    Runs made of a single existing run are left out, they are already stored.
+    """
+    if len(store_ids) == 0:
+        return pd.DataFrame(columns=["store_id", "start", "end", "active", "observations"])
+    codes, stores = pd.factorize(store_ids)
+    order = np.lexsort((starts, codes))
+    codes, starts, ends, active = codes[order], starts[order], ends[order], active[order]
+    observations, existing = observations[order], existing[order]
+    weeks = _week_starts(starts)
+
+    first = np.ones(len(codes), dtype=bool)
+    first[1:] = (codes[1:] != codes[:-1]) | (active[1:] != active[:-1]) | (weeks[1:] != weeks[:-1])
+    heads = np.flatnonzero(first)
+    sizes = np.diff(np.append(heads, len(codes)))
+    changed = ~((sizes == 1) & existing[heads])
+    heads = heads[changed]
+    return pd.DataFrame({
+        "store_id": stores[codes[heads]],
+        "start": starts[heads],
+        "end": np.maximum.reduceat(ends, np.flatnonzero(first))[changed],
+        "active": active[heads],
+        "observations": np.add.reduceat(observations, np.flatnonzero(first))[changed],
+    })
+
+
+def _upsert_runs(session, runs: pd.DataFrame) -> None:
+    if runs.empty:
+        return
+    starts = pd.to_datetime(runs["start"].to_numpy(), unit="us", utc=True).to_pydatetime()
+    ends = pd.to_datetime(runs["end"].to_numpy(), unit="us", utc=True).to_pydatetime()
+    records = [
+        {"store_id": store_id, "start_utc": start, "end_utc": end, "active": bool(active), "observations": int(observations)}
+        for store_id, start, end, active, observations in zip(runs["store_id"], starts, ends, runs["active"], runs["observations"])
+    ]
+    stmt = dialect_insert(session.get_bind())(StoreStatusRun)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[StoreStatusRun.store_id, StoreStatusRun.start_utc],
+        set_={"end_utc": stmt.excluded.end_utc, "active": stmt.excluded.active, "observations": stmt.excluded.observations},
+    )
+    session.execute(stmt, records)
+
+
+def _utc(value: datetime) -> pd.Timestamp:
+    ts = pd.Timestamp(value)
+    return ts.tz_localize("UTC") if ts.tzinfo is None else ts.tz_convert("UTC")
+
+
+def _week_starts(timestamps: np.ndarray) -> np.ndarray:
+    """Epoch microseconds of the Monday 00:00 UTC starting each timestamp's week."""
+    return (timestamps + _MONDAY_OFFSET_MICROS) // _WEEK_MICROS * _WEEK_MICROS - _MONDAY_OFFSET_MICROS
+
+
+def load_runs(
+    start: datetime,
+    end: datetime,
+    store_id: Optional[str] = None,
+    active: Optional[bool] = None,
+    limit: Optional[int] = None
+) -> pd.DataFrame:
+    """
+    Runs overlapping [start, end] (store_id, start_utc, end_utc, active,
+    observations), ordered by store and start. Runs are at most
+    RUN_MAX_SPAN long, so the overlap test is a range scan of
+    idx_store_status_runs_start (or the primary key for one store).
+    """
+    conditions = [
+        StoreStatusRun.start_utc >= start - RUN_MAX_SPAN,
+        StoreStatusRun.start_utc <= end,
+        StoreStatusRun.end_utc >= start,
+    ]
+    if store_id is not None:
+        conditions.append(StoreStatusRun.store_id == store_id)
+    if active is not None:
+        conditions.append(StoreStatusRun.active == active)
+    stmt = (
+        select(StoreStatusRun.store_id, StoreStatusRun.start_utc, StoreStatusRun.end_utc, StoreStatusRun.active,
+               StoreStatusRun.observations)
+        .where(*conditions)
+        .order_by(StoreStatusRun.store_id, StoreStatusRun.start_utc)
+        .limit(limit)
+    )
+    with report_stage("query"):
+        with current_engine().connect() as conn:
+            rows = conn.execute(stmt).all()
+    count_stage("query", rows=len(rows))
+    with report_stage("materialize"):
+        runs = pd.DataFrame(rows, columns=["store_id", "start_utc", "end_utc", "active", "observations"])
+        runs["start_utc"] = pd.to_datetime(runs["start_utc"], utc=True)
+        runs["end_utc"] = pd.to_datetime(runs["end_utc"], utc=True)
+        return runs.astype({"active": bool})
+
+
+def load_outages(start: datetime, end: datetime, store_id: Optional[str] = None, limit: Optional[int] = None) -> pd.DataFrame:
+    """
+    Outages overlapping [start, end]: runs of inactive observations, from the
+    first to the last inactive observation before the store was seen active
+    again (or the week ended).
+    """
+    return load_runs(start, end, store_id=store_id, active=False, limit=limit)
+
+
+def find_outages(start: datetime, end: datetime, store_id: Optional[str] = None, limit: int = 1000) -> OutagesResponse:
+    """GET /outages: outages overlapping [start, end] after folding in new observations. Raises ValueError."""
+    start, end = _utc(start), _utc(end)
+    if end < start:
+        raise ValueError("end must not be before start")
+    refresh_status_runs()
+    outages = load_outages(start.to_pydatetime(), end.to_pydatetime(), store_id=store_id, limit=limit + 1)
+    return OutagesResponse(
+        outages=[
+            Outage(store_id=row.store_id, start_utc=row.start_utc, end_utc=row.end_utc, observations=row.observations)
+            for row in outages.head(limit).itertuples(index=False)
+        ],
+        truncated=len(outages) > limit,
+    )
+
+
+def load_runs_report_data(
+    current_time: datetime,
+    windows: Windows
+) -> Tuple[pd.DataFrame, pd.DataFrame, Dict[str, str], List[str]]:
+    """
+    (runs, menu_hours, store_timezones, known store ids) for a report from
+    the timeline: the runs overlapping the widest window, as
+    calculator.compute_uptime_from_runs takes them.
+    """
+    since = current_time - max(length for _, length in windows)
+    runs = load_runs(since, current_time)
+
+    # A run covering the whole window says nothing about observations inside it
+    covering = (runs["start_utc"] < since) & (runs["end_utc"] > current_time)
+    cutoff = load_retention_cutoff()
+    if covering.any() and (cutoff is None or since >= cutoff):
+        observed = _stores_observed(runs.loc[covering, "store_id"].unique(), since, current_time)
+        runs = runs[~covering | runs["store_id"].isin(observed)]
+
+    with report_stage("query"):
+        menu_hours, store_timezones = load_store_reference()
+        known_stores = load_store_ids()
+    return runs, menu_hours, store_timezones, known_stores
+
+
+def _stores_observed(store_ids: Sequence[str], start: datetime, end: datetime) -> set:
+    observed = set()
+    with report_stage("query"):
+        with current_engine().connect() as conn:
+            for i in range(0, len(store_ids), _STORE_CHUNK):
+                observed.update(conn.execute(
+                    select(StoreStatus.store_id.distinct())
+                    .where(StoreStatus.store_id.in_(list(store_ids[i:i + _STORE_CHUNK])),
+                           StoreStatus.timestamp_utc.between(start, end))
+                ).scalars())
+    return observed
@@ -0,0 +1,59 @@
+#!/usr/bin/env python3
+"""
+Backfill hourly (or any step) uptime history for a date range.
+
+Computes every store's uptime for the report windows as of each step from
+--start to --end in one sweep over the sorted observations, and writes a
+Parquet dataset partitioned by day (date=YYYY-MM-DD/part-0.parquet) with
+columns store_id, as_of and the report's window columns. Runs in this
+process; POST /backfill queues the same computation for the report workers.
+
+Requires pyarrow and an observation-counting UPTIME_ENGINE.
+
+Usage:
+    python backfill.py --start 2024-09-01 --end 2024-10-01 --step 1h
+    python backfill.py --start 2024-09-24 --step 15m --windows 15m,1h,24h --output backfills/late_sept
+"""
+import argparse
+import sys
+import time
+from datetime import datetime
+from pathlib import Path
+
+# Add the app to the path
+sys.path.append(str(Path(__file__).parent))
+
+from app.services.backfill_service import BACKFILL_DIR, backfill_steps, write_backfill
+from app.services.calculator import WINDOWS, parse_windows
+from app.services.metrics import record_report_timings
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--start", type=datetime.fromisoformat, required=True, help="first step, ISO date/time (UTC if naive)")
+    parser.add_argument("--end", type=datetime.fromisoformat, default=None, help="last step (default: current time of the data)")
+    parser.add_argument("--step", default="1h", help="time between steps, e.g. 15m, 1h, 1d")
+    parser.add_argument("--windows", default=None, help="report windows (default 1h,24h,7d)")
+    parser.add_argument("--output", type=Path, default=None, help=f"dataset directory (default under {BACKFILL_DIR}/)")
+    args = parser.parse_args()
+
+    try:
+        windows = parse_windows(args.windows) if args.windows else WINDOWS
+        steps = backfill_steps(args.start, args.end, args.step, windows)
+    except ValueError as e:
+        parser.error(str(e))
+    output = args.output or BACKFILL_DIR / f"backfill_{steps[0]:%Y%m%dT%H%M}_{steps[-1]:%Y%m%dT%H%M}_{args.step}"
+    output.parent.mkdir(parents=True, exist_ok=True)
+
+    print(f"Backfilling {len(steps):,} steps from {steps[0]} to {steps[-1]}...")
+    started = time.perf_counter()
+    with record_report_timings() as timings:
+        rows = write_backfill(output, steps, windows)
+    stages = timings.as_dict()
+    print(f"Wrote {rows:,} rows to {output} in {time.perf_counter() - started:.2f}s: " + ", ".join(
+        f"{stage} {entry['seconds']:.2f}s" for stage, entry in stages.items() if stage != "total"
+    ))
+
+
+if __name__ == "__main__":
+    main()
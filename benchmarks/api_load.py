@@ -0,0 +1,195 @@
+"""
+API latency under concurrent load while the report workers are busy.
+
+Starts the API (uvicorn, this tree) on a synthetic fleet in a scratch SQLite
+database unless --url points at a running server. It generates one report to
+download, keeps --background-reports distinct reports queued or computing,
+and meanwhile --concurrency clients call GET /get_report and GET
+/polling/status for --duration seconds. Latency percentiles per endpoint are
+printed as JSON.
+
+To compare two builds, start each one (e.g. from another checkout) on the
+same database and point --url at it.
+
+Usage:
+    python -m benchmarks.api_load --stores 20000 --concurrency 64 --duration 30
+    python -m benchmarks.api_load --url http://127.0.0.1:8000 --concurrency 32 --output after.json
+"""
+import argparse
+import asyncio
+import json
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Dict, List
+
+import httpx
+import numpy as np
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+ENDPOINTS = ("get_report", "polling_status")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", default=None, help="running API to load (default: start one on a synthetic fleet)")
+    parser.add_argument("--stores", type=int, default=20000, help="synthetic fleet size when starting the API")
+    parser.add_argument("--observations", type=int, default=168, help="observations per store")
+    parser.add_argument("--concurrency", type=int, default=32, help="concurrent clients")
+    parser.add_argument("--duration", type=float, default=20, help="seconds of load")
+    parser.add_argument("--background-reports", type=int, default=2, help="reports kept queued or computing during the load")
+    parser.add_argument("--output", type=Path, default=None, help="also write the JSON results here")
+    args = parser.parse_args()
+
+    server = None
+    scratch = None
+    url = args.url
+    if url is None:
+        scratch = tempfile.TemporaryDirectory()
+        url, server = _start_server(Path(scratch.name), args.stores, args.observations)
+    try:
+        results = asyncio.run(_run_load(url, args.concurrency, args.duration, args.background_reports))
+    finally:
+        if server is not None:
+            server.terminate()
+            server.wait(timeout=30)
+
+    document = {
+        "benchmark": "api_load",
+        "url": url if args.url else None,
+        "stores": None if args.url else args.stores,
+        "concurrency": args.concurrency,
+        "duration_seconds": args.duration,
+        "background_reports": args.background_reports,
+        **results,
+    }
+    text = json.dumps(document, indent=2)
+    print(text)
+    if args.output:
+        args.output.write_text(text + "\n")
+
+
+def _start_server(workdir: Path, stores: int, observations: int):
+    """Create and fill a scratch database, start uvicorn on it and wait until it answers."""
+    database_url = os.environ.get("DATABASE_URL") or f"sqlite:///{workdir / 'bench.db'}"
+    env = {**os.environ, "DATABASE_URL": database_url}
+    fill = (
+        "from app.database.config import create_tables, engine\n"
+        "from benchmarks.synthetic import generate_fleet\n"
+        f"create_tables(); generate_fleet(engine, stores={stores}, observations_per_store={observations})\n"
+    )
+    print(f"Generating {stores:,} stores...", file=sys.stderr)
+    subprocess.run([sys.executable, "-c", fill], cwd=REPO_ROOT, env=env, check=True)
+
+    with socket.socket() as probe:
+        probe.bind(("127.0.0.1", 0))
+        port = probe.getsockname()[1]
+    url = f"http://127.0.0.1:{port}"
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app.main:app", "--port", str(port), "--log-level", "warning"],
+        cwd=workdir, env={**env, "PYTHONPATH": os.pathsep.join(filter(None, [str(REPO_ROOT), env.get("PYTHONPATH")]))},
+    )
+    deadline = time.monotonic() + 60
+    while time.monotonic() < deadline and server.poll() is None:
+        try:
+            httpx.get(f"{url}/polling/status", timeout=1).raise_for_status()
+            return url, server
+        except httpx.HTTPError:
+            time.sleep(0.2)
+    if server.poll() is not None:
+        raise RuntimeError(f"API exited during startup (status {server.returncode})")
+    server.terminate()
+    raise RuntimeError("API did not start within 60s")
+
+
+async def _run_load(url: str, concurrency: int, duration: float, background_reports: int) -> dict:
+    limits = httpx.Limits(max_connections=concurrency + 4, max_keepalive_connections=concurrency + 4)
+    async with httpx.AsyncClient(base_url=url, limits=limits, timeout=60) as client:
+        report_id = await _completed_report(client)
+        latencies: Dict[str, List[float]] = {endpoint: [] for endpoint in ENDPOINTS}
+        errors: Dict[str, int] = {endpoint: 0 for endpoint in ENDPOINTS}
+        deadline = time.monotonic() + duration
+
+        async def user(index: int):
+            requests = [
+                ("get_report", "/get_report", {"report_id": report_id}),
+                ("polling_status", "/polling/status", None),
+            ]
+            turn = index
+            while time.monotonic() < deadline:
+                endpoint, path, params = requests[turn % len(requests)]
+                turn += 1
+                started = time.perf_counter()
+                try:
+                    response = await client.get(path, params=params)
+                    ok = response.status_code == 200
+                except httpx.HTTPError:
+                    ok = False
+                latencies[endpoint].append(time.perf_counter() - started)
+                errors[endpoint] += not ok
+
+        feeder = asyncio.create_task(_keep_reports_busy(client, background_reports, deadline))
+        await asyncio.gather(*(user(i) for i in range(concurrency)))
+        reports_started = await feeder
+
+    return {
+        "background_reports_started": reports_started,
+        "results": {
+            endpoint: {
+                "requests": len(values),
+                "errors": errors[endpoint],
+                "requests_per_second": round(len(values) / duration, 1),
+                **{
+                    f"{name}_ms": round(float(np.percentile(values, q)) * 1000, 2) if values else None
+                    for name, q in (("p50", 50), ("p95", 95), ("p99", 99), ("max", 100))
+                },
+            }
+            for endpoint, values in latencies.items()
+        },
+    }
+
+
+async def _completed_report(client: httpx.AsyncClient) -> str:
+    """Trigger the default report and wait for it: the file the clients download."""
+    report_id = (await client.post("/trigger_report")).json()["report_id"]
+    while True:
+        response = await client.get("/get_report", params={"report_id": report_id})
+        if response.headers.get("X-Report-Status") == "Complete":
+            return report_id
+        if response.status_code != 200:
+            raise RuntimeError(f"Report {report_id} failed: {response.status_code} {response.text}")
+        await asyncio.sleep(0.5)
+
+
+async def _keep_reports_busy(client: httpx.AsyncClient, target: int, deadline: float) -> int:
+    """
+    Keep `target` uncached reports queued or computing until the deadline.
+    Each gets a distinct window set, so single-flight and the report cache
+    cannot answer it. Returns how many were started.
+    """
+    pending: List[str] = []
+    started = 0
+    while time.monotonic() < deadline and target > 0:
+        still_running = []
+        for report_id in pending:
+            response = await client.get("/get_report", params={"report_id": report_id}, headers={"Range": "bytes=0-0"})
+            if response.headers.get("X-Report-Status") != "Complete" and response.status_code == 200:
+                still_running.append(report_id)
+        pending = still_running
+        while len(pending) < target:
+            windows = f"1h,24h,{8 + started % 80}d,{1 + started // 80}m"
+            response = await client.post("/trigger_report", params={"windows": windows})
+            if response.status_code != 200:
+                break
+            pending.append(response.json()["report_id"])
+            started += 1
+        await asyncio.sleep(0.5)
+    return started
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,59 @@
+"""
+Compare two benchmarks.pipeline result files and flag regressions.
+
+Stages are matched on (stores, observations per store, stage, variant) and
+compared on their best time. Exits with status 1 when any stage of the
+candidate is slower than --threshold times the baseline, so it can gate a
+change in CI.
+
+Usage:
+    python -m benchmarks.compare before.json after.json
+    python -m benchmarks.compare before.json after.json --threshold 1.25
+"""
+import argparse
+import json
+import sys
+from pathlib import Path
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("baseline", type=Path)
+    parser.add_argument("candidate", type=Path)
+    parser.add_argument("--threshold", type=float, default=1.10, help="slowdown ratio counted as a regression")
+    args = parser.parse_args()
+
+    baseline = _results(args.baseline)
+    candidate = _results(args.candidate)
+
+    regressions = 0
+    print(f"{'stores':>8}  {'stage':<8} {'variant':<40} {'baseline':>10} {'candidate':>10} {'ratio':>7}")
+    for key in sorted(baseline.keys() & candidate.keys()):
+        stores, _, stage, variant = key
+        before, after = baseline[key], candidate[key]
+        ratio = after / before if before > 0 else float("inf")
+        flag = ""
+        if ratio > args.threshold:
+            regressions += 1
+            flag = "  REGRESSION"
+        print(f"{stores:>8}  {stage:<8} {variant:<40} {before:>9.3f}s {after:>9.3f}s {ratio:>6.2f}x{flag}")
+
+    for label, missing in (("baseline", candidate.keys() - baseline.keys()), ("candidate", baseline.keys() - candidate.keys())):
+        for stores, _, stage, variant in sorted(missing):
+            print(f"{stores:>8}  {stage:<8} {variant:<40} not in {label}")
+
+    if regressions:
+        print(f"{regressions} stage(s) more than {args.threshold:.2f}x slower", file=sys.stderr)
+        sys.exit(1)
+
+
+def _results(path: Path) -> dict:
+    document = json.loads(path.read_text())
+    return {
+        (r["stores"], r["observations_per_store"], r["stage"], r["variant"]): r["seconds"]
+        for r in document["results"]
+    }
+
+
+if __name__ == "__main__":
+    main()
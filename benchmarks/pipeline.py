@@ -0,0 +1,298 @@
+"""
+Benchmarks of every report pipeline stage on synthetic fleets of growing size.
+
+For each fleet size a deterministic synthetic fleet (benchmarks.synthetic)
+is written as source files and loaded through the ingestion functions,
+then each stage is timed on its own:
+- ingest: ingest_store_status, ingest_menu_hours, ingest_store_timezones
+- load: load_all_data over the report window, per loader mode
+- compute: compute_store_uptime, per uptime engine
+- save: _save_results_csv
+- api: POST /trigger_report, then GET /get_report until the CSV is served,
+  for a new report (cold) and for a repeat on unchanged data (cached)
+
+Results are printed as JSON (and written to --output), so runs from before
+and after a change can be compared with `python -m benchmarks.compare`.
+"seconds" is the best of --repeat runs, "first_seconds" the first run in
+the process (cold caches). Application logging goes to stderr.
+
+The database is a scratch SQLite file unless --database-url points at a
+PostgreSQL or SQLite stand-in. Its tables are dropped and recreated for
+every fleet size, so never point it at a database you want to keep.
+
+Usage:
+    python -m benchmarks.pipeline --stores 1000,10000,100000 --output before.json
+    python -m benchmarks.pipeline --stores 10000 --engines vectorized,business_hours \\
+        --timezones America/Chicago=0.5,Asia/Kolkata=0.3,none=0.2 --menu-hours-density 0.5
+"""
+import argparse
+import contextlib
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Any, List, Tuple
+
+STAGES = ("ingest", "load", "compute", "save", "api")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--stores", default="1000,10000", help="comma-separated fleet sizes")
+    parser.add_argument("--observations", type=int, default=168, help="observations per store")
+    parser.add_argument("--timezones", default=None, help="timezone mix, e.g. America/Chicago=0.7,none=0.3")
+    parser.add_argument("--menu-hours-density", type=float, default=None, help="share of stores with menu hours")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--stages", default=",".join(STAGES), help=f"subset of {','.join(STAGES)}")
+    parser.add_argument("--engines", default="vectorized,business_hours", help="uptime engines for the compute stage")
+    parser.add_argument("--windows", default=None, help="report windows for the load/compute stages, e.g. 15m,6h,30d")
+    parser.add_argument("--loader-modes", default="columnar", help="loader modes for the load stage")
+    parser.add_argument("--repeat", type=int, default=3, help="timed runs per stage (best is reported)")
+    parser.add_argument("--database-url", default=None, help="database to benchmark against (tables are dropped)")
+    parser.add_argument("--output", type=Path, default=None, help="also write the JSON results here")
+    args = parser.parse_args()
+
+    stages = set(args.stages.split(","))
+    unknown = stages - set(STAGES)
+    if unknown:
+        parser.error(f"unknown stages {sorted(unknown)}, expected a subset of {STAGES}")
+
+    scratch = tempfile.TemporaryDirectory()
+    workdir = Path(scratch.name)
+    # Always explicit: the tables are dropped, so an ambient DATABASE_URL is never used
+    os.environ["DATABASE_URL"] = args.database_url or f"sqlite:///{workdir / 'bench.db'}"
+    output = args.output.resolve() if args.output else None
+    # reports/ and the business-hours cache are relative to the working directory
+    os.chdir(workdir)
+
+    from app.services.calculator import WINDOWS, format_windows
+    from benchmarks.synthetic import DEFAULT_MENU_HOURS_DENSITY, DEFAULT_TIMEZONE_MIX, parse_timezone_mix
+
+    timezone_mix = parse_timezone_mix(args.timezones) if args.timezones else DEFAULT_TIMEZONE_MIX
+    density = DEFAULT_MENU_HOURS_DENSITY if args.menu_hours_density is None else args.menu_hours_density
+
+    results = []
+    stdout = sys.stdout
+    with contextlib.redirect_stdout(sys.stderr):
+        for stores in [int(s) for s in args.stores.split(",")]:
+            results.extend(_benchmark_fleet(args, stages, workdir, stores, timezone_mix, density))
+
+    document = {
+        "benchmark": "pipeline",
+        "environment": _environment(),
+        "fleet": {
+            "observations_per_store": args.observations,
+            "seed": args.seed,
+            "timezone_mix": {"none" if name is None else name: weight for name, weight in timezone_mix.items()},
+            "menu_hours_density": density,
+        },
+        "windows": args.windows or format_windows(WINDOWS),
+        "results": results,
+    }
+    text = json.dumps(document, indent=2)
+    print(text, file=stdout)
+    if output is not None:
+        output.write_text(text + "\n")
+
+
+def _benchmark_fleet(args, stages, workdir: Path, stores: int, timezone_mix, density) -> list:
+    from app.database import ingestion
+    from app.database.config import create_tables, engine, get_db_session
+    from app.database.models import Base
+    from app.services.calculator import WINDOWS, compute_store_uptime, parse_windows
+    from app.services.data_loader import get_current_time_from_db, load_all_data, load_store_ids
+    from app.services.report_service import _save_results_csv
+    from benchmarks.synthetic import build_fleet, insert_fleet, write_source_files
+
+    results = []
+
+    def record(stage, variant, timings, **extra):
+        results.append({
+            "stores": stores,
+            "observations_per_store": args.observations,
+            "stage": stage,
+            "variant": variant,
+            "seconds": round(min(timings), 4),
+            "first_seconds": round(timings[0], 4),
+            "runs": len(timings),
+            **extra,
+        })
+        print(f"{stores:>7} stores  {stage:<8} {variant:<36} {min(timings):9.3f}s", file=sys.stderr)
+
+    print(f"Building a fleet of {stores:,} stores...", file=sys.stderr)
+    fleet = build_fleet(stores, args.observations, args.seed, timezone_mix=timezone_mix, menu_hours_density=density)
+    Base.metadata.drop_all(bind=engine)
+    create_tables()
+
+    if "ingest" in stages:
+        source_dir = workdir / f"files_{stores}"
+        write_source_files(fleet, source_dir)
+        ingestion.DATA_DIR = source_dir
+        session = get_db_session()
+        try:
+            ingestion._staging_metadata.create_all(session.connection())
+            for name, ingest, rows in (
+                ("store_status", ingestion.ingest_store_status, len(fleet.store_status)),
+                ("menu_hours", ingestion.ingest_menu_hours, len(fleet.menu_hours)),
+                ("store_timezones", ingestion.ingest_store_timezones, len(fleet.store_timezones)),
+            ):
+                started = time.perf_counter()
+                ingest(session)
+                record("ingest", name, [time.perf_counter() - started], rows=rows)
+            ingestion._staging_metadata.drop_all(session.connection())
+            started = time.perf_counter()
+            session.commit()
+            record("ingest", "commit", [time.perf_counter() - started])
+        finally:
+            session.close()
+    else:
+        insert_fleet(engine, fleet)
+    del fleet
+
+    current_time = get_current_time_from_db().to_pydatetime()
+    windows = parse_windows(args.windows) if args.windows else WINDOWS
+    since = current_time - max(length for _, length in windows)
+
+    data = None
+    if "load" in stages:
+        for mode in args.loader_modes.split(","):
+            data = None
+            seconds, data = _repeat(lambda: load_all_data(mode=mode, since=since), args.repeat)
+            record("load", f"load_all_data/{mode}", seconds, rows=len(data[0]))
+    elif stages & {"compute", "save"}:
+        data = load_all_data(since=since)
+
+    uptime = None
+    if stages & {"compute", "save"}:
+        status_df, menu_hours, store_timezones = data
+        known_stores = load_store_ids()
+        for uptime_engine in args.engines.split(","):
+            seconds, engine_results = _repeat(
+                lambda: compute_store_uptime(
+                    status_df, menu_hours, store_timezones, current_time,
+                    engine=uptime_engine, known_stores=known_stores, windows=windows,
+                ),
+                args.repeat if "compute" in stages else 1,
+            )
+            if uptime is None:
+                uptime = engine_results
+            if "compute" in stages:
+                record("compute", f"compute_store_uptime/{uptime_engine}", seconds, rows=len(engine_results))
+            if "compute" not in stages:
+                break  # save only needs one engine's results
+    data = None
+
+    if "save" in stages:
+        output_path = workdir / "report.csv"
+        seconds, _ = _repeat(lambda: _save_results_csv(uptime, output_path), args.repeat)
+        record("save", "_save_results_csv", seconds, rows=len(uptime), bytes=output_path.stat().st_size)
+        output_path.unlink()
+
+    if "api" in stages:
+        _benchmark_api(args.repeat, record)
+    return results
+
+
+def _benchmark_api(repeat: int, record) -> None:
+    from fastapi.testclient import TestClient
+
+    from app.database.config import get_db_session
+    from app.database.models import ReportJob
+    from app.main import app
+    from app.services.calculator import UPTIME_ENGINE
+    from app.services.report_service import REPORT_ENGINE, REPORTS_DIR
+
+    def forget_reports():
+        session = get_db_session()
+        try:
+            session.query(ReportJob).delete()
+            session.commit()
+        finally:
+            session.close()
+        for path in REPORTS_DIR.glob("report_*"):
+            path.unlink()
+
+    def trigger_and_download(client):
+        response = client.post("/trigger_report")
+        response.raise_for_status()
+        report_id = response.json()["report_id"]
+        while True:
+            response = client.get("/get_report", params={"report_id": report_id})
+            response.raise_for_status()
+            if response.headers.get("X-Report-Status") == "Complete":
+                return len(response.content)
+            time.sleep(0.01)
+
+    variant = f"{REPORT_ENGINE}/{UPTIME_ENGINE}"
+    with TestClient(app) as client:
+        cold = []
+        for _ in range(max(1, repeat)):
+            forget_reports()
+            started = time.perf_counter()
+            size = trigger_and_download(client)
+            cold.append(time.perf_counter() - started)
+        record("api", f"cold/{variant}", cold, bytes=size)
+
+        seconds, size = _repeat(lambda: trigger_and_download(client), repeat)
+        record("api", f"cached/{variant}", seconds, bytes=size)
+        forget_reports()
+
+
+def _repeat(fn, repeat: int) -> Tuple[List[float], Any]:
+    """Run fn repeat times (at least once) and keep each duration and the last result."""
+    seconds = []
+    result = None
+    for _ in range(max(1, repeat)):
+        result = None  # release the previous run's output before timing the next
+        started = time.perf_counter()
+        result = fn()
+        seconds.append(time.perf_counter() - started)
+    return seconds, result
+
+
+def _environment() -> dict:
+    import numpy
+    import pandas
+    import sqlalchemy
+
+    from app.database.config import engine
+    from app.database.ingestion import INGEST_CHUNK_SIZE
+    from app.services.calculator import UPTIME_ENGINE
+    from app.services.data_loader import LOADER_CHUNK_SIZE, LOADER_MODE
+    from app.services.report_service import REPORT_ENGINE, REPORT_WORKERS, REPORT_WRITE_CHUNK_SIZE
+
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=Path(__file__).resolve().parent,
+            capture_output=True, text=True, check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+
+    return {
+        "commit": commit,
+        "python": platform.python_version(),
+        "numpy": numpy.__version__,
+        "pandas": pandas.__version__,
+        "sqlalchemy": sqlalchemy.__version__,
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "database": engine.dialect.name,
+        "settings": {
+            "UPTIME_ENGINE": UPTIME_ENGINE,
+            "REPORT_ENGINE": REPORT_ENGINE,
+            "REPORT_WORKERS": REPORT_WORKERS,
+            "LOADER_MODE": LOADER_MODE,
+            "LOADER_CHUNK_SIZE": LOADER_CHUNK_SIZE,
+            "INGEST_CHUNK_SIZE": INGEST_CHUNK_SIZE,
+            "REPORT_WRITE_CHUNK_SIZE": REPORT_WRITE_CHUNK_SIZE,
+        },
+    }
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,70 @@
+"""
+Scaling of sharded report generation with the number of worker processes.
+
+Builds a synthetic fleet in a scratch SQLite database (unless DATABASE_URL
+is already set), then times generate_sharded_report for each worker count
+and prints the timings and speedups as JSON.
+
+Usage:
+    python -m benchmarks.sharding --stores 20000 --observations 168 --workers 1,2,4,8
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--stores", type=int, default=20000)
+    parser.add_argument("--observations", type=int, default=168, help="observations per store")
+    parser.add_argument("--workers", default=",".join(str(2 ** i) for i in range(4) if 2 ** i <= (os.cpu_count() or 1)))
+    parser.add_argument("--repeat", type=int, default=3, help="timed runs per worker count (best is reported)")
+    args = parser.parse_args()
+
+    scratch = tempfile.TemporaryDirectory()
+    os.environ.setdefault("DATABASE_URL", f"sqlite:///{Path(scratch.name) / 'bench.db'}")
+
+    from app.database.config import create_tables, engine
+    from app.services.report_service import compute_report_results, generate_sharded_report, _save_results_csv
+    from benchmarks.synthetic import generate_fleet
+
+    create_tables()
+    generate_fleet(engine, stores=args.stores, observations_per_store=args.observations)
+
+    output_path = Path(scratch.name) / "report.csv"
+    timings = {}
+    for workers in [int(w) for w in args.workers.split(",")]:
+        def run():
+            if workers == 1:
+                _save_results_csv(compute_report_results("pandas"), output_path)
+            else:
+                generate_sharded_report(output_path, workers)
+
+        run()  # warm-up: starts the worker processes
+        best = float("inf")
+        for _ in range(args.repeat):
+            started = time.perf_counter()
+            run()
+            best = min(best, time.perf_counter() - started)
+        timings[workers] = best
+        print(f"{workers} worker(s): {best:.3f}s", file=sys.stderr)
+
+    baseline = timings[min(timings)]
+    print(json.dumps({
+        "benchmark": "sharded_report",
+        "stores": args.stores,
+        "observations_per_store": args.observations,
+        "cpu_count": os.cpu_count(),
+        "results": [
+            {"workers": workers, "seconds": round(seconds, 4), "speedup": round(baseline / seconds, 2)}
+            for workers, seconds in timings.items()
+        ],
+    }, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,160 @@
+"""Deterministic synthetic fleet data for benchmarks."""
+import uuid
+from dataclasses import dataclass
+from datetime import datetime, time, timedelta, timezone
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+
+from app.database.models import MenuHours, StoreStatus, StoreTimezone
+
+DEFAULT_END = datetime(2023, 1, 25, 18, 0, tzinfo=timezone.utc)
+# Share of stores per timezone in files/timezones.csv; None means no
+# store_timezones row, so the store falls back to the default timezone
+DEFAULT_TIMEZONE_MIX: Dict[Optional[str], float] = {
+    "America/Chicago": 0.64,
+    "America/New_York": 0.24,
+    "America/Los_Angeles": 0.045,
+    "America/Denver": 0.025,
+    "America/Phoenix": 0.013,
+    "America/Indiana/Indianapolis": 0.01,
+    "America/Boise": 0.002,
+    "Pacific/Honolulu": 0.001,
+    None: 0.024,
+}
+# Share of stores with menu_hours rows in files/menu_hours.csv; the rest are open 24x7
+DEFAULT_MENU_HOURS_DENSITY = 0.98
+# Rows per executemany round trip when inserting a fleet
+INSERT_CHUNK_SIZE = 50000
+
+
+@dataclass
+class SyntheticFleet:
+    """Rows of the three source tables, in the column layout of the models."""
+    store_ids: List[str]
+    store_status: pd.DataFrame   # store_id, timestamp_utc (UTC), status
+    menu_hours: pd.DataFrame     # store_id, day_of_week, start_time_local, end_time_local
+    store_timezones: pd.DataFrame  # store_id, timezone_str
+
+
+def build_fleet(
+    stores: int = 1000,
+    observations_per_store: int = 168,
+    seed: int = 0,
+    end: datetime = DEFAULT_END,
+    timezone_mix: Optional[Dict[Optional[str], float]] = None,
+    menu_hours_density: float = DEFAULT_MENU_HOURS_DENSITY,
+) -> SyntheticFleet:
+    """
+    Build the rows of a synthetic fleet without touching a database.
+
+    Observations are spread uniformly over the week before end; each store
+    gets its own probability of being active. Timezones are drawn from
+    timezone_mix (weights, normalized). A menu_hours_density share of the
+    stores get a schedule: each day is open with probability 0.9 for 6 to
+    18 hours from a random minute between 05:00 and 12:00, some of them
+    past midnight. The same arguments always produce the same rows.
+    """
+    rng = np.random.default_rng(seed)
+    store_ids = [str(uuid.UUID(bytes=rng.bytes(16), version=4)) for _ in range(stores)]
+    ids = np.array(store_ids, dtype=object)
+
+    week = int(timedelta(weeks=1) / timedelta(microseconds=1))
+    uptime = rng.uniform(0.5, 1.0, size=stores)
+    offsets = np.sort(rng.integers(0, week, size=(stores, observations_per_store)), axis=1)
+    active = rng.random(offsets.shape) < uptime[:, None]
+    # Drop repeated offsets within a store: (store_id, timestamp_utc) is unique
+    keep = np.ones(offsets.shape, dtype=bool)
+    keep[:, 1:] = np.diff(offsets, axis=1) != 0
+    rows, _ = np.nonzero(keep)
+    store_status = pd.DataFrame({
+        "store_id": ids[rows],
+        "timestamp_utc": pd.Timestamp(end) - pd.to_timedelta(offsets[keep], unit="us"),
+        "status": np.where(active[keep], "active", "inactive"),
+    })
+
+    mix = DEFAULT_TIMEZONE_MIX if timezone_mix is None else timezone_mix
+    names = list(mix)
+    weights = np.array([mix[name] for name in names], dtype=float)
+    picked = rng.choice(len(names), size=stores, p=weights / weights.sum())
+    zones = np.array(names, dtype=object)[picked]
+    has_zone = np.array([zone is not None for zone in zones], dtype=bool)
+    store_timezones = pd.DataFrame({"store_id": ids[has_zone], "timezone_str": zones[has_zone]})
+
+    scheduled = rng.random(stores) < menu_hours_density
+    open_day = (rng.random((stores, 7)) < 0.9) & scheduled[:, None]
+    start_minute = rng.integers(5 * 60, 12 * 60, size=(stores, 7))
+    end_minute = (start_minute + rng.integers(6 * 60, 18 * 60, size=(stores, 7))) % (24 * 60)
+    store_index, day = np.nonzero(open_day)
+    menu_hours = pd.DataFrame({
+        "store_id": ids[store_index],
+        "day_of_week": day,
+        "start_time_local": _minutes_to_times(start_minute[store_index, day]),
+        "end_time_local": _minutes_to_times(end_minute[store_index, day]),
+    })
+
+    return SyntheticFleet(store_ids, store_status, menu_hours, store_timezones)
+
+
+def insert_fleet(bind, fleet: SyntheticFleet) -> None:
+    """Insert a fleet's rows straight into the tables, bypassing ingestion."""
+    with bind.begin() as conn:
+        for model, frame in (
+            (StoreStatus, fleet.store_status),
+            (MenuHours, fleet.menu_hours),
+            (StoreTimezone, fleet.store_timezones),
+        ):
+            for start in range(0, len(frame), INSERT_CHUNK_SIZE):
+                chunk = frame.iloc[start:start + INSERT_CHUNK_SIZE]
+                records = chunk.to_dict("records")
+                if "timestamp_utc" in chunk:
+                    for record, value in zip(records, chunk["timestamp_utc"].dt.to_pydatetime()):
+                        record["timestamp_utc"] = value
+                conn.execute(model.__table__.insert(), records)
+
+
+def write_source_files(fleet: SyntheticFleet, directory: Path) -> None:
+    """
+    Write a fleet as the source files ingestion reads: store_status.csv,
+    menu_hours.csv and timezones.csv, in the same layout as the files the
+    project ships with (dayOfWeek column, "... UTC" timestamps).
+    """
+    directory.mkdir(parents=True, exist_ok=True)
+    status = fleet.store_status.assign(
+        timestamp_utc=fleet.store_status["timestamp_utc"].dt.strftime("%Y-%m-%d %H:%M:%S.%f UTC")
+    )
+    status[["store_id", "status", "timestamp_utc"]].to_csv(directory / "store_status.csv", index=False)
+    fleet.menu_hours.rename(columns={"day_of_week": "dayOfWeek"}).to_csv(directory / "menu_hours.csv", index=False)
+    fleet.store_timezones.to_csv(directory / "timezones.csv", index=False)
+
+
+def generate_fleet(
+    bind,
+    stores: int = 1000,
+    observations_per_store: int = 168,
+    seed: int = 0,
+    end: datetime = DEFAULT_END,
+    timezone_mix: Optional[Dict[Optional[str], float]] = None,
+    menu_hours_density: float = DEFAULT_MENU_HOURS_DENSITY,
+) -> List[str]:
+    """Insert a synthetic fleet (see build_fleet) and return its store ids."""
+    fleet = build_fleet(stores, observations_per_store, seed, end, timezone_mix, menu_hours_density)
+    insert_fleet(bind, fleet)
+    return fleet.store_ids
+
+
+def parse_timezone_mix(value: str) -> Dict[Optional[str], float]:
+    """Parse "America/Chicago=0.7,America/New_York=0.2,none=0.1" into a mix."""
+    mix: Dict[Optional[str], float] = {}
+    for item in value.split(","):
+        name, _, weight = item.partition("=")
+        name = name.strip()
+        mix[None if name.lower() == "none" else name] = float(weight or 1)
+    return mix
+
+
+def _minutes_to_times(minutes: np.ndarray) -> np.ndarray:
+    day = np.array([time(m // 60, m % 60) for m in range(24 * 60)], dtype=object)
+    return day[minutes]
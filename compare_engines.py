@@ -0,0 +1,100 @@
+#!/usr/bin/env python3
+"""
+Compare uptime engines on the data currently in the database.
+
+The first engine is the reference and every other engine must produce a
+byte-identical CSV through the same writer the report service uses:
+- legacy:     the original pipeline - full table through the ORM loader, per-store loop
+- vectorized: pushed-down columnar load of the report window, single-pass engine
+- sql:        window counts aggregated inside the database (REPORT_ENGINE=sql)
+- rollup:     hourly rollup table plus raw edge hours (REPORT_ENGINE=rollup)
+- runs:       business_hours computed from store_status_runs (REPORT_ENGINE=runs)
+
+Point DATABASE_URL at a local PostgreSQL or SQLite copy to check a change
+without touching the shared database.
+
+Usage:
+    python compare_engines.py                   # legacy vs vectorized vs sql vs rollup
+    python compare_engines.py legacy sql
+    python compare_engines.py vectorized sql rollup --windows 15m,6h,30d
+    python compare_engines.py business_hours runs
+"""
+import argparse
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+# Add the app to the path
+sys.path.append(str(Path(__file__).parent))
+
+from app.services.calculator import (
+    WINDOWS, compute_store_uptime, compute_uptime_from_counts, compute_uptime_from_runs, parse_windows,
+)
+from app.services.data_loader import get_current_time_from_db, load_all_data, load_store_ids, load_window_counts
+from app.services.report_service import _save_results_csv
+from app.services.rollup_service import refresh_hourly_rollups, rollup_window_counts
+from app.services.timeline_service import load_runs_report_data, refresh_status_runs
+
+
+def run_engine(engine, current_time, windows=WINDOWS):
+    if engine == "legacy":
+        status_df, menu_hours, store_timezones = load_all_data(mode="orm")
+        return compute_store_uptime(status_df, menu_hours, store_timezones, current_time, engine="legacy", windows=windows)
+
+    if engine == "sql":
+        store_ids, counts = load_window_counts(current_time, windows)
+        return compute_uptime_from_counts(store_ids, counts, windows)
+
+    if engine == "rollup":
+        refresh_hourly_rollups()
+        store_ids, counts = rollup_window_counts(current_time, windows)
+        return compute_uptime_from_counts(store_ids, counts, windows)
+
+    if engine == "runs":
+        refresh_status_runs()
+        runs, menu_hours, store_timezones, known_stores = load_runs_report_data(current_time, windows)
+        return compute_uptime_from_runs(
+            runs, menu_hours, store_timezones, current_time, known_stores=known_stores, windows=windows
+        )
+
+    since = current_time - max(length for _, length in windows)
+    status_df, menu_hours, store_timezones = load_all_data(since=since)
+    return compute_store_uptime(
+        status_df, menu_hours, store_timezones, current_time, engine=engine, known_stores=load_store_ids(),
+        windows=windows,
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare uptime engines on the data in the database.")
+    # business_hours measures something different, so it is only compared when asked for
+    parser.add_argument("engines", nargs="*", default=["legacy", "vectorized", "sql", "rollup"])
+    parser.add_argument("--windows", default=None, help="report windows, e.g. 15m,6h,30d (legacy only supports the default)")
+    args = parser.parse_args()
+    engines = args.engines
+    windows = parse_windows(args.windows) if args.windows else WINDOWS
+    current_time = get_current_time_from_db().to_pydatetime()
+
+    outputs = {}
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        for engine in engines:
+            started = time.perf_counter()
+            results = run_engine(engine, current_time, windows)
+            elapsed = time.perf_counter() - started
+
+            output_path = Path(tmp_dir) / f"{engine}.csv"
+            _save_results_csv(results, output_path)
+            outputs[engine] = output_path.read_bytes()
+            print(f"{engine:>12}: {len(results):,} stores in {elapsed:.3f}s (load + compute)")
+
+    reference = engines[0]
+    mismatched = [engine for engine in engines[1:] if outputs[engine] != outputs[reference]]
+    if mismatched:
+        print(f"Output differs from '{reference}': {', '.join(mismatched)}")
+        sys.exit(1)
+    print("All engines produced byte-identical CSV output")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,63 @@
+#!/usr/bin/env python3
+"""
+Run report workers without the API.
+
+API processes with REPORT_JOB_CONCURRENCY=0 only queue reports; any number
+of these processes (or API processes with workers) drain the shared
+report_jobs table.
+
+Set REPORT_WORKER_METRICS_PORT to serve this process's /metrics (report
+stage histograms, in-flight reports, DB pool) for Prometheus to scrape.
+
+Usage:
+    python report_worker.py
+"""
+import os
+import sys
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+# Add the app to the path
+sys.path.append(str(Path(__file__).parent))
+
+from app.database.config import create_tables
+from app.services.job_queue import REPORT_JOB_CONCURRENCY
+from app.services.report_service import worker_pool
+
+# Port for this worker's Prometheus metrics; 0 disables
+REPORT_WORKER_METRICS_PORT = int(os.getenv("REPORT_WORKER_METRICS_PORT", "0"))
+
+
+class MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        from app.api.metrics import CONTENT_TYPE, render_metrics
+
+        if self.path.split("?")[0] != "/metrics":
+            self.send_error(404)
+            return
+        body = render_metrics().encode()
+        self.send_response(200)
+        self.send_header("Content-Type", CONTENT_TYPE)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass  # one line per scrape is noise
+
+
+def main():
+    create_tables()
+    if REPORT_JOB_CONCURRENCY <= 0:
+        print("REPORT_JOB_CONCURRENCY must be at least 1 to run report workers")
+        sys.exit(1)
+    if REPORT_WORKER_METRICS_PORT:
+        server = ThreadingHTTPServer(("", REPORT_WORKER_METRICS_PORT), MetricsHandler)
+        threading.Thread(target=server.serve_forever, name="metrics-server", daemon=True).start()
+        print(f"Serving metrics on port {REPORT_WORKER_METRICS_PORT}")
+    worker_pool.run_forever()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,40 @@
+#!/usr/bin/env python3
+"""
+Apply the store_status retention policy: fold old observations into the
+hourly summary (store_status_hourly), optionally archive them, and remove
+them - dropping whole weekly partitions on partitioned PostgreSQL.
+
+Meant to run from cron, e.g. daily. Safe to re-run.
+
+Usage:
+    python retention.py              # keep STORE_STATUS_RETENTION_DAYS
+    python retention.py --days 90
+"""
+import argparse
+import sys
+from pathlib import Path
+
+# Add the app to the path
+sys.path.append(str(Path(__file__).parent))
+
+from app.services.retention_service import STORE_STATUS_RETENTION_DAYS, apply_retention
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument(
+        "--days", type=int, default=None,
+        help=f"days of raw observations to keep (default STORE_STATUS_RETENTION_DAYS={STORE_STATUS_RETENTION_DAYS})",
+    )
+    args = parser.parse_args()
+
+    try:
+        cutoff, _ = apply_retention(args.days)
+    except ValueError as e:
+        parser.error(str(e))
+    if cutoff is None:
+        print("Retention is off (STORE_STATUS_RETENTION_DAYS=0), nothing removed")
+
+
+if __name__ == "__main__":
+    main()
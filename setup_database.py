@@ -11,6 +11,7 @@ No migration complexity - perfect for this project!
 Usage:
     python setup_database.py
     python setup_database.py --reset  # Reset entire database
+    python setup_database.py --partition  # Convert store_status to weekly partitions (PostgreSQL)
 """
 import sys
 from pathlib import Path
@@ -18,9 +19,10 @@ from pathlib import Path
 # Add the app to the path
 sys.path.append(str(Path(__file__).parent))
 
-from app.database.config import create_tables, get_db_session
+from app.database.config import create_tables, engine, get_db_session
 from app.database.ingestion import ingest_all_data
 from app.database.models import StoreStatus, MenuHours, StoreTimezone
+from app.database.partitions import migrate_to_partitioned
 
 
 def main():
@@ -91,12 +93,25 @@ def reset_database():
     print("Resetting database...")
     # Note: We don't have drop_tables in simplified config
     # Just re-run the ingestion which clears and reloads data
-    ingest_all_data()
+    ingest_all_data(reset=True)
     print("Database reset completed!")
 
 
+def partition_database():
+    """Move an existing store_status into weekly partitions - blocks writers while rows are copied."""
+    print("Partitioning store_status by week...")
+    with engine.begin() as conn:
+        moved = migrate_to_partitioned(conn)
+    if moved is None:
+        print("Nothing to do: store_status is already partitioned, missing, or not on PostgreSQL")
+    else:
+        print(f"Moved {moved:,} records into weekly partitions")
+
+
 if __name__ == "__main__":
     if len(sys.argv) > 1 and sys.argv[1] == "--reset":
         reset_database()
+    elif len(sys.argv) > 1 and sys.argv[1] == "--partition":
+        partition_database()
     else:
         main()
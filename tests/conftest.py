@@ -0,0 +1,7 @@
+import os
+import sys
+from pathlib import Path
+
+# The app reads DATABASE_URL at import; these tests never touch the database
+os.environ.setdefault("DATABASE_URL", "sqlite://")
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
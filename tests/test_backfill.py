@@ -0,0 +1,34 @@
+from datetime import datetime
+
+import pandas as pd
+import pytest
+
+from app.services import backfill_service
+from app.services.calculator import compute_uptime_series
+
+# Long enough that 100k stores overflow the int64 (store, time) key
+STEPS = pd.date_range("2015-01-01", periods=3000, freq="D", tz="UTC")
+STORES = [f"store-{i:06d}" for i in range(100_000)]
+
+
+def test_uptime_series_refuses_a_key_overflow():
+    status_df = pd.DataFrame({
+        "store_id": [STORES[-1]],
+        "timestamp_utc": [STEPS[-1]],
+        "status": ["active"],
+    })
+    series = compute_uptime_series(status_df, [], {}, STEPS, STORES)
+    with pytest.raises(OverflowError):
+        next(series)
+
+
+def test_backfill_steps_rejects_a_long_daily_range(monkeypatch):
+    monkeypatch.setattr(backfill_service, "load_store_ids", lambda: STORES)
+    with pytest.raises(ValueError, match="too long"):
+        backfill_service.backfill_steps(datetime(2015, 1, 1), datetime(2023, 3, 18), "1d")
+
+
+def test_backfill_steps_accepts_a_year_of_daily_steps(monkeypatch):
+    monkeypatch.setattr(backfill_service, "load_store_ids", lambda: STORES)
+    steps = backfill_service.backfill_steps(datetime(2023, 1, 1), datetime(2023, 12, 31), "1d")
+    assert len(steps) == 365